@@ -84,7 +84,7 @@ class Comandos(commands.Cog):
                 return await ctx.send("⚠️ No pude acceder al reproductor de este servidor.")
 
             current = getattr(player, "current", None)
-            queue_list = list(getattr(player, "queue", []))
+            queue_list = getattr(player, "queue", [])  # TrackQueue: se corta sin copiarla entera
 
             # 3) Si no hay nada realmente
             if not current and not queue_list:
@@ -104,7 +104,10 @@ class Comandos(commands.Cog):
 
             # 5) Lista de siguientes en cola (no incluye la actual)
             max_items = 10
-            items = queue_list[:max_items]
+            if hasattr(player, "upcoming"):
+                items = await player.upcoming(0, max_items)  # metadata solo de las visibles
+            else:
+                items = queue_list[:max_items]
             if items:
                 lista_cola = "\n".join(
                     [f"**{i}.** {clean_query(getattr(t, 'title', None) or getattr(t, 'query', 'Desconocido'))}"
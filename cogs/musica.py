@@ -1,23 +1,38 @@
 # cogs/musica.py
 from __future__ import annotations
 
+import asyncio
 import os
-import random
+import time
 import discord
+from discord import app_commands
 from discord.ext import commands, tasks  # <--- IMPORTANTE: Agregamos tasks
 
 # Imports de tu lógica de música
+from musicbot.cache import AudioCache
 from musicbot.downloader import YTDLDownloader
+from musicbot.library import LocalLibrary
+from musicbot.playlists import PlaylistStore
+from musicbot.resolve_cache import ResolveCache
+from musicbot.shaping import BandwidthShaper
 from musicbot.spotify import SpotifyResolver
 from musicbot.player import MusicService, Track
 
 # Usamos tu utilidad.py
-from .utilidad import clean_query, progress_bar, fmt_time
+from .utilidad import clean_query, progress_bar, fmt_time, parse_time
 
 # ==========================================================
 # 1. DISEÑO VISUAL
 # ==========================================================
 
+def queue_total_text(player) -> str:
+    """"12 canciones · 47:10" (+ cuántas todavía sin duración conocida)."""
+    total, unknown = player.queue_duration()
+    text = f"{len(player.queue)} canciones · {fmt_time(total)}"
+    if unknown:
+        text += f" (+{unknown} sin duración)"
+    return text
+
 def build_player_embed(guild, player):
     """Recreamos el diseño visual del reproductor con vista previa de cola."""
     embed = discord.Embed(color=discord.Color.blurple())
@@ -40,7 +55,7 @@ def build_player_embed(guild, player):
     
     # Barra de tiempo (Dinámica)
     duration = current.duration
-    played = player._time_played_seconds()
+    played = player.position()  # posición en la pista (con seek), no lo escuchado
     
     # Generamos la barrita visual
     bar, pct = progress_bar(played, duration)
@@ -49,6 +64,8 @@ def build_player_embed(guild, player):
         f"`{fmt_time(played)}` {bar} `{fmt_time(duration)}`\n"
         f"👤 **Pedido por:** {current.requester_name}"
     )
+    if current.live:
+        embed.description = f"🔴 **En vivo** · `{fmt_time(played)}`\n👤 **Pedido por:** {current.requester_name}"
 
     if current.thumbnail:
         embed.set_thumbnail(url=current.thumbnail)
@@ -71,7 +88,7 @@ def build_player_embed(guild, player):
     if player.loop_track: loop_txt = "🔂 Loop Canción"
     elif player.loop_queue: loop_txt = "🔁 Loop Cola"
 
-    footer_text = f"Total en cola: {queue_len}"
+    footer_text = f"En cola: {queue_total_text(player)}" if queue_len else "Total en cola: 0"
     if loop_txt:
         footer_text += f" • {loop_txt}"
 
@@ -86,6 +103,15 @@ class MusicControls(discord.ui.View):
         self.cog = cog_musica
 
     # Fila 1: Controles
+    @discord.ui.button(emoji="⏮️", style=discord.ButtonStyle.secondary, row=0)
+    async def previous(self, interaction: discord.Interaction, button: discord.ui.Button):
+        if not interaction.user.voice: return await interaction.response.send_message("❌ Entra a voz.", ephemeral=True)
+        player = self.cog.service.get_player(interaction.guild.id)
+        ok, msg = await player.previous()
+        if not ok: return await interaction.response.send_message("ℹ️ " + msg, ephemeral=True)
+        await interaction.response.defer()
+        await self.cog.refresh_panel(interaction.guild)
+
     @discord.ui.button(emoji="⏯️", style=discord.ButtonStyle.primary, row=0)
     async def pause_resume(self, interaction: discord.Interaction, button: discord.ui.Button):
         if not interaction.user.voice: return await interaction.response.send_message("❌ Entra a voz.", ephemeral=True)
@@ -105,6 +131,7 @@ class MusicControls(discord.ui.View):
     async def stop(self, interaction: discord.Interaction, button: discord.ui.Button):
         if not interaction.user.voice: return await interaction.response.send_message("❌ Entra a voz.", ephemeral=True)
         player = self.cog.service.get_player(interaction.guild.id)
+        self.cog.cancel_ingest(interaction.guild.id)
         await player.stop()
         await interaction.response.edit_message(content="🛑 **Detenido.**", embed=None, view=None)
 
@@ -121,9 +148,8 @@ class MusicControls(discord.ui.View):
     async def shuffle_btn(self, interaction: discord.Interaction, button: discord.ui.Button):
         if not interaction.user.voice: return await interaction.response.send_message("❌ Entra a voz.", ephemeral=True)
         player = self.cog.service.get_player(interaction.guild.id)
-        if len(player.queue) < 2:
+        if not await player.shuffle():
             return await interaction.response.send_message("⚠️ Necesito al menos 2 canciones para mezclar.", ephemeral=True)
-        random.shuffle(player.queue)
         await interaction.response.send_message("🔀 **Cola mezclada.**", ephemeral=True)
         await self.cog.refresh_panel(interaction.guild)
 
@@ -132,10 +158,12 @@ class MusicControls(discord.ui.View):
         player = self.cog.service.get_player(interaction.guild.id)
         if not player.queue:
             return await interaction.response.send_message("🕳️ La cola está vacía.", ephemeral=True)
-        lines = [f"**{i}.** {t.title}" for i, t in enumerate(player.queue, 1)]
+        # solo lo que entra en el embed (la cola puede tener miles)
+        lines = [f"**{i}.** {t.title}" for i, t in enumerate(await player.upcoming(0, 60), 1)]
         full_text = "\n".join(lines)
         if len(full_text) > 1900: full_text = full_text[:1900] + "\n... (lista cortada)"
         embed = discord.Embed(title="📜 Cola de Reproducción", description=full_text, color=discord.Color.light_grey())
+        embed.set_footer(text=queue_total_text(player))
         await interaction.response.send_message(embed=embed, ephemeral=True)
 
 
@@ -151,7 +179,27 @@ class _MiniCtx:
 class Musica(commands.Cog):
     def __init__(self, bot: commands.Bot):
         self.bot = bot
-        self.downloader = YTDLDownloader()
+        # SQLite con mediciones / resoluciones / metadata de la caché de música
+        db_path = os.getenv("MUSIC_DB", "music_cache.db")
+        resolve_ttl_h = float(os.getenv("MUSIC_RESOLVE_TTL_H", "168"))
+        resolve_neg_ttl_s = float(os.getenv("MUSIC_RESOLVE_NEG_TTL_S", "600"))
+        self.downloader = YTDLDownloader(
+            resolve_cache=ResolveCache(db_path, ttl=resolve_ttl_h * 3600, negative_ttl=resolve_neg_ttl_s),
+            # procesos dedicados a yt-dlp (0 = hilos dentro del bot)
+            workers=int(os.getenv("MUSIC_YTDL_WORKERS", "2")),
+            job_timeout=float(os.getenv("MUSIC_YTDL_TIMEOUT", "120")),
+            max_jobs_per_worker=int(os.getenv("MUSIC_YTDL_RECYCLE", "50")),
+            # descarga sin avances tras N s -> se lanza la de otro resultado de la búsqueda (0 = nunca)
+            hedge_after=float(os.getenv("MUSIC_HEDGE_AFTER_S", "8")),
+            hedge_candidates=int(os.getenv("MUSIC_HEDGE_CANDIDATES", "3")),
+            # tope de ancho de banda del prefetch (KB/s; 0 = sin tope), global y por servidor;
+            # la pista que suena no se limita y el tope global baja con cada conexión de voz
+            shaper=BandwidthShaper(
+                global_bps=float(os.getenv("MUSIC_BG_RATE_KBPS", "0")) * 1024,
+                guild_bps=float(os.getenv("MUSIC_BG_GUILD_RATE_KBPS", "0")) * 1024,
+                voice_count=lambda: len(self.bot.voice_clients),
+            ),
+        )
 
         try:
             self.spotify = SpotifyResolver()
@@ -161,16 +209,60 @@ class Musica(commands.Cog):
             print(f"[Musica] Spotify deshabilitado: {e}")
 
         ffmpeg_path = os.getenv("FFMPEG_PATH", "ffmpeg")
+        # carpeta con música local (tags indexados en SQLite FTS5); /play la busca antes que YouTube
+        library_dir = os.getenv("MUSIC_LIBRARY_DIR", "")
+        self.library = LocalLibrary(library_dir, db_path, os.getenv("FFPROBE_PATH", "ffprobe")) if library_dir else None
+        # reescaneo incremental (solo lo que cambió de mtime) cada N minutos; 0 = al iniciar y con /biblioteca
+        self.library_rescan_min = float(os.getenv("MUSIC_LIBRARY_RESCAN_MIN", "30"))
+        self._library_lock = asyncio.Lock()
+        # playlists guardadas por usuario (/playlist save|load|list|delete), ya resueltas
+        self.playlists = PlaylistStore(db_path)
         temp_root = os.getenv("MUSIC_TEMP", "tmp_audio")
+        # 1 = reproducir la URL directa mientras se descarga; 0 = descargar antes de sonar
+        stream_first = os.getenv("MUSIC_STREAM_FIRST", "1") != "0"
+        # presupuesto de disco de la caché de audio compartida
+        cache_mb = int(os.getenv("MUSIC_CACHE_MB", "2048"))
+        # 1 = guardar cada pista como Ogg/Opus y reproducirla sin recodificar
+        opus_cache = os.getenv("MUSIC_OPUS_CACHE", "1") != "0"
+        # ventana de prefetch: próximas K pistas, con tope de MB por servidor
+        prefetch_depth = int(os.getenv("MUSIC_PREFETCH_DEPTH", "3"))
+        prefetch_mb = int(os.getenv("MUSIC_PREFETCH_MB", "300"))
+        # descargas simultáneas entre TODOS los servidores (la pista actual no espera turno)
+        max_downloads = int(os.getenv("MUSIC_DL_CONCURRENCY", "3"))
+        # fundido entre pistas (segundos; 0 = gapless directo con Opus passthrough)
+        crossfade = float(os.getenv("MUSIC_CROSSFADE_S", "0"))
+        # procesos de audio aparte (FFmpeg + Opus fuera del proceso del bot); 0 = todo en proceso
+        audio_nodes = int(os.getenv("MUSIC_AUDIO_NODES", "0"))
+        # 1 = guardar cola/posición de cada servidor y reanudar al reiniciar (restart o caída)
+        resume = os.getenv("MUSIC_RESUME", "1") != "0"
+        # últimas N pistas por servidor que quedan fijadas en la caché para /previous (0 = sin historial)
+        history_size = int(os.getenv("MUSIC_HISTORY", "5"))
+        # búsquedas planas simultáneas para completar títulos/duración de la cola (0 = al reproducir)
+        metadata_concurrency = int(os.getenv("MUSIC_META_CONCURRENCY", "4"))
+        # tope de canciones por playlist / mix de YouTube (se cargan por tandas mientras suena)
+        self.playlist_max = int(os.getenv("MUSIC_PLAYLIST_MAX", "1000"))
+        self._ingest: dict[int, set[asyncio.Task]] = {}  # guild_id -> playlists cargándose
 
         self.service = MusicService(
             bot=self.bot,
             downloader=self.downloader,
             ffmpeg_path=ffmpeg_path,
             temp_root=temp_root,
+            cache_max_bytes=cache_mb * 1024 * 1024,
+            opus_cache=opus_cache,
+            db_path=db_path,
+            prefetch_depth=prefetch_depth,
+            prefetch_budget_bytes=prefetch_mb * 1024 * 1024,
+            max_downloads=max_downloads,
+            crossfade_seconds=crossfade,
+            audio_nodes=audio_nodes,
+            resume=resume,
+            history_size=history_size,
+            metadata_concurrency=metadata_concurrency,
             on_state_change=self._on_state_change,
             on_track_started=self._on_track_started,
             on_track_finished=self._on_track_finished,
+            stream_first=stream_first,
         )
 
         self.controls = MusicControls(self)
@@ -181,16 +273,29 @@ class Musica(commands.Cog):
         # --- CORRECCIÓN AQUÍ: Iniciamos el loop inmediatamente ---
         # El decorador @before_loop se encargará de esperar a que el bot esté listo
         self.check_progress.start()
+        if self.library:
+            if self.library_rescan_min > 0:
+                self.library_scan.change_interval(minutes=self.library_rescan_min)
+            self.library_scan.start()
 
     def cog_unload(self):
         # Cancelamos el loop si el cog se descarga para evitar errores
         self.check_progress.cancel()
+        self.library_scan.cancel()
+        for guild_id in list(self._ingest):
+            self.cancel_ingest(guild_id)
+        self.downloader.close()
+        self.service.close()
 
     @commands.Cog.listener()
     async def on_ready(self):
         # Solo añadimos la vista persistente
         self.bot.add_view(self.controls)
         print("🎵 Musica lista para la acción.")
+        # reanudar lo que sonaba antes del reinicio (solo la primera vez que el bot queda listo)
+        for snap in await self.service.resume_all():
+            await self._reattach_panel(snap.guild_id, snap.panel_channel_id, snap.panel_message_id)
+            print(f"[Musica] Reanudado guild {snap.guild_id} en {snap.position:.0f}s")
 
     # ---------------- Bucle de Actualización (Corrección) ----------------
     
@@ -222,6 +327,31 @@ class Musica(commands.Cog):
         # Esperamos a que el bot esté 100% conectado antes de empezar a actualizar
         await self.bot.wait_until_ready()
 
+    @tasks.loop(minutes=30.0)
+    async def library_scan(self):
+        """Sincroniza la biblioteca local con su carpeta (la primera vuelta es al cargar el cog)."""
+        try:
+            stats = await self.scan_library()
+            if stats.added or stats.updated or stats.removed:
+                print(f"[Musica] Biblioteca: +{stats.added} ~{stats.updated} -{stats.removed}")
+        except Exception as e:
+            print(f"[Musica] Error escaneando la biblioteca: {e}")
+        if self.library_rescan_min <= 0:
+            self.library_scan.stop()
+
+    async def scan_library(self):
+        async with self._library_lock:  # loop y /biblioteca no escanean a la vez
+            return await asyncio.to_thread(self.library.scan)
+
+    async def _library_match(self, query: str):
+        """Entrada de la biblioteca local para un /play (None si no hay biblioteca, es un link o no está)."""
+        if not self.library or query.startswith(("http://", "https://")):
+            return None
+        try:
+            return await asyncio.to_thread(self.library.match, query)
+        except Exception:
+            return None
+
     # ---------------- Panel ----------------
     async def refresh_panel(self, guild: discord.Guild):
         player = self.service.get_player(guild.id)
@@ -236,6 +366,18 @@ class Musica(commands.Cog):
         player = self.service.get_player(ctx.guild.id)
         msg = await ctx.send(embed=build_player_embed(ctx.guild, player), view=self.controls)
         self.panel_message[ctx.guild.id] = msg
+        self.service.set_panel(ctx.guild.id, msg.channel.id, msg.id)
+
+    async def _reattach_panel(self, guild_id: int, channel_id: int, message_id: int):
+        """Tras un reinicio: vuelve a usar el panel que ya estaba en el canal."""
+        guild = self.bot.get_guild(guild_id)
+        channel = guild.get_channel(channel_id) if guild and channel_id else None
+        if not channel or not message_id: return
+        try:
+            msg = await channel.fetch_message(message_id)
+        except Exception: return
+        self.panel_message[guild_id] = msg
+        await self.refresh_panel(guild)
 
     # ---------------- Hooks ----------------
     async def _on_state_change(self, guild_id: int):
@@ -279,6 +421,7 @@ class Musica(commands.Cog):
             
         msg = await ctx.send(embed=build_player_embed(ctx.guild, player), view=self.controls)
         self.panel_message[ctx.guild.id] = msg
+        self.service.set_panel(ctx.guild.id, msg.channel.id, msg.id)
 
     @commands.hybrid_command(name="join", aliases=["j"], description="Conecta el bot a tu canal de voz")
     async def join(self, ctx: commands.Context):
@@ -306,11 +449,25 @@ class Musica(commands.Cog):
 
             for it in items:
                 tracks.append(Track(
-                    query=it.query, source="spotify", title=it.title,
+                    query=it.query, source="spotify", title=it.title, duration=it.duration_ms // 1000,
                     requester_id=ctx.author.id, requester_name=ctx.author.display_name,
                     text_channel_id=ctx.channel.id
                 ))
             await ctx.send(f"✅ **{len(tracks)}** canciones de Spotify añadidas a la cola.")
+        elif ResolveCache.playlist_id(query):
+            # playlist / mix: se ingiere por tandas en segundo plano (la primera suena enseguida)
+            msg = await ctx.send("📃 Playlist detectada, cargando...")
+            task = asyncio.create_task(self._ingest_playlist(ctx, player, query, msg))
+            self._ingest.setdefault(ctx.guild.id, set()).add(task)
+            task.add_done_callback(lambda t, g=ctx.guild.id: self._ingest.get(g, set()).discard(t))
+        elif entry := await self._library_match(query):
+            # biblioteca local primero: suena desde el disco, sin red
+            tracks = [Track(
+                query=entry.path, source="local", title=entry.display(), duration=entry.duration,
+                temp_file=entry.path, requester_id=ctx.author.id, requester_name=ctx.author.display_name,
+                text_channel_id=ctx.channel.id
+            )]
+            await ctx.send(f"💽 Añadido (biblioteca): **{clean_query(entry.display())}**")
         else:
             tracks = [Track(
                 query=query, source="youtube", title=query,
@@ -325,18 +482,151 @@ class Musica(commands.Cog):
                 await perfiles.actualizar_stats(ctx, duracion=0, xp_ganado=10, es_musica=True, contar_pedido=True)
             except: pass
 
-        await player.enqueue(tracks)
+        if tracks:
+            await player.enqueue(tracks)
+            await self.refresh_panel(ctx.guild)
+
+    @commands.hybrid_command(name="biblioteca", aliases=["library", "lib"], description="Busca en la música local (sin texto: reescanea)")
+    async def biblioteca(self, ctx: commands.Context, *, buscar: str = ""):
+        if not self.library: return await ctx.send("ℹ️ No hay biblioteca local configurada (`MUSIC_LIBRARY_DIR`).")
+        if not buscar:
+            msg = await ctx.send("💽 Escaneando la biblioteca...")
+            stats = await self.scan_library()
+            total = await asyncio.to_thread(len, self.library)
+            return await msg.edit(content=(
+                f"💽 Biblioteca: **{total}** archivos "
+                f"(+{stats.added} nuevos, {stats.updated} actualizados, -{stats.removed} quitados)."
+            ))
+        hits = await asyncio.to_thread(self.library.search, buscar, 10)
+        if not hits: return await ctx.send("🕳️ Nada en la biblioteca con eso.")
+        lines = [f"**{i}.** {clean_query(e.display())} `{fmt_time(e.duration)}`" for i, e in enumerate(hits, 1)]
+        embed = discord.Embed(title="💽 Biblioteca local", description="\n".join(lines), color=discord.Color.blue())
+        embed.set_footer(text="Usa /play con el nombre para reproducir desde el disco")
+        await ctx.send(embed=embed)
+
+    @commands.hybrid_command(name="radio", description="Reproduce una radio o stream en vivo (HTTP, Icecast, HLS)")
+    async def radio(self, ctx: commands.Context, url: str, *, nombre: str = ""):
+        if not ctx.author.voice: return await ctx.send("🎧 Entra a un canal de voz primero.")
+        if not url.startswith(("http://", "https://")): return await ctx.send("⚠️ Necesito la URL directa del stream (http/https).")
+        player = self.service.get_player(ctx.guild.id)
+        await player.ensure_voice(ctx.author.voice.channel)
+        await self.ensure_panel(ctx)
+        # sin descarga ni búsqueda: suena hasta que se salte (skip) o se detenga
+        await player.enqueue([Track(
+            query=url, source="radio", title=nombre or url, webpage_url=url,
+            requester_id=ctx.author.id, requester_name=ctx.author.display_name,
+            text_channel_id=ctx.channel.id
+        )])
+        await ctx.send(f"📻 Radio en cola: **{clean_query(nombre or url)}**")
         await self.refresh_panel(ctx.guild)
 
+    @commands.hybrid_command(name="playlist", aliases=["pl"], description="Guarda la cola como playlist o carga una guardada")
+    @app_commands.choices(accion=[
+        app_commands.Choice(name="Guardar la cola", value="save"),
+        app_commands.Choice(name="Cargar", value="load"),
+        app_commands.Choice(name="Ver mis playlists", value="list"),
+        app_commands.Choice(name="Borrar", value="delete"),
+    ])
+    async def playlist(self, ctx: commands.Context, accion: str, *, nombre: str = ""):
+        accion = accion.lower()
+        nombre = nombre.strip()[:50]
+        if accion == "list":
+            saved = await asyncio.to_thread(self.playlists.list, ctx.author.id)
+            if not saved: return await ctx.send("🕳️ No tienes playlists guardadas.")
+            lines = [f"**{p.name}** · {p.tracks} canciones · `{fmt_time(p.duration)}`" for p in saved]
+            embed = discord.Embed(title="💾 Tus playlists", description="\n".join(lines), color=discord.Color.blue())
+            return await ctx.send(embed=embed)
+        if accion not in ("save", "load", "delete"):
+            return await ctx.send("⚠️ Acción desconocida (save, load, list, delete).")
+        if not nombre: return await ctx.send("⚠️ Dime el nombre de la playlist.")
+
+        if accion == "delete":
+            if not await asyncio.to_thread(self.playlists.delete, ctx.author.id, nombre):
+                return await ctx.send("⚠️ No tienes una playlist con ese nombre.")
+            return await ctx.send(f"🗑️ Playlist **{clean_query(nombre)}** borrada.")
+
+        player = self.service.get_player(ctx.guild.id)
+        if accion == "save":
+            # lo que ya resolvió la cola (id del video, título, duración): al cargarla no se busca nada
+            tracks = ([player.current] if player.current else []) + list(player.queue)
+            if not tracks: return await ctx.send("🕳️ No hay nada en la cola para guardar.")
+            try:
+                count = await asyncio.to_thread(
+                    self.playlists.save, ctx.author.id, nombre, [t.to_saved() for t in tracks]
+                )
+            except ValueError as e:
+                return await ctx.send(f"⚠️ {e}")
+            return await ctx.send(f"💾 Playlist **{clean_query(nombre)}** guardada ({count} canciones).")
+
+        if not ctx.author.voice: return await ctx.send("🎧 Entra a un canal de voz primero.")
+        saved = await asyncio.to_thread(self.playlists.load, ctx.author.id, nombre)
+        if saved is None: return await ctx.send("⚠️ No tienes una playlist con ese nombre.")
+        if not saved: return await ctx.send("🕳️ Esa playlist está vacía.")
+        await player.ensure_voice(ctx.author.voice.channel)
+        await self.ensure_panel(ctx)
+        # todo de una vez y con el prefetch andando: las pistas ya están resueltas
+        await player.enqueue([Track.from_snapshot(dict(
+            data, requester_id=ctx.author.id, requester_name=ctx.author.display_name,
+            text_channel_id=ctx.channel.id
+        )) for data in saved], prefetch=True)
+        await ctx.send(f"💾 Playlist **{clean_query(nombre)}** cargada ({len(saved)} canciones).")
+        await self.refresh_panel(ctx.guild)
+
+    async def _ingest_playlist(self, ctx: commands.Context, player, url: str, msg: discord.Message):
+        """Encola la playlist por tandas a medida que yt-dlp la pagina (progreso en `msg`)."""
+        added = 0
+        last_edit = time.monotonic()
+        try:
+            async for batch in self.downloader.iter_playlist(url, limit=self.playlist_max):
+                await player.enqueue([Track(
+                    query=e["webpage_url"], source="youtube", title=e["title"] or e["webpage_url"],
+                    webpage_url=e["webpage_url"], duration=e["duration"], thumbnail=e["thumbnail"],
+                    cache_key=AudioCache.key_for(dict(e, extractor_key="Youtube")),
+                    requester_id=ctx.author.id, requester_name=ctx.author.display_name,
+                    text_channel_id=ctx.channel.id
+                ) for e in batch])
+                first = not added
+                added += len(batch)
+                if first:
+                    await self.refresh_panel(ctx.guild)
+                # progreso cada 2 s como mucho (editar en cada tanda choca con el rate limit)
+                if time.monotonic() - last_edit >= 2:
+                    last_edit = time.monotonic()
+                    try: await msg.edit(content=f"📃 Cargando playlist... **{added}** canciones")
+                    except discord.HTTPException: pass
+        except Exception as e:
+            print(f"[Musica] Playlist {url}: {e}")
+            if not added:
+                try: await msg.edit(content="⚠️ No pude leer esa playlist.")
+                except discord.HTTPException: pass
+                return
+        tope = f" (tope de {self.playlist_max})" if added >= self.playlist_max else ""
+        try: await msg.edit(content=f"✅ **{added}** canciones de la playlist añadidas a la cola{tope}.")
+        except discord.HTTPException: pass
+        await self.refresh_panel(ctx.guild)
+
+    def cancel_ingest(self, guild_id: int):
+        """Corta las playlists que se estén cargando en el servidor (stop)."""
+        for task in self._ingest.pop(guild_id, set()):
+            task.cancel()
+
     @commands.hybrid_command(name="skip", aliases=["s"], description="Salta a la siguiente canción")
     async def skip(self, ctx: commands.Context):
         player = self.service.get_player(ctx.guild.id)
         ok, msg = await player.skip()
         await ctx.send(("✅ " if ok else "ℹ️ ") + msg)
 
+    @commands.hybrid_command(name="previous", aliases=["prev", "anterior"], description="Vuelve a la canción anterior")
+    async def previous(self, ctx: commands.Context):
+        player = self.service.get_player(ctx.guild.id)
+        ok, msg = await player.previous()
+        await ctx.send(("⏮️ " if ok else "ℹ️ ") + msg)
+        if ok: await self.refresh_panel(ctx.guild)
+
     @commands.hybrid_command(name="stop", description="Detiene la música y limpia la cola")
     async def stop(self, ctx: commands.Context):
         player = self.service.get_player(ctx.guild.id)
+        self.cancel_ingest(ctx.guild.id)
         ok, msg = await player.stop()
         await ctx.send(("✅ " if ok else "ℹ️ ") + msg)
 
@@ -364,9 +654,8 @@ class Musica(commands.Cog):
     @commands.hybrid_command(name="shuffle", description="Mezcla aleatoriamente las canciones en la cola")
     async def shuffle(self, ctx: commands.Context):
         player = self.service.get_player(ctx.guild.id)
-        if len(player.queue) < 2:
+        if not await player.shuffle():
             return await ctx.send("⚠️ Necesito al menos 2 canciones para mezclar.")
-        random.shuffle(player.queue)
         await ctx.send("🔀 **Cola mezclada.**")
         await self.refresh_panel(ctx.guild)
 
@@ -378,14 +667,97 @@ class Musica(commands.Cog):
         
         embed = discord.Embed(title="📜 Cola de Reproducción", color=discord.Color.blue())
         description = ""
-        for i, track in enumerate(player.queue, 1):
-            line = f"**{i}.** {clean_query(track.title)} (`{track.requester_name}`)\n"
+        eta = player.time_left() if player.current and player.current.duration else None
+        for i, track in enumerate(await player.upcoming(0, 40), 1):
+            # ETA: lo que falta de la actual + las anteriores (se corta en la primera sin duración)
+            when = f" · ⏱️ {fmt_time(eta)}" if eta is not None else ""
+            eta = eta + track.duration if eta is not None and track.duration else None
+            line = f"**{i}.** {clean_query(track.title)} (`{track.requester_name}`){when}\n"
             if len(description) + len(line) > 2000:
                 description += f"\n...y {len(player.queue) - (i-1)} más."
                 break
             description += line
         embed.description = description
-        embed.set_footer(text=f"Total: {len(player.queue)} canciones")
+        embed.set_footer(text=f"Total: {queue_total_text(player)}")
+        await ctx.send(embed=embed)
+
+    @commands.hybrid_command(name="seek", description="Salta a un momento de la canción (ej: 1:30 o 90)")
+    async def seek(self, ctx: commands.Context, tiempo: str):
+        segundos = parse_time(tiempo)
+        if segundos is None: return await ctx.send("⚠️ Formato de tiempo inválido. Usa `1:30` o `90`.")
+        player = self.service.get_player(ctx.guild.id)
+        ok, msg = await player.seek(segundos)
+        await ctx.send(("⏩ " if ok else "⚠️ ") + msg)
+        if ok: await self.refresh_panel(ctx.guild)
+
+    @commands.hybrid_command(name="forward", aliases=["ff", "adelantar"], description="Adelanta la canción N segundos")
+    async def forward(self, ctx: commands.Context, segundos: int = 10):
+        player = self.service.get_player(ctx.guild.id)
+        ok, msg = await player.seek(abs(segundos), relative=True)
+        await ctx.send(("⏩ " if ok else "⚠️ ") + msg)
+        if ok: await self.refresh_panel(ctx.guild)
+
+    @commands.hybrid_command(name="rewind", aliases=["rw", "retroceder"], description="Retrocede la canción N segundos")
+    async def rewind(self, ctx: commands.Context, segundos: int = 10):
+        player = self.service.get_player(ctx.guild.id)
+        ok, msg = await player.seek(-abs(segundos), relative=True)
+        await ctx.send(("⏪ " if ok else "⚠️ ") + msg)
+        if ok: await self.refresh_panel(ctx.guild)
+
+    @commands.hybrid_command(name="move", aliases=["mover"], description="Mueve una canción de la cola a otra posición")
+    async def move(self, ctx: commands.Context, desde: int, hasta: int):
+        player = self.service.get_player(ctx.guild.id)
+        ok, msg = await player.move(desde, hasta)
+        await ctx.send(("↕️ " if ok else "⚠️ ") + msg)
+        if ok: await self.refresh_panel(ctx.guild)
+
+    @commands.hybrid_command(name="remove", aliases=["quitar"], description="Quita una canción de la cola por posición")
+    async def remove(self, ctx: commands.Context, posicion: int):
+        player = self.service.get_player(ctx.guild.id)
+        ok, msg = await player.remove_at(posicion)
+        await ctx.send(("🗑️ " if ok else "⚠️ ") + msg)
+        if ok: await self.refresh_panel(ctx.guild)
+
+    @commands.hybrid_command(name="jump", aliases=["ir"], description="Salta directo a una posición de la cola")
+    async def jump(self, ctx: commands.Context, posicion: int):
+        player = self.service.get_player(ctx.guild.id)
+        ok, msg = await player.jump(posicion)
+        await ctx.send(("⏭️ " if ok else "⚠️ ") + msg)
+        if ok: await self.refresh_panel(ctx.guild)
+
+    # ---------------- Efectos ----------------
+    @commands.hybrid_command(name="volumen", aliases=["vol"], description="Cambia el volumen de la música (0-200%)")
+    async def volumen(self, ctx: commands.Context, porcentaje: int):
+        player = self.service.get_player(ctx.guild.id)
+        valor = player.set_volume(porcentaje)
+        await ctx.send(f"🔊 Volumen: **{valor}%**")
+
+    @commands.hybrid_command(name="efecto", aliases=["fx"], description="Aplica un efecto a la música en vivo")
+    @app_commands.choices(preset=[
+        app_commands.Choice(name="Normal", value="flat"),
+        app_commands.Choice(name="Bass boost", value="bassboost"),
+        app_commands.Choice(name="Agudos", value="treble"),
+        app_commands.Choice(name="Voces", value="vocal"),
+        app_commands.Choice(name="Nightcore", value="nightcore"),
+        app_commands.Choice(name="Vaporwave", value="vaporwave"),
+    ])
+    async def efecto(self, ctx: commands.Context, preset: str):
+        player = self.service.get_player(ctx.guild.id)
+        if not player.apply_preset(preset):
+            return await ctx.send("⚠️ Efecto desconocido.")
+        await ctx.send(f"🎛️ Efecto: **{preset}**")
+
+    @commands.hybrid_command(name="efectos", description="Muestra los efectos activos y su costo")
+    async def efectos(self, ctx: commands.Context):
+        player = self.service.get_player(ctx.guild.id)
+        fx = player.effects.settings
+        st = player.effects.stats
+        embed = discord.Embed(title="🎛️ Efectos", color=discord.Color.blue())
+        embed.add_field(name="Preset", value=fx.preset)
+        embed.add_field(name="Volumen", value=f"{round(fx.volume * 100)}%")
+        embed.add_field(name="Velocidad", value=f"x{fx.speed:g}")
+        if st.frames:
+            embed.set_footer(text=f"Costo por frame (20 ms): {st.avg_us:.0f} µs prom · {st.max_us:.0f} µs máx")
         await ctx.send(embed=embed)
 
 
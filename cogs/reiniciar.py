@@ -23,8 +23,13 @@ class Admin(commands.Cog):
         )
         await ctx.send(embed=embed)
 
-        # 2. (Opcional) Guardar cosas en BD si hiciera falta aquí
-        # await self.bot.db.commit()
+        # 2. Guardar el estado de la música (cola, pista y posición) para reanudar al volver
+        musica = self.bot.get_cog("Musica")
+        if musica and getattr(musica, "service", None):
+            try:
+                await musica.service.save_snapshots(force=True)
+            except Exception as e:
+                print(f"[restart] No pude guardar el estado de la música: {e}")
 
         print("--- EJECUTANDO REINICIO INTERNO (os.execv) ---")
         
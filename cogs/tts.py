@@ -4,6 +4,7 @@ from discord.ext import commands
 import edge_tts
 import os
 import asyncio
+import uuid
 
 class TTS(commands.Cog):
     def __init__(self, bot):
@@ -24,22 +25,34 @@ class TTS(commands.Cog):
         self.base_dir = os.path.dirname(os.path.abspath(__file__))
         self.root_dir = os.path.dirname(self.base_dir)
         self.audio_folder = os.path.join(self.root_dir, "tmp_audio")
-        self.audio_path = os.path.join(self.audio_folder, "tts_edge.mp3")
         
         # Crear carpeta si no existe
         if not os.path.exists(self.audio_folder):
             os.makedirs(self.audio_folder)
 
-    async def generar_audio_edge(self, texto, voz, velocidad):
+    async def generar_audio_edge(self, texto, voz, velocidad, ruta):
         """Genera el audio usando Microsoft Edge TTS."""
         try:
             communicate = edge_tts.Communicate(texto, voz, rate=velocidad)
-            await communicate.save(self.audio_path)
+            await communicate.save(ruta)
             return True
         except Exception as e:
             print(f"[TTS] Error generando archivo: {e}")
             return False
 
+    def get_player(self, guild):
+        """Player de música del servidor: el TTS suena en su mixer (misma conexión, sin cortar la música)."""
+        musica_cog = self.bot.get_cog("Musica")
+        return musica_cog.service.get_player(guild.id) if musica_cog else None
+
+    @staticmethod
+    def borrar_archivo(ruta):
+        try:
+            if os.path.exists(ruta):
+                os.remove(ruta)
+        except Exception as e:
+            print(f"[TTS] No se pudo borrar el archivo temporal: {e}")
+
     @commands.hybrid_command(name="tts", description="Habla en el chat de voz.")
     async def tts(self, ctx, *, texto: str):
         """Dice el texto en el canal de voz y borra el archivo al terminar."""
@@ -49,55 +62,46 @@ class TTS(commands.Cog):
             return await ctx.send("❌ ¡Entra a un canal de voz primero!", ephemeral=True)
 
         canal_usuario = ctx.author.voice.channel
-        voice_client = ctx.guild.voice_client
+        player = self.get_player(ctx.guild)
+        if player is None:
+            return await ctx.send("❌ El módulo de música no está cargado.", ephemeral=True)
 
-        # 2. Conectar o mover al bot
+        # 2. Conectar o mover al bot (la conexión es la del player de música)
         try:
-            if voice_client is None:
-                voice_client = await canal_usuario.connect()
-            elif voice_client.channel != canal_usuario:
-                await voice_client.move_to(canal_usuario)
+            await player.ensure_voice(canal_usuario)
         except Exception as e:
             return await ctx.send(f"❌ Error de conexión: {e}")
 
         # 3. Notificación visual
         await ctx.send(f"🎙️ **Diciendo:** {texto}", ephemeral=True)
 
-        # 4. Si ya está hablando, lo callamos primero
-        if voice_client.is_playing():
-            voice_client.stop()
-
-        # 5. Generar audio nuevo
-        exito = await self.generar_audio_edge(texto, self.DEFAULT_VOICE, self.DEFAULT_RATE)
+        # 4. Generar audio nuevo (un archivo por mensaje: pueden solaparse)
+        ruta = os.path.join(self.audio_folder, f"tts_{uuid.uuid4().hex}.mp3")
+        exito = await self.generar_audio_edge(texto, self.DEFAULT_VOICE, self.DEFAULT_RATE, ruta)
 
-        if not exito:
+        if not exito or not os.path.exists(ruta):
+            self.borrar_archivo(ruta)
             return await ctx.send("❌ Error generando el audio.")
 
-        # 6. Reproducir y limpiar
-        if os.path.exists(self.audio_path):
-            source = discord.FFmpegPCMAudio(self.audio_path)
-            
-            # Función local para borrar el archivo al terminar
-            def limpiar_archivo(error):
-                if error:
-                    print(f"[TTS] Error en reproducción: {error}")
-                try:
-                    if os.path.exists(self.audio_path):
-                        os.remove(self.audio_path)
-                        # print("[TTS] Archivo temporal eliminado.")
-                except Exception as e:
-                    print(f"[TTS] No se pudo borrar el archivo temporal: {e}")
-
-            # 'after' ejecuta la limpieza cuando el audio termina o se detiene
-            voice_client.play(source, after=limpiar_archivo)
+        # 5. Si ya está hablando, lo callamos primero (la música sigue)
+        await player.stop_overlays(tag="tts")
+
+        # 6. Reproducir encima de la música (se atenúa mientras habla) y limpiar
+        source = discord.FFmpegPCMAudio(ruta)
+        try:
+            terminado = await player.play_overlay(source, tag="tts", duck=True)
+            await terminado
+        except Exception as e:
+            print(f"[TTS] Error en reproducción: {e}")
+        finally:
+            self.borrar_archivo(ruta)
 
     @commands.hybrid_command(name="stoptts", aliases=["shh", "callate"], description="Detiene el audio actual inmediatamente.")
     async def stoptts(self, ctx):
-        """Detiene la reproducción de voz al instante."""
-        voice_client = ctx.guild.voice_client
-        
-        if voice_client and voice_client.is_playing():
-            voice_client.stop() # Esto disparará 'limpiar_archivo' automáticamente
+        """Detiene la voz al instante (la música sigue sonando)."""
+        player = self.get_player(ctx.guild)
+
+        if player and await player.stop_overlays(tag="tts"):
             await ctx.send("🤫 Silencio.", ephemeral=True)
         else:
             await ctx.send("❌ No estoy diciendo nada ahora.", ephemeral=True)
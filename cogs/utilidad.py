@@ -41,6 +41,16 @@ def fmt_time(seconds: int) -> str:
         return f"{h}:{m:02d}:{s:02d}"
     return f"{m}:{s:02d}"
 
+def parse_time(text: str) -> int | None:
+    """"1:23", "1:02:03" o "83" -> segundos (None si no se entiende)."""
+    parts = (text or "").strip().split(":")
+    if not parts or len(parts) > 3 or not all(p.strip().isdigit() for p in parts):
+        return None
+    seconds = 0
+    for p in parts:
+        seconds = seconds * 60 + int(p)
+    return seconds
+
 def progress_bar(elapsed: float, total: float, length: int = 18):
     """Barra minimalista tipo Spotify: ▬▬▬🔘▬▬▬ + porcentaje."""
     if total <= 0:
@@ -53,13 +63,13 @@ def progress_bar(elapsed: float, total: float, length: int = 18):
     bar = "▬" * pos + "🔘" + "▬" * (length - 1 - pos)
     return bar, int(ratio * 100)
 
-def short_queue_preview(queue: list[str], limit: int = 3) -> str:
-    """Preview elegante de próximas canciones para embeds."""
+def short_queue_preview(queue: list[str], limit: int = 3, total: int | None = None) -> str:
+    """Preview elegante de próximas canciones para embeds (total: largo real si `queue` es un recorte)."""
     if not queue:
         return "—"
     items = queue[:limit]
     lines = [f"`{i+1}.` {clean_query(q)}" for i, q in enumerate(items)]
-    extra = len(queue) - limit
+    extra = (len(queue) if total is None else total) - limit
     if extra > 0:
         lines.append(f"*…y **{extra}** más.*")
     return "\n".join(lines)
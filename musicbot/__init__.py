@@ -1,5 +1,7 @@
 # musicbot/__init__.py
+from .cache import AudioCache
 from .downloader import YTDLDownloader
+from .resolve_cache import ResolveCache
 from .spotify import SpotifyResolver
-from .player import Track, GuildMusicPlayer, MusicService
+from .player import Track, PlayerState, GuildMusicPlayer, MusicService
 from .views import MusicControls, build_player_embed
\ No newline at end of file
@@ -0,0 +1,229 @@
+# musicbot/analysis.py
+from __future__ import annotations
+
+import asyncio
+import json
+import re
+import sqlite3
+import time
+from dataclasses import dataclass
+from typing import Optional, Dict, Tuple
+
+# Objetivo de sonoridad (EBU R128, igual que el loudnorm de una pasada que usábamos)
+TARGET_I = -16.0
+TARGET_TP = -1.5
+TARGET_LRA = 11.0
+LOUDNORM_FILTER = f"loudnorm=I={TARGET_I:g}:TP={TARGET_TP:g}:LRA={TARGET_LRA:g}"
+
+# Silencio al principio / final de la pista (se mide en la misma pasada que loudnorm)
+SILENCE_NOISE_DB = -50.0
+SILENCE_MIN_SECONDS = 0.3
+SILENCE_FILTER = f"silencedetect=noise={SILENCE_NOISE_DB:g}dB:d={SILENCE_MIN_SECONDS:g}"
+TRIM_MARGIN_SECONDS = 0.1     # no cortamos justo en el borde (ataque / cola del último sonido)
+
+_SILENCE_START_RE = re.compile(r"silence_start:\s*(-?[\d.]+)")
+_SILENCE_END_RE = re.compile(r"silence_end:\s*(-?[\d.]+)")
+_DURATION_RE = re.compile(r"Duration:\s*(\d+):(\d+):([\d.]+)")
+
+
+@dataclass
+class LoudnessInfo:
+    input_i: float
+    input_tp: float
+    input_lra: float
+    input_thresh: float
+    trim_start: float = 0.0      # segundos de silencio inicial a saltear
+    trim_end: float = 0.0        # posición donde empieza el silencio final (0 = no cortar)
+
+    def gain_db(self) -> float:
+        """
+        Ganancia lineal para llegar a TARGET_I sin pasar de TARGET_TP.
+        (Sin limitador: si el pico no deja subir más, nos quedamos cortos.)
+        """
+        return min(TARGET_I - self.input_i, TARGET_TP - self.input_tp)
+
+    def volume_filter(self) -> str:
+        return f"volume={self.gain_db():.2f}dB"
+
+
+class LoudnessStore:
+    """Mediciones de loudnorm persistidas por clave de caché (extractor-id)."""
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        with sqlite3.connect(self.db_path) as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS loudness (
+                    cache_key TEXT PRIMARY KEY,
+                    input_i REAL NOT NULL,
+                    input_tp REAL NOT NULL,
+                    input_lra REAL NOT NULL,
+                    input_thresh REAL NOT NULL,
+                    measured_at REAL NOT NULL
+                )
+            """)
+            cols = {row[1] for row in conn.execute("PRAGMA table_info(loudness)")}
+            for col in ("trim_start", "trim_end"):
+                if col not in cols:  # bases creadas antes del recorte de silencios
+                    conn.execute(f"ALTER TABLE loudness ADD COLUMN {col} REAL NOT NULL DEFAULT 0")
+
+    def get(self, key: str) -> Optional[LoudnessInfo]:
+        with sqlite3.connect(self.db_path) as conn:
+            row = conn.execute(
+                "SELECT input_i, input_tp, input_lra, input_thresh, trim_start, trim_end"
+                " FROM loudness WHERE cache_key = ?",
+                (key,),
+            ).fetchone()
+        return LoudnessInfo(*row) if row else None
+
+    def put(self, key: str, info: LoudnessInfo):
+        with sqlite3.connect(self.db_path) as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO loudness"
+                " (cache_key, input_i, input_tp, input_lra, input_thresh, measured_at, trim_start, trim_end)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    key, info.input_i, info.input_tp, info.input_lra, info.input_thresh, time.time(),
+                    info.trim_start, info.trim_end,
+                ),
+            )
+
+
+class AudioAnalyzer:
+    """
+    Analiza cada pista descargada UNA vez (primera pasada de loudnorm) en un worker de fondo.
+    - Una sola medición a la vez: no compite con las pistas que están sonando
+    - Resultados en memoria + SQLite (sobreviven reinicios y evicciones de la caché)
+    - Las reproducciones posteriores usan una ganancia lineal barata (volume=XdB)
+    - En la misma pasada: silencio inicial/final (silencedetect) -> trim_start / trim_end
+    """
+
+    def __init__(self, ffmpeg_path: str, db_path: str):
+        self.ffmpeg_path = ffmpeg_path
+        self.store = LoudnessStore(db_path)
+
+        self._mem: Dict[str, Optional[LoudnessInfo]] = {}
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._jobs: "asyncio.Queue[Tuple[str, str, asyncio.Future]]" = asyncio.Queue()
+        self._worker: Optional[asyncio.Task] = None
+
+    async def get(self, key: str) -> Optional[LoudnessInfo]:
+        """Medición guardada (o None si la pista aún no fue analizada)."""
+        if not key:
+            return None
+        if key not in self._mem:
+            try:
+                self._mem[key] = await asyncio.to_thread(self.store.get, key)
+            except Exception:
+                return None
+        return self._mem[key]
+
+    def submit(self, key: str, path: str) -> Optional[asyncio.Future]:
+        """Encola el análisis si hace falta. Retorna el future del resultado."""
+        if not key or self._mem.get(key):
+            return None
+        fut = self._inflight.get(key)
+        if fut:
+            return fut
+        fut = asyncio.get_running_loop().create_future()
+        self._inflight[key] = fut
+        self._jobs.put_nowait((key, path, fut))
+        if not self._worker or self._worker.done():
+            self._worker = asyncio.create_task(self._run())
+        return fut
+
+    async def analyze(self, key: str, path: str) -> Optional[LoudnessInfo]:
+        """Como submit(), pero espera el resultado (usa lo guardado si ya existe)."""
+        info = await self.get(key)
+        if info:
+            return info
+        fut = self.submit(key, path)
+        if not fut:
+            return await self.get(key)
+        return await asyncio.shield(fut)
+
+    async def _run(self):
+        while not self._jobs.empty():
+            key, path, fut = await self._jobs.get()
+            info = None
+            try:
+                info = await self.get(key) or await self._measure(path)
+                if info:
+                    self._mem[key] = info
+                    await asyncio.to_thread(self.store.put, key, info)
+            except Exception:
+                pass
+            finally:
+                self._inflight.pop(key, None)
+                if not fut.done():
+                    fut.set_result(info)
+
+    async def _measure(self, path: str) -> Optional[LoudnessInfo]:
+        proc = await asyncio.create_subprocess_exec(
+            self.ffmpeg_path,
+            "-nostdin", "-hide_banner", "-nostats",
+            "-i", path,
+            "-vn", "-af", f"{SILENCE_FILTER},{LOUDNORM_FILTER}:print_format=json",
+            "-f", "null", "-",
+            stdout=asyncio.subprocess.DEVNULL,
+            stderr=asyncio.subprocess.PIPE,
+        )
+        _, err = await proc.communicate()
+        if proc.returncode != 0:
+            return None
+        text = err.decode("utf-8", "replace")
+        info = self._parse_loudnorm(text)
+        if info:
+            info.trim_start, info.trim_end = self._parse_silence(text)
+        return info
+
+    @staticmethod
+    def _parse_silence(stderr: str) -> Tuple[float, float]:
+        """(trim_start, trim_end) a partir de silencedetect y la duración del archivo."""
+        m = _DURATION_RE.search(stderr)
+        if not m:
+            return 0.0, 0.0
+        duration = int(m.group(1)) * 3600 + int(m.group(2)) * 60 + float(m.group(3))
+
+        # pares (inicio, fin); el último puede no tener fin si el silencio llega al final
+        spans = []
+        for line in stderr.splitlines():
+            s = _SILENCE_START_RE.search(line)
+            if s:
+                spans.append([float(s.group(1)), duration])
+                continue
+            e = _SILENCE_END_RE.search(line)
+            if e and spans:
+                spans[-1][1] = float(e.group(1))
+        if not spans:
+            return 0.0, 0.0
+
+        trim_start = trim_end = 0.0
+        first_start, first_end = spans[0]
+        if first_start <= SILENCE_MIN_SECONDS and first_end < duration:
+            trim_start = max(0.0, first_end - TRIM_MARGIN_SECONDS)
+        last_start, last_end = spans[-1]
+        if last_end >= duration - SILENCE_MIN_SECONDS and last_start > trim_start:
+            trim_end = min(duration, last_start + TRIM_MARGIN_SECONDS)
+        return round(trim_start, 2), round(trim_end, 2)
+
+    @staticmethod
+    def _parse_loudnorm(stderr: str) -> Optional[LoudnessInfo]:
+        start = stderr.rfind("{")
+        end = stderr.rfind("}")
+        if start < 0 or end <= start:
+            return None
+        try:
+            data = json.loads(stderr[start:end + 1])
+            info = LoudnessInfo(
+                input_i=float(data["input_i"]),
+                input_tp=float(data["input_tp"]),
+                input_lra=float(data["input_lra"]),
+                input_thresh=float(data["input_thresh"]),
+            )
+        except (ValueError, KeyError, TypeError):
+            return None
+        # silencio total / medición inválida -> -inf
+        if info.input_i == float("-inf") or info.input_i < -70:
+            return None
+        return info
@@ -0,0 +1,459 @@
+# musicbot/audionode.py
+from __future__ import annotations
+
+import asyncio
+import itertools
+import json
+import mmap
+import multiprocessing
+import os
+import shlex
+import struct
+import subprocess
+import tempfile
+import threading
+import time
+import uuid
+from typing import Any, Dict, List, Optional
+
+import discord
+from discord.oggparse import OggStream
+
+# ---------- ring buffer en memoria compartida ----------
+# cabecera: write, read, flush (u64) | estado (u32) | slots, slot_size (u32)
+_HEADER = struct.Struct("<QQQIII")
+_HEADER_SIZE = 64
+_LEN = struct.Struct("<I")
+_OFF_WRITE, _OFF_READ, _OFF_FLUSH, _OFF_STATE = 0, 8, 16, 24
+_U64 = struct.Struct("<Q")
+_U32 = struct.Struct("<I")
+
+STATE_RUNNING, STATE_EOF, STATE_ERROR = 0, 1, 2
+
+RING_SLOTS = 256             # ~5 s de Opus por delante
+RING_SLOT_SIZE = 4000        # paquete Opus máximo razonable (PCM no viaja por el ring)
+UNDERRUN_TIMEOUT = 10.0      # sin frames ni EOF por tanto tiempo: el nodo se cayó
+
+_SHM_DIR = "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+
+
+class FrameRing:
+    """
+    Cola circular de paquetes (un productor: el nodo; un consumidor: el hilo de audio del bot).
+    - Archivo mmap en /dev/shm: los dos procesos ven la misma memoria, sin pipes ni sockets
+    - El nodo solo escribe `write`/`flush`/estado; el bot solo escribe `read`
+    - flush: el lector salta hasta ahí (seek sin rehacer el ring)
+    """
+
+    def __init__(self, path: str, slots: int = RING_SLOTS, slot_size: int = RING_SLOT_SIZE, create: bool = False):
+        self.path = path
+        if create:
+            size = _HEADER_SIZE + slots * (_LEN.size + slot_size)
+            with open(path, "wb") as f:
+                f.truncate(size)
+        self._fd = os.open(path, os.O_RDWR)
+        self._mm = mmap.mmap(self._fd, 0)
+        if create:
+            _HEADER.pack_into(self._mm, 0, 0, 0, 0, STATE_RUNNING, slots, slot_size)
+        *_, self.slots, self.slot_size = _HEADER.unpack_from(self._mm, 0)
+        self._stride = _LEN.size + self.slot_size
+
+    @classmethod
+    def create(cls, slots: int = RING_SLOTS, slot_size: int = RING_SLOT_SIZE) -> "FrameRing":
+        path = os.path.join(_SHM_DIR, f"grooveos-ring-{uuid.uuid4().hex}")
+        return cls(path, slots, slot_size, create=True)
+
+    # ---------- índices ----------
+    def _get(self, off: int) -> int:
+        return _U64.unpack_from(self._mm, off)[0]
+
+    def _set(self, off: int, value: int):
+        _U64.pack_into(self._mm, off, value)
+
+    @property
+    def state(self) -> int:
+        return _U32.unpack_from(self._mm, _OFF_STATE)[0]
+
+    def set_state(self, state: int):
+        _U32.pack_into(self._mm, _OFF_STATE, state)
+
+    def pending(self) -> int:
+        return self._get(_OFF_WRITE) - max(self._get(_OFF_READ), self._get(_OFF_FLUSH))
+
+    # ---------- productor (nodo) ----------
+    def free(self) -> int:
+        return self.slots - (self._get(_OFF_WRITE) - self._get(_OFF_READ))
+
+    def put(self, packet: bytes) -> bool:
+        if len(packet) > self.slot_size or self.free() <= 0:
+            return False
+        w = self._get(_OFF_WRITE)
+        off = _HEADER_SIZE + (w % self.slots) * self._stride
+        _LEN.pack_into(self._mm, off, len(packet))
+        self._mm[off + _LEN.size:off + _LEN.size + len(packet)] = packet
+        self._set(_OFF_WRITE, w + 1)  # publicar después de copiar el paquete
+        return True
+
+    def flush(self):
+        """Descarta lo encolado (seek): el lector salta al write actual."""
+        self._set(_OFF_FLUSH, self._get(_OFF_WRITE))
+        self.set_state(STATE_RUNNING)
+
+    # ---------- consumidor (bot) ----------
+    def get(self) -> Optional[bytes]:
+        r = max(self._get(_OFF_READ), self._get(_OFF_FLUSH))
+        if r >= self._get(_OFF_WRITE):
+            if r != self._get(_OFF_READ):
+                self._set(_OFF_READ, r)
+            return None
+        off = _HEADER_SIZE + (r % self.slots) * self._stride
+        n = _LEN.unpack_from(self._mm, off)[0]
+        data = self._mm[off + _LEN.size:off + _LEN.size + n]
+        self._set(_OFF_READ, r + 1)
+        return data
+
+    def close(self, unlink: bool = False):
+        try:
+            self._mm.close()
+            os.close(self._fd)
+        except (OSError, ValueError):
+            pass
+        if unlink:
+            try:
+                os.remove(self.path)
+            except OSError:
+                pass
+
+
+# ---------- proceso del nodo ----------
+class _Session:
+    """Un FFmpeg -> paquetes Opus -> ring. Corre en su propio hilo dentro del nodo."""
+
+    def __init__(self, ffmpeg_path: str, ring_path: str, spec: Dict[str, Any]):
+        self.ffmpeg_path = ffmpeg_path
+        self.ring = FrameRing(ring_path)
+        self.spec = spec
+        self.start_at = float(spec.get("start_at") or 0.0)
+        self.frames = 0
+        self.paused = False
+        self.stopped = False
+        self._proc: Optional[subprocess.Popen] = None
+        self._restart = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _args(self) -> List[str]:
+        spec = self.spec
+        args = [self.ffmpeg_path, *shlex.split(spec.get("before_options") or "")]
+        if self.start_at > 0:
+            args += ["-ss", f"{self.start_at:.2f}"]
+        args += ["-i", spec["input"], *shlex.split(spec.get("options") or "")]
+        args += [
+            "-map_metadata", "-1", "-f", "opus", "-c:a", spec.get("codec") or "libopus",
+            "-ar", "48000", "-ac", "2", "-b:a", "128k", "-loglevel", "warning",
+            "-fec", "true", "-packet_loss", "15", "pipe:1",
+        ]
+        return args
+
+    def _run(self):
+        while not self.stopped:
+            self._restart.clear()
+            try:
+                self._proc = subprocess.Popen(
+                    self._args(), stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL
+                )
+            except OSError:
+                self.ring.set_state(STATE_ERROR)
+                return
+            try:
+                for packet in OggStream(self._proc.stdout).iter_packets():
+                    if packet.startswith((b"OpusHead", b"OpusTags")):
+                        continue
+                    while not self.stopped and not self._restart.is_set() and (
+                        self.paused or not self.ring.put(packet)
+                    ):
+                        time.sleep(0.005)  # ring lleno o en pausa: FFmpeg se frena por backpressure
+                    if self.stopped or self._restart.is_set():
+                        break
+                    self.frames += 1
+            except Exception:
+                if not (self.stopped or self._restart.is_set()):
+                    self.ring.set_state(STATE_ERROR)
+                    self._kill()
+                    return
+            self._kill()
+            if self._restart.is_set():
+                continue
+            if not self.stopped:
+                self.ring.set_state(STATE_EOF)
+            return
+
+    def _kill(self):
+        proc, self._proc = self._proc, None
+        if proc and proc.poll() is None:
+            proc.kill()
+            try:
+                proc.wait(timeout=2)
+            except subprocess.TimeoutExpired:
+                pass
+
+    def seek(self, seconds: float):
+        self.start_at = max(0.0, seconds)
+        self.frames = 0
+        self._restart.set()
+        self._kill()
+        self.ring.flush()
+
+    def stop(self):
+        self.stopped = True
+        self._kill()
+        self._thread.join(timeout=2)
+        self.ring.close()
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "position": self.start_at + self.frames * 0.02,
+            "paused": self.paused,
+            "state": self.ring.state,
+            "buffered": self.ring.pending(),
+        }
+
+
+class _NodeServer:
+    def __init__(self, ffmpeg_path: str):
+        self.ffmpeg_path = ffmpeg_path
+        self.sessions: Dict[str, _Session] = {}
+
+    def handle(self, msg: Dict[str, Any]) -> Dict[str, Any]:
+        op, sid = msg.get("op"), msg.get("sid")
+        if op == "status":
+            if sid:
+                s = self.sessions.get(sid)
+                return {"ok": bool(s), **(s.status() if s else {})}
+            return {"ok": True, "pid": os.getpid(), "sessions": len(self.sessions)}
+        if op == "play":
+            old = self.sessions.pop(sid, None)
+            if old:
+                old.stop()
+            self.sessions[sid] = _Session(self.ffmpeg_path, msg["ring"], msg)
+            return {"ok": True}
+        s = self.sessions.get(sid)
+        if not s:
+            return {"ok": False, "error": "sesión desconocida"}
+        if op == "pause":
+            s.paused = True
+        elif op == "resume":
+            s.paused = False
+        elif op == "seek":
+            s.seek(float(msg.get("seconds") or 0.0))
+        elif op == "stop":
+            self.sessions.pop(sid, None)
+            s.stop()
+        else:
+            return {"ok": False, "error": f"op desconocida: {op}"}
+        return {"ok": True}
+
+    async def client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while line := await reader.readline():
+                msg = json.loads(line)
+                try:
+                    # stop/seek esperan a FFmpeg: fuera del loop del nodo
+                    reply = await asyncio.to_thread(self.handle, msg)
+                except Exception as e:
+                    reply = {"ok": False, "error": f"{type(e).__name__}: {e}"}
+                reply["id"] = msg.get("id")
+                writer.write(json.dumps(reply).encode() + b"\n")
+                await writer.drain()
+        except (ConnectionError, json.JSONDecodeError):
+            pass
+        finally:
+            writer.close()
+
+
+def run_node(socket_path: str, ffmpeg_path: str):
+    """Punto de entrada del proceso del nodo de audio."""
+    async def _main():
+        server = _NodeServer(ffmpeg_path)
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+        srv = await asyncio.start_unix_server(server.client, path=socket_path)
+        async with srv:
+            await srv.serve_forever()
+
+    asyncio.run(_main())
+
+
+# ---------- lado del bot ----------
+class NodeAudioSource(discord.AudioSource):
+    """
+    Fuente Opus producida por un nodo de audio: read() solo copia un paquete del ring.
+    - Corre en el hilo de audio sin tocar el event loop: si el bot está ocupado, el audio sigue
+    - Espera (hasta UNDERRUN_TIMEOUT) si el nodo todavía no produjo el siguiente paquete
+    """
+
+    def __init__(self, client: "AudioNodeClient", sid: str, ring: FrameRing):
+        self.client = client
+        self.sid = sid
+        self.ring = ring
+        self._closed = False
+
+    def read(self) -> bytes:
+        deadline = time.monotonic() + UNDERRUN_TIMEOUT
+        while not self._closed:
+            data = self.ring.get()
+            if data is not None:
+                return data
+            if self.ring.state != STATE_RUNNING or time.monotonic() > deadline:
+                return b""
+            time.sleep(0.002)
+        return b""
+
+    def is_opus(self) -> bool:
+        return True
+
+    def seek(self, seconds: float):
+        self.client.send("seek", sid=self.sid, seconds=seconds)
+
+    def cleanup(self):
+        if self._closed:
+            return
+        self._closed = True
+        self.client.send("stop", sid=self.sid)
+        self.ring.close(unlink=True)
+
+
+class AudioNodeClient:
+    """
+    Controla un proceso de audio (lo lanza y lo relanza si se cae) por un socket Unix local.
+    Protocolo: una línea JSON por pedido {"id", "op", ...} -> una línea JSON de respuesta.
+    ops: play, pause, resume, seek, stop, status.
+    """
+
+    def __init__(self, socket_path: str, ffmpeg_path: str = "ffmpeg"):
+        self.socket_path = socket_path
+        self.ffmpeg_path = ffmpeg_path
+        self._proc: Optional[multiprocessing.process.BaseProcess] = None
+        self._reader: Optional[asyncio.StreamReader] = None
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._pending: Dict[int, asyncio.Future] = {}
+        self._ids = itertools.count(1)
+        self._connect_lock: Optional[asyncio.Lock] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._tasks: set[asyncio.Task] = set()  # lector de respuestas / envíos sin esperar
+
+    def _keep(self, task: asyncio.Task):
+        # el loop solo guarda referencias débiles: sin esto la tarea puede desaparecer a mitad
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    # ---------- proceso / conexión ----------
+    def _spawn(self):
+        if self._proc and self._proc.is_alive():
+            return
+        ctx = multiprocessing.get_context("spawn")
+        self._proc = ctx.Process(
+            target=run_node, args=(self.socket_path, self.ffmpeg_path), daemon=True, name="grooveos-audio-node"
+        )
+        self._proc.start()
+
+    async def _ensure(self):
+        if self._writer and not self._writer.is_closing() and self._proc and self._proc.is_alive():
+            return
+        if self._connect_lock is None:
+            self._connect_lock = asyncio.Lock()
+        async with self._connect_lock:
+            if self._writer and not self._writer.is_closing() and self._proc and self._proc.is_alive():
+                return
+            self._spawn()
+            for _ in range(100):
+                try:
+                    self._reader, self._writer = await asyncio.open_unix_connection(self.socket_path)
+                    break
+                except (FileNotFoundError, ConnectionRefusedError):
+                    await asyncio.sleep(0.05)
+            else:
+                raise ConnectionError("el nodo de audio no respondió")
+            self._keep(asyncio.create_task(self._read_replies(self._reader)))
+
+    async def _read_replies(self, reader: asyncio.StreamReader):
+        try:
+            while line := await reader.readline():
+                reply = json.loads(line)
+                fut = self._pending.pop(reply.get("id"), None)
+                if fut and not fut.done():
+                    fut.set_result(reply)
+        except (ConnectionError, json.JSONDecodeError):
+            pass
+        for fut in self._pending.values():
+            if not fut.done():
+                fut.set_exception(ConnectionError("se perdió la conexión con el nodo de audio"))
+        self._pending.clear()
+
+    async def request(self, op: str, **kwargs) -> Dict[str, Any]:
+        self._loop = asyncio.get_running_loop()
+        await self._ensure()
+        rid = next(self._ids)
+        fut = self._loop.create_future()
+        self._pending[rid] = fut
+        self._writer.write(json.dumps({"id": rid, "op": op, **kwargs}).encode() + b"\n")
+        await self._writer.drain()
+        return await asyncio.wait_for(fut, 10)
+
+    def send(self, op: str, **kwargs):
+        """Pedido sin esperar respuesta; se puede llamar desde cualquier hilo (ej: cleanup del audio)."""
+        loop = self._loop
+        if not loop or loop.is_closed():
+            return
+
+        async def _run():
+            try:
+                await self.request(op, **kwargs)
+            except Exception:
+                pass
+
+        loop.call_soon_threadsafe(lambda: self._keep(loop.create_task(_run())))
+
+    # ---------- API ----------
+    def open(self, source: str, before_options: str = "", options: str = "", codec: str = "libopus",
+             start_at: float = 0.0) -> NodeAudioSource:
+        """
+        Crea la fuente ya: el pedido "play" sale en segundo plano y read() espera el primer paquete.
+        codec="copy" para Ogg/Opus ya codificado (passthrough).
+        """
+        self._loop = asyncio.get_running_loop()
+        ring = FrameRing.create()
+        sid = uuid.uuid4().hex
+        self.send(
+            "play", sid=sid, ring=ring.path, input=source, before_options=before_options,
+            options=options, codec=codec, start_at=start_at,
+        )
+        return NodeAudioSource(self, sid, ring)
+
+    async def status(self) -> Dict[str, Any]:
+        return await self.request("status")
+
+    def close(self):
+        if self._writer:
+            self._writer.close()
+        if self._proc and self._proc.is_alive():
+            self._proc.terminate()
+        self._proc = None
+
+
+class AudioNodePool:
+    """Varios nodos de audio; cada servidor (guild) queda fijo en uno."""
+
+    def __init__(self, count: int, socket_dir: str, ffmpeg_path: str = "ffmpeg"):
+        os.makedirs(socket_dir, exist_ok=True)
+        self.nodes = [
+            AudioNodeClient(os.path.join(socket_dir, f"audio-node-{i}.sock"), ffmpeg_path)
+            for i in range(max(1, count))
+        ]
+
+    def for_guild(self, guild_id: int) -> AudioNodeClient:
+        return self.nodes[guild_id % len(self.nodes)]
+
+    def close(self):
+        for node in self.nodes:
+            node.close()
@@ -0,0 +1,205 @@
+# musicbot/cache.py
+from __future__ import annotations
+
+import asyncio
+import os
+import re
+import shutil
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional, Dict, Any, Callable, Awaitable
+
+_SAFE_KEY_RE = re.compile(r"[^A-Za-z0-9_-]")
+_VARIANT_SEP = "~"  # nunca sale de key_for(), separa clave base y variante
+_PARTIAL_SUFFIXES = (".part", ".ytdl", ".tmp")
+
+
+@dataclass
+class CacheEntry:
+    key: str
+    path: str
+    size: int
+    last_access: float
+
+
+class AudioCache:
+    """
+    Caché de audio compartida entre servidores.
+    - Clave = extractor + id del video (ej: "youtube-dQw4w9WgXcQ"), no el uid del Track
+    - LRU por último acceso (se guarda en el mtime del archivo -> sobrevive reinicios)
+    - Presupuesto de disco en bytes; lo fijado (pin) nunca se expulsa
+    - Descargas concurrentes de la misma clave se comparten (single-flight)
+    - Variantes derivadas (ej: "<clave>~opus") comparten el pin de su clave base
+    """
+
+    def __init__(self, root: str, max_bytes: int):
+        self.root = root
+        self.max_bytes = max(0, int(max_bytes))
+        self.staging_dir = os.path.join(root, ".incoming")
+
+        self._entries: "OrderedDict[str, CacheEntry]" = OrderedDict()  # orden = LRU -> MRU
+        self._pins: Dict[str, int] = {}
+        self._inflight: Dict[str, asyncio.Future] = {}
+
+        os.makedirs(self.root, exist_ok=True)
+        # restos de descargas interrumpidas
+        shutil.rmtree(self.staging_dir, ignore_errors=True)
+        os.makedirs(self.staging_dir, exist_ok=True)
+        self._scan()
+
+    # ---------- claves ----------
+    @staticmethod
+    def key_for(info: Optional[Dict[str, Any]]) -> str:
+        """Clave estable a partir de la info de yt-dlp ("" si no hay id)."""
+        if not isinstance(info, dict) or not info.get("id"):
+            return ""
+        extractor = info.get("extractor_key") or info.get("extractor") or "media"
+        return _SAFE_KEY_RE.sub("_", f"{extractor}-{info['id']}".lower())
+
+    @staticmethod
+    def variant_key(key: str, variant: str) -> str:
+        return f"{key}{_VARIANT_SEP}{variant}" if key else ""
+
+    @staticmethod
+    def _base_key(key: str) -> str:
+        return key.split(_VARIANT_SEP, 1)[0]
+
+    # ---------- índice ----------
+    def _scan(self):
+        found = []
+        try:
+            names = os.listdir(self.root)
+        except Exception:
+            names = []
+        for name in names:
+            if name.startswith(".") or name.endswith(_PARTIAL_SUFFIXES):
+                continue
+            path = os.path.join(self.root, name)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            if not os.path.isfile(path):
+                continue
+            key = name.rsplit(".", 1)[0]
+            found.append(CacheEntry(key=key, path=path, size=st.st_size, last_access=st.st_mtime))
+
+        for entry in sorted(found, key=lambda e: e.last_access):
+            self._entries[entry.key] = entry
+        self._evict()
+
+    def total_bytes(self) -> int:
+        return sum(e.size for e in self._entries.values())
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: str) -> bool:
+        return bool(key) and key in self._entries
+
+    def get(self, key: str) -> Optional[str]:
+        """Devuelve la ruta si está en caché y la marca como usada recientemente."""
+        entry = self._entries.get(key) if key else None
+        if not entry:
+            return None
+        if not os.path.exists(entry.path):
+            self._entries.pop(key, None)
+            return None
+        entry.last_access = time.time()
+        self._entries.move_to_end(key)
+        try:
+            os.utime(entry.path, (entry.last_access, entry.last_access))
+        except OSError:
+            pass
+        return entry.path
+
+    def add(self, key: str, src_path: str) -> str:
+        """Mueve src_path dentro de la caché bajo `key` y devuelve la ruta final."""
+        ext = os.path.splitext(src_path)[1] or ".audio"
+        final = os.path.join(self.root, f"{key}{ext}")
+        old = self._entries.pop(key, None)
+        if old and old.path != final:
+            self._unlink(old.path)
+        if os.path.abspath(src_path) != os.path.abspath(final):
+            os.replace(src_path, final)
+
+        now = time.time()
+        try:
+            os.utime(final, (now, now))
+            size = os.path.getsize(final)
+        except OSError:
+            size = 0
+        self._entries[key] = CacheEntry(key=key, path=final, size=size, last_access=now)
+        self._evict()
+        return final
+
+    # ---------- pins ----------
+    def pin(self, key: str):
+        if key:
+            self._pins[key] = self._pins.get(key, 0) + 1
+
+    def unpin(self, key: str):
+        if not key or key not in self._pins:
+            return
+        self._pins[key] -= 1
+        if self._pins[key] <= 0:
+            del self._pins[key]
+        self._evict()
+
+    def is_pinned(self, key: str) -> bool:
+        return self._base_key(key) in self._pins
+
+    # ---------- expulsión ----------
+    def _unlink(self, path: str):
+        try:
+            if os.path.exists(path):
+                os.remove(path)
+        except Exception:
+            pass
+
+    def _evict(self):
+        if not self.max_bytes:
+            return
+        total = self.total_bytes()
+        if total <= self.max_bytes:
+            return
+        for key in list(self._entries.keys()):  # LRU primero
+            if total <= self.max_bytes:
+                break
+            if self.is_pinned(key) or key in self._inflight:
+                continue
+            entry = self._entries.pop(key)
+            self._unlink(entry.path)
+            total -= entry.size
+
+    # ---------- descargas ----------
+    async def fetch(self, key: str, producer: Callable[[], Awaitable[Optional[str]]]) -> Optional[str]:
+        """
+        Devuelve la ruta en caché de `key`; si no está, ejecuta producer()
+        (que debe devolver un archivo en staging) una sola vez aunque lo pidan varios.
+        """
+        path = self.get(key)
+        if path:
+            return path
+
+        fut = self._inflight.get(key)
+        if fut:
+            return await asyncio.shield(fut)
+
+        fut = asyncio.get_running_loop().create_future()
+        self._inflight[key] = fut
+        try:
+            produced = await producer()
+            path = self.add(key, produced) if produced and os.path.exists(produced) else None
+            fut.set_result(path)
+            return path
+        except asyncio.CancelledError:
+            fut.set_result(None)  # quien esperaba reintentará por su cuenta
+            raise
+        except Exception as e:
+            fut.set_exception(e)
+            fut.exception()  # evita "exception was never retrieved" si nadie espera
+            raise
+        finally:
+            self._inflight.pop(key, None)
@@ -2,12 +2,26 @@
 from __future__ import annotations
 
 import asyncio
+import concurrent.futures
 import os
+import threading
+from collections import OrderedDict
 from dataclasses import dataclass
-from typing import Optional, Dict, Any
+from typing import AsyncIterator, Callable, Optional, Dict, Any, List, Tuple
 
 import yt_dlp
 
+from .resolve_cache import ResolveCache
+from .shaping import BandwidthShaper
+from .workers import SEARCH_OPTS, YTDLWorkerPool, flat_entry, search_entries, slim_info
+
+HEDGE_POLL_SECONDS = 0.5         # cada cuánto se mira si la descarga escribió algo
+DURATION_TOLERANCE = 0.08        # candidato aceptable: ±8% de la duración esperada...
+DURATION_SLACK_SECONDS = 6       # ...o ±6 s en pistas cortas
+_CANDIDATES_MAX = 256            # búsquedas recordadas en memoria
+PLAYLIST_BATCH = 50              # entradas por tanda al ingerir una playlist (la primera va sola)
+PLAYLIST_MAX = 1000              # tope de entradas por playlist
+
 
 @dataclass
 class DownloadResult:
@@ -15,18 +29,70 @@ class DownloadResult:
     info: Dict[str, Any]
 
 
+@dataclass
+class StreamSource:
+    url: str
+    headers: Dict[str, str]
+
+
+@dataclass
+class HedgeStats:
+    downloads: int = 0       # descargas con candidatos alternativos disponibles
+    hedged: int = 0          # se lanzó una segunda descarga por lentitud
+    fallbacks: int = 0       # la principal falló y se probó con otro candidato
+    alt_wins: int = 0        # terminó primero (o solo) un candidato alternativo
+
+
+def similar_duration(a: int, b: int) -> bool:
+    if a <= 0 or b <= 0:
+        return False
+    return abs(a - b) <= max(DURATION_SLACK_SECONDS, DURATION_TOLERANCE * max(a, b))
+
+
 class YTDLDownloader:
     """
     - Resuelve info (title, duration, url, thumbnail) usando yt-dlp
-    - Descarga audio al disco (no streaming) para reproducción estable
+    - Expone la URL directa del audio para reproducir en streaming
+    - Descarga audio al disco para caché / replay y como fallback estable
+    - Resoluciones cacheadas en SQLite (ResolveCache) y coalescidas: una sola extracción
+      aunque varios pidan la misma query a la vez
+    - Con workers > 0, yt-dlp corre en un pool de procesos (YTDLWorkerPool); si no, en hilos
+    - Descargas "hedged": para búsquedas se guardan los N mejores resultados; si la descarga
+      no avanza en `hedge_after` s (o falla) se lanza la de otro candidato de duración parecida
+      y gana la primera que termine
+    - resolve_metadata(): solo metadata vía búsqueda plana (cola larga: títulos y duraciones
+      sin extraer cada video); el resultado sirve también de candidatos para el hedging
+    - iter_playlist(): playlists / mixes de YouTube como generador asíncrono de tandas planas
+    - Descargas en segundo plano limitadas por BandwidthShaper (global + por servidor, más estricto
+      con más conexiones de voz); la pista que suena (exempt()) va siempre a toda velocidad
     """
 
-    def __init__(self):
+    def __init__(
+        self,
+        resolve_cache: Optional[ResolveCache] = None,
+        workers: int = 0,
+        job_timeout: float = 120.0,
+        max_jobs_per_worker: int = 50,
+        hedge_after: float = 8.0,
+        hedge_candidates: int = 3,
+        shaper: Optional[BandwidthShaper] = None,
+    ):
+        self.resolve_cache = resolve_cache
+        self._resolving: Dict[str, asyncio.Future] = {}
+
+        self.hedge_after = hedge_after
+        self.hedge_candidates = hedge_candidates
+        self.hedge_stats = HedgeStats()
+        self._candidates: "OrderedDict[str, List[Dict[str, Any]]]" = OrderedDict()
+        self._losers: set[asyncio.Task] = set()
+        self.shaper = shaper
+
         self._resolve_opts = {
             "quiet": True,
             "no_warnings": True,
             "default_search": "ytsearch1",
             "noplaylist": True,
+            "format": "bestaudio/best",  # así info["url"] apunta al stream de audio
             "extract_flat": False,
             "skip_download": True,
         }
@@ -35,54 +101,502 @@ class YTDLDownloader:
             "quiet": True,
             "no_warnings": True,
             "format": "bestaudio/best",
+            "default_search": "ytsearch1",  # query sin URL -> resolver y descargar en una pasada
             "noplaylist": True,
             "retries": 3,
             "fragment_retries": 3,
             "concurrent_fragment_downloads": 4,
         }
 
-    async def resolve_youtube_info(self, query_or_url: str) -> Dict[str, Any]:
+        self.pool: Optional[YTDLWorkerPool] = None
+        if workers > 0:
+            self.pool = YTDLWorkerPool(
+                self._resolve_opts,
+                self._download_opts_base,
+                workers=workers,
+                job_timeout=job_timeout,
+                max_jobs_per_worker=max_jobs_per_worker,
+            )
+
+    def close(self):
+        if self.pool:
+            self.pool.close()
+
+    async def cached_info(self, query_or_url: str) -> Optional[Dict[str, Any]]:
+        """Solo mira la caché de resoluciones (nunca extrae). None si no hay hit válido."""
+        if not self.resolve_cache:
+            return None
+        key = ResolveCache.normalize((query_or_url or "").strip())
+        try:
+            hit = await asyncio.to_thread(self.resolve_cache.get, key)
+        except Exception:
+            return None
+        return hit.info if hit and hit.ok else None
+
+    async def resolve_youtube_info(self, query_or_url: str, fresh: bool = False) -> Dict[str, Any]:
         """
         Acepta búsqueda o URL. Si es búsqueda, usa ytsearch1.
         Retorna info del primer resultado.
+        - Con caché: un hit devuelve solo metadata (sin "url" de stream); fresh=True fuerza extracción
+        - Fallos recientes cacheados -> LookupError sin volver a extraer
         """
         q = (query_or_url or "").strip()
+        key = ResolveCache.normalize(q)
+
+        if self.resolve_cache and not fresh:
+            hit = await asyncio.to_thread(self.resolve_cache.get, key)
+            if hit:
+                if not hit.ok:
+                    raise LookupError(f"Sin resultados (cacheado): {q}")
+                return hit.info
+
+        pending = self._resolving.get(key)
+        if pending:
+            return await asyncio.shield(pending)
+
+        fut = asyncio.get_running_loop().create_future()
+        self._resolving[key] = fut
+        missing = False
+        try:
+            info = await self._extract_info(q)
+            if not info:
+                missing = True
+                raise LookupError(f"Sin resultados: {q}")
+        except asyncio.CancelledError:
+            fut.set_exception(LookupError(f"Resolución cancelada: {q}"))
+            fut.exception()
+            raise
+        except Exception as e:
+            # solo "sin resultados" se recuerda; red caída, timeout o pool roto se reintentan
+            if missing and self.resolve_cache:
+                try:
+                    await asyncio.to_thread(self.resolve_cache.put_miss, key)
+                except Exception:
+                    pass
+            fut.set_exception(e)
+            fut.exception()  # evita "exception was never retrieved" si nadie espera
+            raise
+        finally:
+            self._resolving.pop(key, None)
+
+        if self.resolve_cache:
+            try:
+                await asyncio.to_thread(self.resolve_cache.put, key, info)
+            except Exception:
+                pass
+        fut.set_result(info)
+        return info
+
+    async def resolve_metadata(self, query_or_url: str) -> Optional[Dict[str, Any]]:
+        """
+        Metadata (id, título, duración, miniatura) sin formatos ni URL de stream.
+        Búsquedas: primer resultado de la búsqueda plana, guardado en la caché de resoluciones
+        bajo la misma clave que usaría resolve_youtube_info. Links: resolución normal (cacheada).
+        None si no hay resultados.
+        """
+        q = (query_or_url or "").strip()
+        if not q:
+            return None
+        info = await self.cached_info(q)
+        if info:
+            return info
+        if q.startswith(("http://", "https://")):
+            try:
+                return await self.resolve_youtube_info(q)
+            except Exception:
+                return None
+
+        key = ResolveCache.normalize(q)
+        entries = await self.search_candidates(q)
+        if not entries:
+            if self.resolve_cache:
+                try:
+                    await asyncio.to_thread(self.resolve_cache.put_miss, key)
+                except Exception:
+                    pass
+            return None
+        info = dict(entries[0], extractor_key="Youtube")
+        if self.resolve_cache:
+            try:
+                await asyncio.to_thread(self.resolve_cache.put, key, info)
+            except Exception:
+                pass
+        return info
+
+    async def iter_playlist(
+        self, url: str, limit: int = PLAYLIST_MAX, batch_size: int = PLAYLIST_BATCH
+    ) -> AsyncIterator[List[Dict[str, Any]]]:
+        """
+        Entradas de una playlist o mix (extracción plana) por tandas, a medida que yt-dlp pagina.
+        - La primera tanda trae una sola entrada: puede empezar a sonar antes de leer el resto
+        - Como mucho `limit` entradas; LookupError si la lista no existe o está vacía
+        - Corre en un hilo (el generador perezoso de yt-dlp no cruza procesos). Entre el hilo y
+          quien consume hay a lo sumo dos tandas: si nadie lee, el hilo espera en vez de acumular
+        - Cerrar el generador (break / cancelación) detiene la paginación
+        """
+        loop = asyncio.get_running_loop()
+        out: "asyncio.Queue[Any]" = asyncio.Queue(maxsize=2)
+        stop = threading.Event()
+        end = object()
+
+        def _put(item: Any) -> bool:
+            fut = asyncio.run_coroutine_threadsafe(out.put(item), loop)
+            while not stop.is_set():
+                try:
+                    fut.result(timeout=0.5)
+                    return True
+                except concurrent.futures.TimeoutError:
+                    continue
+            fut.cancel()
+            return False
+
+        def _walk():
+            sent = 0
+            try:
+                with yt_dlp.YoutubeDL(SEARCH_OPTS) as ydl:
+                    info = ydl.extract_info(url, download=False, process=False)
+                    # watch?v=...&list=... llega como referencia a la lista: se sigue
+                    while isinstance(info, dict) and info.get("_type") in ("url", "url_transparent"):
+                        info = ydl.extract_info(
+                            info["url"], download=False, process=False, ie_key=info.get("ie_key")
+                        )
+                    batch: List[Dict[str, Any]] = []
+                    for e in (info or {}).get("entries") or []:
+                        if stop.is_set():
+                            return
+                        item = flat_entry(e)
+                        if not item:
+                            continue
+                        batch.append(item)
+                        sent += 1
+                        if sent == 1 or len(batch) >= batch_size or sent >= limit:
+                            if not _put(batch):
+                                return
+                            batch = []
+                        if sent >= limit:
+                            break
+                    if batch and not _put(batch):
+                        return
+                if not sent:
+                    _put(LookupError(f"Playlist vacía o inaccesible: {url}"))
+            except Exception as e:
+                _put(e)
+            finally:
+                _put(end)
+
+        loop.run_in_executor(None, _walk)
+        try:
+            while True:
+                item = await out.get()
+                if item is end:
+                    break
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        finally:
+            stop.set()  # el hilo sale en la próxima entrada (o al esperar lugar en la cola)
+
+    async def _extract_info(self, q: str) -> Optional[Dict[str, Any]]:
+        if self.pool:
+            return await self.pool.resolve(q) or None
 
         def _extract():
             with yt_dlp.YoutubeDL(self._resolve_opts) as ydl:
                 info = ydl.extract_info(q, download=False)
                 if isinstance(info, dict) and "entries" in info:
-                    return info["entries"][0]
-                return info
+                    entries = [e for e in (info["entries"] or []) if e]
+                    return slim_info(entries[0]) if entries else None
+                return slim_info(info) or None
 
         return await asyncio.to_thread(_extract)
 
-    async def download_audio(self, url: str, out_dir: str, uid: str) -> DownloadResult:
+    async def search_candidates(self, query: str) -> List[Dict[str, Any]]:
+        """
+        Los `hedge_candidates` primeros resultados de una búsqueda (extracción plana, barata).
+        Se recuerdan en memoria: la misma búsqueda no se repite mientras el bot esté arriba.
+        """
+        q = (query or "").strip()
+        key = ResolveCache.normalize(q)
+        cached = self._candidates.get(key)
+        if cached is not None:
+            self._candidates.move_to_end(key)
+            return cached
+
+        search = f"ytsearch{max(1, self.hedge_candidates)}:{q}"
+        if self.pool:
+            entries = await self.pool.search(search)
+        else:
+            def _search():
+                with yt_dlp.YoutubeDL(SEARCH_OPTS) as ydl:
+                    return search_entries(ydl.extract_info(search, download=False))
+
+            entries = await asyncio.to_thread(_search)
+
+        self._candidates[key] = entries
+        while len(self._candidates) > _CANDIDATES_MAX:
+            self._candidates.popitem(last=False)
+        return entries
+
+    @staticmethod
+    def stream_source(info: Dict[str, Any]) -> Optional[StreamSource]:
+        """
+        Extrae la URL directa del audio (y headers HTTP) de una info ya resuelta.
+        None si yt-dlp no dio una URL reproducible directamente.
+        """
+        if not isinstance(info, dict):
+            return None
+        url = info.get("url")
+        if not url or not str(url).startswith(("http://", "https://")):
+            return None
+        headers = info.get("http_headers") or {}
+        return StreamSource(url=url, headers={str(k): str(v) for k, v in headers.items()})
+
+    def _progress_hook(self, guild_id: int, exempt: Optional[Callable[[], bool]]):
+        """Hook de yt-dlp (hilo de descarga): pasa los bytes nuevos por el limitador."""
+        shaper = self.shaper
+        seen: Dict[str, int] = {}
+
+        def _hook(d: Dict[str, Any]):
+            if d.get("status") != "downloading":
+                return
+            name = d.get("tmpfilename") or d.get("filename") or ""
+            done = int(d.get("downloaded_bytes") or 0)
+            delta = done - seen.get(name, 0)
+            seen[name] = done
+            if delta > 0 and not (exempt and exempt()):
+                shaper.throttle(guild_id, delta)
+
+        return _hook
+
+    async def download_audio(
+        self,
+        url: str,
+        out_dir: str,
+        uid: str,
+        guild_id: int = 0,
+        exempt: Optional[Callable[[], bool]] = None,
+        duration: int = 0,
+    ) -> DownloadResult:
         """
         Descarga el audio del video (url) en out_dir con nombre basado en uid.
+        `url` también puede ser una búsqueda: se resuelve y descarga en una sola extracción
+        (y la resolución queda en la caché).
+        Con limitador: se aplica mientras exempt() sea falso (en workers, se decide al empezar);
+        `duration` (si se conoce) estima el tamaño para el timeout de la descarga limitada.
         Retorna (file_path, info).
         """
         os.makedirs(out_dir, exist_ok=True)
         template = os.path.join(out_dir, f"{uid}.%(ext)s")
 
-        def _dl():
-            opts = dict(self._download_opts_base)
-            # yt-dlp soporta outtmpl como string; lo dejamos simple y compatible
-            opts["outtmpl"] = template
-            with yt_dlp.YoutubeDL(opts) as ydl:
-                info = ydl.extract_info(url, download=True)
-                return info
+        shaped = bool(self.shaper and self.shaper.enabled) and not (exempt and exempt())
+        ratelimit = None
+        if shaped:
+            ratelimit = self.shaper.rate_for(guild_id) if self.pool else None
+            self.shaper.begin(guild_id)
+        try:
+            if self.pool:
+                info = await self.pool.download(url, template, ratelimit, duration=duration)
+            else:
+                hook = self._progress_hook(guild_id, exempt) if shaped else None
+
+                def _dl():
+                    opts = dict(self._download_opts_base)
+                    # yt-dlp soporta outtmpl como string; lo dejamos simple y compatible
+                    opts["outtmpl"] = template
+                    if hook:
+                        opts["progress_hooks"] = [hook]
+                    with yt_dlp.YoutubeDL(opts) as ydl:
+                        info = ydl.extract_info(url, download=True)
+                        if isinstance(info, dict) and "entries" in info:
+                            entries = [e for e in (info["entries"] or []) if e]
+                            info = entries[0] if entries else None
+                        return slim_info(info)
+
+                info = await asyncio.to_thread(_dl)
+        finally:
+            if shaped:
+                self.shaper.end(guild_id)
+
+        if self.resolve_cache and info and info.get("id"):
+            try:
+                await asyncio.to_thread(self.resolve_cache.put, ResolveCache.normalize(url), info)
+            except Exception:
+                pass
+
+        # localizar archivo final (ruta que reporta yt-dlp o por prefijo uid.)
+        final_path = (info or {}).get("_filepath")
+        if not final_path or not os.path.exists(final_path):
+            final_path = None
+            try:
+                for f in os.listdir(out_dir):
+                    if f.startswith(uid + ".") and not f.endswith((".part", ".ytdl")):
+                        final_path = os.path.join(out_dir, f)
+                        break
+            except Exception:
+                final_path = None
+
+        return DownloadResult(file_path=final_path, info=info or {})
 
-        info = await asyncio.to_thread(_dl)
+    @staticmethod
+    def _bytes_written(out_dir: str, uid: str) -> int:
+        """Bytes en disco de la descarga `uid` (incluye .part): sirve para ver si avanza."""
+        total = 0
+        try:
+            with os.scandir(out_dir) as it:
+                for entry in it:
+                    if entry.name.startswith(uid + "."):
+                        try:
+                            total += entry.stat().st_size
+                        except OSError:
+                            pass
+        except OSError:
+            pass
+        return total
 
-        # localizar archivo final (por prefijo uid.)
-        final_path = None
+    @staticmethod
+    def _remove_outputs(out_dir: str, uid: str):
         try:
-            for f in os.listdir(out_dir):
-                if f.startswith(uid + "."):
-                    final_path = os.path.join(out_dir, f)
-                    break
+            names = [f for f in os.listdir(out_dir) if f.startswith(uid + ".")]
+        except OSError:
+            return
+        for f in names:
+            try:
+                os.remove(os.path.join(out_dir, f))
+            except OSError:
+                pass
+
+    def _discard(self, task: asyncio.Task, out_dir: str, uid: str):
+        """
+        Descarga perdedora: el hilo / worker de yt-dlp no se puede interrumpir, así que se la deja
+        terminar y se borra lo que haya escrito.
+        """
+        if task.done():
+            self._remove_outputs(out_dir, uid)
+            return
+        self._losers.add(task)
+
+        def _done(t: asyncio.Task):
+            self._losers.discard(t)
+            if not t.cancelled():
+                t.exception()
+            self._remove_outputs(out_dir, uid)
+
+        task.add_done_callback(_done)
+
+    async def _alternates(self, search: str, primary_url: str, duration: int) -> List[Dict[str, Any]]:
+        """Candidatos de reemplazo para `search`, con duración parecida a la esperada."""
+        try:
+            entries = await self.search_candidates(search)
         except Exception:
-            final_path = None
+            return []
+        if not entries:
+            return []
+        primary_id = ResolveCache.youtube_id(primary_url)
+        if not primary_id and not primary_url.startswith(("http://", "https://")):
+            primary_id = entries[0]["id"]  # la búsqueda se descarga con ytsearch1: es el primero
+        ref = duration or next((e["duration"] for e in entries if e["id"] == primary_id), 0)
+        return [
+            e for e in entries
+            if e["id"] != primary_id and similar_duration(e["duration"], ref)
+        ]
+
+    async def download_hedged(
+        self,
+        url: str,
+        out_dir: str,
+        uid: str,
+        search: str = "",
+        duration: int = 0,
+        urgent: Optional[Callable[[], bool]] = None,
+        guild_id: int = 0,
+    ) -> DownloadResult:
+        """
+        download_audio() con candidatos de respaldo (solo si hay búsqueda original `search`).
+        - La principal falla -> se descarga el siguiente candidato
+        - La principal no escribe nada durante `hedge_after` s y urgent() -> segunda descarga
+          en paralelo (como mucho una a la vez); gana la primera que termina con archivo
+        - Candidatos: los de la búsqueda cuya duración se parece a `duration` (o a la del
+          resultado principal); si ninguno se parece, no hay respaldo
+        - urgent() también exime del limitador de ancho de banda
+        """
+        if not search or self.hedge_candidates <= 1 or self.hedge_after <= 0:
+            return await self.download_audio(
+                url, out_dir, uid, guild_id=guild_id, exempt=urgent, duration=duration
+            )
+
+        loop = asyncio.get_running_loop()
+        stats = self.hedge_stats
+        stats.downloads += 1
+        attempts: Dict[asyncio.Task, Tuple[str, bool]] = {}   # tarea -> (uid, es_alternativa)
+
+        def _start(target: str, att_uid: str, alternate: bool):
+            task = asyncio.create_task(
+                self.download_audio(target, out_dir, att_uid, guild_id=guild_id, exempt=urgent, duration=duration)
+            )
+            attempts[task] = (att_uid, alternate)
+
+        _start(url, uid, False)
+        alternates: Optional[List[Dict[str, Any]]] = None
+        hedged = False
+        progress = (0, loop.time())                # (bytes, último avance)
+        last_err: Optional[BaseException] = None
+        winner: Optional[DownloadResult] = None
+
+        try:
+            while attempts:
+                done, _ = await asyncio.wait(
+                    attempts, timeout=HEDGE_POLL_SECONDS, return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in done:
+                    att_uid, alternate = attempts.pop(task)
+                    err = task.exception()
+                    res = None if err else task.result()
+                    if res and res.file_path and os.path.exists(res.file_path):
+                        winner = res
+                        if alternate:
+                            stats.alt_wins += 1
+                        break
+                    last_err = err or last_err
+                    self._remove_outputs(out_dir, att_uid)
+                if winner:
+                    break
+
+                n_alt = sum(1 for _, alt in attempts.values() if alt)
+                if attempts and (hedged or n_alt or len(attempts) > 1):
+                    continue
+
+                if not attempts:
+                    reason = "fallback"
+                else:
+                    # una sola descarga en curso: ¿está avanzando?
+                    written = self._bytes_written(out_dir, uid)
+                    now = loop.time()
+                    if written > progress[0]:
+                        progress = (written, now)
+                    if now - progress[1] < self.hedge_after or (urgent and not urgent()):
+                        continue
+                    reason = "hedge"
+
+                if alternates is None:
+                    alternates = await self._alternates(search, url, duration)
+                if not alternates:
+                    if attempts:
+                        hedged = True  # no hay con qué cubrirla: se espera a la principal
+                        continue
+                    break
+                cand = alternates.pop(0)
+                if reason == "hedge":
+                    stats.hedged += 1
+                    hedged = True
+                else:
+                    stats.fallbacks += 1
+                _start(cand["webpage_url"], f"{uid}-{len(alternates)}", True)
+        finally:
+            for task, (att_uid, _) in attempts.items():
+                self._discard(task, out_dir, att_uid)
 
-        return DownloadResult(file_path=final_path, info=info or {})
\ No newline at end of file
+        if winner:
+            return winner
+        if last_err:
+            raise last_err
+        return DownloadResult(file_path=None, info={})
\ No newline at end of file
@@ -0,0 +1,222 @@
+# musicbot/effects.py
+from __future__ import annotations
+
+import math
+import time
+from dataclasses import dataclass, replace
+from typing import Callable, Dict, Optional, Tuple
+
+import numpy as np
+
+SAMPLE_RATE = 48000
+BLOCK = 960                  # muestras por canal en un frame de 20 ms
+FFT_SIZE = 2048              # bloque + cola del FIR (1 FFT/IFFT por frame, costo fijo)
+FIR_TAPS = 1024              # <= FFT_SIZE - BLOCK + 1
+_DESIGN_SIZE = 16384         # grilla para muestrear la respuesta de los biquads
+
+
+@dataclass(frozen=True)
+class EQBand:
+    kind: str                # "peak" | "lowshelf" | "highshelf"
+    freq: float              # Hz
+    gain_db: float
+    q: float = 0.707
+
+    def coefficients(self) -> Tuple[Tuple[float, float, float], Tuple[float, float, float]]:
+        """Coeficientes (b, a) del biquad (RBJ Audio EQ Cookbook)."""
+        A = 10 ** (self.gain_db / 40)
+        w0 = 2 * math.pi * self.freq / SAMPLE_RATE
+        cw, sw = math.cos(w0), math.sin(w0)
+        alpha = sw / (2 * self.q)
+        if self.kind == "peak":
+            b = (1 + alpha * A, -2 * cw, 1 - alpha * A)
+            a = (1 + alpha / A, -2 * cw, 1 - alpha / A)
+        elif self.kind in ("lowshelf", "highshelf"):
+            sq = 2 * math.sqrt(A) * alpha
+            s = 1 if self.kind == "lowshelf" else -1
+            b = (
+                A * ((A + 1) - s * (A - 1) * cw + sq),
+                s * 2 * A * ((A - 1) - s * (A + 1) * cw),
+                A * ((A + 1) - s * (A - 1) * cw - sq),
+            )
+            a = (
+                (A + 1) + s * (A - 1) * cw + sq,
+                -s * 2 * ((A - 1) + s * (A + 1) * cw),
+                (A + 1) + s * (A - 1) * cw - sq,
+            )
+        else:
+            raise ValueError(f"banda desconocida: {self.kind}")
+        return b, a
+
+
+@dataclass(frozen=True)
+class EffectSettings:
+    volume: float = 1.0                        # ganancia lineal (1.0 = sin cambio)
+    bands: Tuple[EQBand, ...] = ()
+    speed: float = 1.0                         # remuestreo: cambia tempo y tono juntos
+    preset: str = "flat"
+
+    @property
+    def active(self) -> bool:
+        return self.volume != 1.0 or bool(self.bands) or self.speed != 1.0
+
+
+PRESETS: Dict[str, EffectSettings] = {
+    "flat": EffectSettings(),
+    "bassboost": EffectSettings(bands=(EQBand("lowshelf", 110, 8.0),), preset="bassboost"),
+    "treble": EffectSettings(bands=(EQBand("highshelf", 6000, 6.0),), preset="treble"),
+    "vocal": EffectSettings(
+        bands=(EQBand("lowshelf", 150, -3.0), EQBand("peak", 2500, 4.0, q=1.0)), preset="vocal"
+    ),
+    "nightcore": EffectSettings(speed=1.25, preset="nightcore"),
+    "vaporwave": EffectSettings(speed=0.8, bands=(EQBand("lowshelf", 120, 3.0),), preset="vaporwave"),
+}
+
+
+def _eq_response(bands: Tuple[EQBand, ...]) -> Optional[np.ndarray]:
+    """
+    Cascada de biquads -> FIR de FIR_TAPS (respuesta al impulso truncada) -> espectro de FFT_SIZE.
+    Filtrar es una multiplicación por frame (overlap-add), vectorizada para los dos canales.
+    """
+    if not bands:
+        return None
+    z = np.exp(-1j * np.linspace(0, math.pi, _DESIGN_SIZE // 2 + 1))
+    H = np.ones_like(z)
+    for band in bands:
+        (b0, b1, b2), (a0, a1, a2) = band.coefficients()
+        H *= (b0 + b1 * z + b2 * z ** 2) / (a0 + a1 * z + a2 * z ** 2)
+    h = np.fft.irfft(H, _DESIGN_SIZE)[:FIR_TAPS]
+    fade = 64
+    h[-fade:] *= np.hanning(2 * fade)[fade:]  # la cola truncada termina en 0 (sin clicks)
+    return np.fft.rfft(h, FFT_SIZE).astype(np.complex64)
+
+
+@dataclass(frozen=True)
+class _Compiled:
+    settings: EffectSettings
+    eq: Optional[np.ndarray]
+
+
+@dataclass
+class EffectsStats:
+    frames: int = 0
+    avg_us: float = 0.0        # promedio móvil del costo por frame
+    max_us: float = 0.0
+    last_us: float = 0.0
+
+
+class EffectsChain:
+    """
+    Cadena de efectos por servidor sobre PCM en proceso (sin relanzar FFmpeg ni perder posición).
+    - Velocidad (remuestreo lineal: nightcore/vaporwave) -> EQ (biquads como FIR, FFT overlap-add) -> volumen
+    - Costo por frame acotado: 1 rfft + 1 irfft de FFT_SIZE y operaciones vectorizadas; se mide en stats
+    - configure() reemplaza la configuración compilada de una vez: el hilo de audio nunca ve una a medias
+    """
+
+    def __init__(self, settings: Optional[EffectSettings] = None):
+        self.stats = EffectsStats()
+        self._cfg = _Compiled(EffectSettings(), None)
+        self._buf = np.zeros((0, 2), dtype=np.float32)       # entrada pendiente (remuestreo)
+        self._pos = 0.0                                      # posición fraccionaria en _buf
+        self._tail = np.zeros((FFT_SIZE - BLOCK, 2), dtype=np.float32)
+        self._ended = False
+        if settings:
+            self.configure(settings)
+
+    # ---------- configuración ----------
+    @property
+    def settings(self) -> EffectSettings:
+        return self._cfg.settings
+
+    @property
+    def active(self) -> bool:
+        return self._cfg.settings.active
+
+    @property
+    def speed(self) -> float:
+        return self._cfg.settings.speed
+
+    def configure(self, settings: EffectSettings):
+        settings = replace(settings, volume=max(0.0, min(2.0, settings.volume)),
+                           speed=max(0.5, min(2.0, settings.speed)))
+        eq = _eq_response(settings.bands)
+        if eq is None:
+            self._tail = np.zeros_like(self._tail)
+        self._cfg = _Compiled(settings, eq)
+
+    def set_volume(self, volume: float):
+        self.configure(replace(self.settings, volume=volume))
+
+    def apply_preset(self, name: str):
+        """Preset de EQ/velocidad; conserva el volumen elegido."""
+        preset = PRESETS[name]
+        self.configure(replace(preset, volume=self.settings.volume))
+
+    def reset(self):
+        """Nueva fuente de música: se descarta la entrada pendiente y la cola del filtro."""
+        self._buf = np.zeros((0, 2), dtype=np.float32)
+        self._pos = 0.0
+        self._tail = np.zeros_like(self._tail)
+        self._ended = False
+
+    # ---------- procesamiento ----------
+    def _fill(self, need: int, pull: Callable[[], Optional[np.ndarray]]):
+        while len(self._buf) < need and not self._ended:
+            frame = pull()
+            if frame is None:
+                self._ended = True
+                break
+            self._buf = np.concatenate((self._buf, frame.reshape(-1, 2).astype(np.float32)))
+
+    def process(self, pull: Callable[[], Optional[np.ndarray]]) -> Optional[np.ndarray]:
+        """
+        Produce un frame (int16 intercalado, BLOCK*2 muestras) tirando de `pull` lo que haga falta.
+        pull() devuelve el siguiente frame PCM de la música o None si terminó.
+        """
+        t0 = time.perf_counter()
+        cfg = self._cfg
+        speed = cfg.settings.speed
+
+        if speed != 1.0:
+            idx = self._pos + np.arange(BLOCK, dtype=np.float64) * speed
+            self._fill(int(idx[-1]) + 2, pull)
+            n = len(self._buf)
+            if n == 0 or self._pos >= n:
+                return None
+            i0 = np.minimum(idx.astype(np.int64), n - 1)
+            i1 = np.minimum(i0 + 1, n - 1)
+            frac = (idx - np.floor(idx)).astype(np.float32)[:, None]
+            block = self._buf[i0] * (1 - frac) + self._buf[i1] * frac
+            if idx[-1] >= n:
+                block[idx >= n] = 0  # final de la pista: relleno con silencio
+            pos = self._pos + BLOCK * speed
+            drop = min(int(pos), n)
+            self._buf = self._buf[drop:]
+            self._pos = pos - drop
+        else:
+            self._fill(BLOCK, pull)
+            if len(self._buf) == 0:
+                return None
+            block = self._buf[:BLOCK]
+            if len(block) < BLOCK:
+                block = np.concatenate((block, np.zeros((BLOCK - len(block), 2), dtype=np.float32)))
+            self._buf = self._buf[BLOCK:]
+
+        if cfg.eq is not None:
+            y = np.fft.irfft(np.fft.rfft(block, FFT_SIZE, axis=0) * cfg.eq[:, None], FFT_SIZE, axis=0)
+            y[:len(self._tail)] += self._tail
+            self._tail = y[BLOCK:].astype(np.float32)
+            block = y[:BLOCK]
+
+        if cfg.settings.volume != 1.0:
+            block = block * cfg.settings.volume
+
+        out = np.clip(block, -32768, 32767).astype(np.int16).reshape(-1)
+
+        us = (time.perf_counter() - t0) * 1e6
+        st = self.stats
+        st.frames += 1
+        st.last_us = us
+        st.avg_us = us if st.frames == 1 else st.avg_us * 0.98 + us * 0.02
+        st.max_us = max(st.max_us, us)
+        return out
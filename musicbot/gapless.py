@@ -0,0 +1,207 @@
+# musicbot/gapless.py
+from __future__ import annotations
+
+import threading
+from array import array
+from collections import deque
+from typing import Callable, Deque, Optional, Tuple
+
+import discord
+
+FRAME_SECONDS = discord.opus.Encoder.FRAME_LENGTH / 1000   # 20 ms por read()
+PREBUFFER_FRAMES = 25                                       # 0.5 s listos antes del cambio
+
+
+def _mix(out_pcm: bytes, in_pcm: bytes, out_gain: float) -> bytes:
+    """Mezcla dos frames PCM s16le: la saliente con out_gain y la entrante con (1 - out_gain)."""
+    a = array("h", out_pcm)
+    b = array("h", in_pcm)
+    in_gain = 1.0 - out_gain
+    mixed = array("h", (
+        max(-32768, min(32767, int(x * out_gain + y * in_gain))) for x, y in zip(a, b)
+    ))
+    return mixed.tobytes()
+
+
+class PrebufferedSource(discord.AudioSource):
+    """
+    Envuelve una fuente recién abierta y lee sus primeros frames por adelantado.
+    - fill() corre en un hilo aparte (FFmpeg tarda en arrancar; el hilo de audio no)
+    """
+
+    def __init__(self, source: discord.AudioSource, frames: int = PREBUFFER_FRAMES):
+        self.source = source
+        self.frames = frames
+        self._buf: Deque[bytes] = deque()
+
+    def fill(self):
+        while len(self._buf) < self.frames:
+            data = self.source.read()
+            if not data:
+                break
+            self._buf.append(data)
+
+    def read(self) -> bytes:
+        if self._buf:
+            return self._buf.popleft()
+        return self.source.read()
+
+    def is_opus(self) -> bool:
+        return self.source.is_opus()
+
+    def cleanup(self):
+        self._buf.clear()
+        self.source.cleanup()
+
+
+class GaplessSource(discord.AudioSource):
+    """
+    Fuente única que el VoiceClient reproduce de corrido entre pistas.
+    - La siguiente pista se engancha ya abierta (set_next) y el cambio ocurre en el mismo read()
+      en que termina la actual: sin hueco entre frames
+    - Crossfade opcional (solo PCM; con Opus passthrough el cambio es directo)
+    - `token` identifica la pista que suena; on_switch(token, segundos_ya_leídos) avisa el cambio
+    - Corre en el hilo del AudioPlayer: on_switch no debe bloquear
+    - Terminada o cerrada ya no acepta siguiente: set_next() retorna False y no toma la fuente
+    - Las lecturas (FFmpeg) van fuera del lock: set_next / clear_next / cleanup desde el loop no
+      esperan a un stream trabado (cleanup lo corta)
+    """
+
+    def __init__(
+        self,
+        source: discord.AudioSource,
+        token: int,
+        on_switch: Callable[[int, float], None],
+    ):
+        self._lock = threading.Lock()
+        self._cur = source
+        self._token = token
+        self._on_switch = on_switch
+        self._frames = 0                                   # frames leídos de la pista actual
+
+        self._next: Optional[discord.AudioSource] = None
+        self._next_token = 0
+        self._next_frames = 0
+        self._fade_frames = 0
+        self._fade_at = 0
+        self._done = False                                 # terminó sin siguiente o se cerró
+
+    # ---------- estado ----------
+    @property
+    def token(self) -> int:
+        return self._token
+
+    @property
+    def position(self) -> float:
+        """Segundos leídos de la pista actual (exacto: no cuenta pausas)."""
+        return self._frames * FRAME_SECONDS
+
+    def has_next(self) -> bool:
+        return self._next is not None
+
+    # ---------- siguiente pista ----------
+    def set_next(
+        self,
+        source: discord.AudioSource,
+        token: int,
+        crossfade_frames: int = 0,
+        fade_at_frame: int = 0,
+    ) -> bool:
+        """Engancha `source`. False si ya terminó o se cerró: la fuente sigue siendo de quien llama."""
+        with self._lock:
+            if self._done or self._fading():
+                return False
+            old = self._next
+            self._next = source
+            self._next_token = token
+            self._next_frames = 0
+            mixable = not source.is_opus() and not self._cur.is_opus()
+            self._fade_frames = crossfade_frames if mixable else 0
+            self._fade_at = fade_at_frame
+        if old:
+            old.cleanup()
+        return True
+
+    def clear_next(self) -> bool:
+        """Desengancha la siguiente. False si ya es tarde (el cambio ya ocurrió o empezó el fundido)."""
+        with self._lock:
+            src = self._next
+            if src is None or self._next_frames or self._fading():
+                return False
+            self._next = None
+        src.cleanup()
+        return True
+
+    # ---------- AudioSource ----------
+    def _fading(self) -> bool:
+        """(con el lock) el fundido ya empezó: la siguiente se está leyendo."""
+        return self._next is not None and bool(self._fade_frames) and self._frames >= self._fade_at
+
+    def read(self) -> bytes:
+        with self._lock:
+            if self._done:
+                return b""
+            cur, nxt = self._cur, self._next
+            fading = self._fading()
+        data = cur.read()
+        incoming = nxt.read() if fading and data else b""
+
+        with self._lock:
+            if self._done:
+                return b""  # cleanup() mientras se leía
+            if not data:
+                if self._next is None:
+                    self._done = True  # el mixer ya la da por terminada
+                    return b""
+                old, token, carry = self._switch()
+                cur = self._cur
+            elif incoming:
+                self._next_frames += 1
+                step = self._next_frames
+                data = _mix(data, incoming, 1.0 - step / (self._fade_frames + 1))
+                if step < self._fade_frames:
+                    self._frames += 1
+                    return data
+                old, token, carry = self._switch()  # fundido completo: la saliente se corta acá
+                cur = None
+            else:
+                self._frames += 1
+                return data
+
+        old.cleanup()
+        if cur is not None:
+            # la enganchada arranca en este mismo read(): sin hueco
+            data = cur.read()
+            with self._lock:
+                if data and self._cur is cur:
+                    self._frames += 1
+                    carry = self._frames * FRAME_SECONDS
+                elif not data and self._next is None:
+                    self._done = True  # la enganchada no trajo nada: termina igual
+        try:
+            self._on_switch(token, carry)
+        except Exception:
+            pass
+        return data
+
+    def _switch(self) -> Tuple[discord.AudioSource, int, float]:
+        """(con el lock) pasa a la siguiente. Retorna (saliente, token nuevo, segundos ya leídos)."""
+        old = self._cur
+        self._cur, self._next = self._next, None
+        self._token = self._next_token
+        self._frames = self._next_frames
+        self._next_frames = 0
+        self._fade_frames = 0
+        return old, self._token, self._frames * FRAME_SECONDS
+
+    def is_opus(self) -> bool:
+        # el AudioPlayer lo consulta en cada paquete, después de read(): sigue a la pista actual
+        return self._cur.is_opus()
+
+    def cleanup(self):
+        with self._lock:
+            self._done = True
+            nxt, self._next = self._next, None
+        if nxt:
+            nxt.cleanup()
+        self._cur.cleanup()
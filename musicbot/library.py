@@ -0,0 +1,226 @@
+# musicbot/library.py
+from __future__ import annotations
+
+import json
+import os
+import re
+import sqlite3
+import subprocess
+import unicodedata
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+AUDIO_EXTENSIONS = {".mp3", ".flac", ".ogg", ".opus", ".m4a", ".aac", ".wav", ".webm", ".wma", ".alac"}
+PROBE_TIMEOUT = 20.0          # ffprobe colgado (archivo roto / disco de red) -> se indexa por nombre
+SCAN_COMMIT_EVERY = 200       # archivos por transacción en un escaneo (uno largo no pierde todo)
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+_EXTRA_RE = re.compile(r"[(\[][^)\]]*[)\]]")   # "(Remastered 2011)", "[Live]"
+
+
+def _words(text: str) -> set[str]:
+    """Palabras completas en minúscula y sin acentos (como el tokenizer del índice)."""
+    text = unicodedata.normalize("NFKD", (text or "").lower())
+    return set(_TOKEN_RE.findall("".join(c for c in text if not unicodedata.combining(c))))
+
+
+@dataclass
+class LibraryEntry:
+    path: str
+    title: str
+    artist: str = ""
+    album: str = ""
+    duration: int = 0
+
+    def display(self) -> str:
+        return f"{self.artist} - {self.title}" if self.artist else self.title
+
+
+@dataclass
+class ScanStats:
+    added: int = 0
+    updated: int = 0
+    removed: int = 0
+    unchanged: int = 0
+
+
+class LocalLibrary:
+    """
+    Biblioteca local: archivos de audio de una carpeta indexados en SQLite (FTS5).
+    - Tags (título, artista, álbum) y duración con ffprobe; sin tags (o sin ffprobe) -> nombre del archivo
+    - Reescaneo incremental: solo se vuelve a leer lo que cambió de mtime/tamaño; lo borrado se quita
+    - search()/match(): texto completo con prefijos y ranking bm25 (sin FTS5 en el sqlite -> LIKE)
+    - Métodos bloqueantes (sqlite / ffprobe): asyncio.to_thread
+    """
+
+    def __init__(self, root: str, db_path: str, ffprobe_path: str = "ffprobe"):
+        self.root = os.path.abspath(root)
+        self.db_path = db_path
+        self.ffprobe_path = ffprobe_path
+        with sqlite3.connect(self.db_path) as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS library_files (
+                    path TEXT PRIMARY KEY,
+                    mtime REAL NOT NULL,
+                    size INTEGER NOT NULL,
+                    title TEXT NOT NULL,
+                    artist TEXT NOT NULL,
+                    album TEXT NOT NULL,
+                    duration INTEGER NOT NULL
+                )
+            """)
+            try:
+                # rowid = rowid de library_files; sin acentos para que "cancion" encuentre "canción"
+                conn.execute("""
+                    CREATE VIRTUAL TABLE IF NOT EXISTS library_fts USING fts5(
+                        title, artist, album, tokenize = 'unicode61 remove_diacritics 2'
+                    )
+                """)
+                self.fts = True
+            except sqlite3.OperationalError:
+                self.fts = False
+
+    def __len__(self) -> int:
+        with sqlite3.connect(self.db_path) as conn:
+            return conn.execute("SELECT COUNT(*) FROM library_files").fetchone()[0]
+
+    # ---------- escaneo ----------
+    def _walk(self):
+        for dirpath, _, files in os.walk(self.root):
+            for name in files:
+                if os.path.splitext(name)[1].lower() in AUDIO_EXTENSIONS:
+                    yield os.path.join(dirpath, name)
+
+    def _probe(self, path: str) -> LibraryEntry:
+        entry = LibraryEntry(path=path, title=os.path.splitext(os.path.basename(path))[0])
+        try:
+            proc = subprocess.run(
+                [
+                    self.ffprobe_path, "-v", "error", "-of", "json",
+                    "-show_entries", "format=duration:format_tags=title,artist,album_artist,album"
+                                     ":stream_tags=title,artist,album_artist,album",
+                    path,
+                ],
+                stdin=subprocess.DEVNULL, capture_output=True, timeout=PROBE_TIMEOUT,
+            )
+            data = json.loads(proc.stdout or b"{}")
+        except (OSError, subprocess.TimeoutExpired, ValueError):
+            return entry
+        fmt = data.get("format") or {}
+        tags: Dict[str, str] = {k.lower(): v for k, v in (fmt.get("tags") or {}).items()}
+        # Ogg/Opus guardan los tags en el stream, no en el contenedor
+        for stream in data.get("streams") or []:
+            for k, v in (stream.get("tags") or {}).items():
+                tags.setdefault(k.lower(), v)
+        entry.title = (tags.get("title") or "").strip() or entry.title
+        entry.artist = (tags.get("artist") or tags.get("album_artist") or "").strip()
+        entry.album = (tags.get("album") or "").strip()
+        try:
+            entry.duration = int(float(fmt.get("duration") or 0))
+        except ValueError:
+            pass
+        return entry
+
+    def _write(self, conn: sqlite3.Connection, entry: LibraryEntry, mtime: float, size: int, rowid: Optional[int]):
+        values = (mtime, size, entry.title, entry.artist, entry.album, entry.duration)
+        if rowid is None:
+            cur = conn.execute(
+                "INSERT INTO library_files (mtime, size, title, artist, album, duration, path)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                values + (entry.path,),
+            )
+            rowid = cur.lastrowid
+        else:
+            conn.execute(
+                "UPDATE library_files SET mtime = ?, size = ?, title = ?, artist = ?, album = ?, duration = ?"
+                " WHERE rowid = ?",
+                values + (rowid,),
+            )
+            if self.fts:
+                conn.execute("DELETE FROM library_fts WHERE rowid = ?", (rowid,))
+        if self.fts:
+            conn.execute(
+                "INSERT INTO library_fts (rowid, title, artist, album) VALUES (?, ?, ?, ?)",
+                (rowid, entry.title, entry.artist, entry.album),
+            )
+
+    def scan(self) -> ScanStats:
+        """Sincroniza el índice con la carpeta: nuevos / cambiados se leen, los que ya no están se quitan."""
+        stats = ScanStats()
+        with sqlite3.connect(self.db_path) as conn:
+            known: Dict[str, Tuple[int, float, int]] = {
+                path: (rowid, mtime, size)
+                for rowid, path, mtime, size in conn.execute("SELECT rowid, path, mtime, size FROM library_files")
+            }
+            seen = set()
+            pending = 0
+            for path in self._walk():
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                seen.add(path)
+                prev = known.get(path)
+                if prev and prev[1] == st.st_mtime and prev[2] == st.st_size:
+                    stats.unchanged += 1
+                    continue
+                self._write(conn, self._probe(path), st.st_mtime, st.st_size, prev[0] if prev else None)
+                if prev:
+                    stats.updated += 1
+                else:
+                    stats.added += 1
+                pending += 1
+                if pending >= SCAN_COMMIT_EVERY:
+                    conn.commit()
+                    pending = 0
+
+            gone = [known[p][0] for p in known.keys() - seen]
+            for rowid in gone:
+                conn.execute("DELETE FROM library_files WHERE rowid = ?", (rowid,))
+                if self.fts:
+                    conn.execute("DELETE FROM library_fts WHERE rowid = ?", (rowid,))
+            stats.removed = len(gone)
+        return stats
+
+    # ---------- búsqueda ----------
+    def search(self, query: str, limit: int = 10) -> List[LibraryEntry]:
+        """Entradas que contienen todas las palabras de `query` (como prefijo), las mejores primero."""
+        tokens = _TOKEN_RE.findall((query or "").lower())
+        if not tokens:
+            return []
+        with sqlite3.connect(self.db_path) as conn:
+            if self.fts:
+                match = " ".join(f'"{t}"*' for t in tokens)
+                rows = conn.execute(
+                    "SELECT f.path, f.title, f.artist, f.album, f.duration"
+                    " FROM library_fts JOIN library_files f ON f.rowid = library_fts.rowid"
+                    " WHERE library_fts MATCH ? ORDER BY bm25(library_fts, 10.0, 5.0, 1.0) LIMIT ?",
+                    (match, limit),
+                ).fetchall()
+            else:
+                where = " AND ".join(["lower(title || ' ' || artist || ' ' || album) LIKE ?"] * len(tokens))
+                rows = conn.execute(
+                    f"SELECT path, title, artist, album, duration FROM library_files WHERE {where} LIMIT ?",
+                    [f"%{t}%" for t in tokens] + [limit],
+                ).fetchall()
+        return [LibraryEntry(*row) for row in rows]
+
+    def match(self, query: str) -> Optional[LibraryEntry]:
+        """
+        La mejor entrada para un /play (None si no hay o si el archivo ya no existe).
+        Más estricto que search(): todas las palabras del pedido tienen que estar completas en el
+        título o el artista, y el título (sin paréntesis) tiene que estar entero en el pedido:
+        "love" no se queda con "Lovely", "The Scientist" ni con un álbum que la mencione.
+        """
+        wanted = _words(query)
+        if not wanted:
+            return None
+        for entry in self.search(query, limit=10):
+            title = _words(_EXTRA_RE.sub(" ", entry.title)) or _words(entry.title)
+            if (
+                wanted <= _words(f"{entry.title} {entry.artist}")
+                and title <= wanted
+                and os.path.exists(entry.path)
+            ):
+                return entry
+        return None
@@ -0,0 +1,111 @@
+# musicbot/live.py
+from __future__ import annotations
+
+import threading
+import time
+from collections import deque
+from typing import Deque, Optional
+
+import discord
+
+from .mixer import SILENCE
+
+LIVE_BUFFER_FRAMES = 250        # 5 s entre FFmpeg y la voz (memoria fija: Opus ~80 KB, PCM ~1 MB)
+LIVE_STALL_SECONDS = 8.0        # buffer vacío y sin datos nuevos este tiempo -> reconectar
+LIVE_STABLE_SECONDS = 30.0      # conectado y sonando este tiempo -> se reinicia el backoff
+LIVE_BACKOFF_MAX = 60.0         # espera máxima entre reconexiones
+LIVE_WATCH_INTERVAL = 1.0       # cada cuánto revisa el watchdog
+
+
+class LiveSource(discord.AudioSource):
+    """
+    Radio / stream en vivo (HTTP, Icecast, HLS) que nunca frena el hilo de voz.
+    - Un hilo lector pasa los paquetes de FFmpeg a un buffer acotado; con el buffer lleno (pausa)
+      el lector espera: FFmpeg deja de leer y no se acumula nada en memoria ni en disco
+    - read(): siguiente paquete o silencio si no llegó nada (corte, reconexión); nunca termina sola
+    - replace(): cambia el FFmpeg de abajo (reconexión) sin tocar el mixer ni la voz
+    - stalled_for() / ended: lo que mira el watchdog del player
+    """
+
+    def __init__(self, source: discord.AudioSource, buffer_frames: int = LIVE_BUFFER_FRAMES):
+        self.buffer_frames = max(1, buffer_frames)
+        self._cond = threading.Condition()
+        self._buf: Deque[bytes] = deque()
+        self._inner: Optional[discord.AudioSource] = None
+        self._gen = 0
+        self._opus = False
+        self.closed = False
+        self.ended = False                  # el FFmpeg actual terminó (o falló)
+        self.last_data = time.monotonic()   # último paquete recibido de FFmpeg
+        self.connected_at = time.monotonic()
+        self.underruns = 0                  # frames de silencio por falta de datos
+        self.replace(source)
+
+    def replace(self, source: discord.AudioSource):
+        """Engancha un FFmpeg nuevo; el anterior se cierra y su lector sale solo."""
+        with self._cond:
+            if self.closed:
+                source.cleanup()
+                return
+            old, self._inner = self._inner, source
+            self._gen += 1
+            gen = self._gen
+            self._opus = source.is_opus()
+            self._buf.clear()  # paquetes del FFmpeg viejo (puede cambiar el formato)
+            self.ended = False
+            self.last_data = self.connected_at = time.monotonic()
+            self._cond.notify_all()
+        if old:
+            old.cleanup()
+        threading.Thread(target=self._read_loop, args=(source, gen), name="live-reader", daemon=True).start()
+
+    def _read_loop(self, source: discord.AudioSource, gen: int):
+        while True:
+            try:
+                data = source.read()
+            except Exception:
+                data = b""
+            with self._cond:
+                if gen != self._gen or self.closed:
+                    return
+                if not data:
+                    self.ended = True
+                    return
+                while len(self._buf) >= self.buffer_frames:
+                    self._cond.wait(timeout=1.0)
+                    if gen != self._gen or self.closed:
+                        return
+                self._buf.append(data)
+                self.last_data = time.monotonic()
+
+    def stalled_for(self) -> float:
+        """Segundos sin audio para sonar (0 si hay paquetes en el buffer)."""
+        with self._cond:
+            if self._buf:
+                return 0.0
+            return time.monotonic() - self.last_data
+
+    def read(self) -> bytes:
+        with self._cond:
+            if self.closed:
+                return b""
+            if self._buf:
+                data = self._buf.popleft()
+                self._cond.notify()
+                return data
+            self.underruns += 1
+        return discord.opus.OPUS_SILENCE if self._opus else SILENCE
+
+    def is_opus(self) -> bool:
+        return self._opus
+
+    def cleanup(self):
+        with self._cond:
+            if self.closed:
+                return
+            self.closed = True
+            inner, self._inner = self._inner, None
+            self._buf.clear()
+            self._cond.notify_all()
+        if inner:
+            inner.cleanup()
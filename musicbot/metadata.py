@@ -0,0 +1,64 @@
+# musicbot/metadata.py
+from __future__ import annotations
+
+import asyncio
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional
+
+if TYPE_CHECKING:
+    from .downloader import YTDLDownloader
+    from .player import Track
+
+BATCH_SIZE = 8          # pistas por tanda (en orden de cola: primero lo que se ve)
+MAX_CONCURRENT = 4      # extracciones planas a la vez, entre todos los servidores
+
+
+class MetadataResolver:
+    """
+    Metadata de las pistas en cola sin descargar ni extraer formatos (uno por MusicService).
+    - Extracción plana (búsqueda de yt-dlp sin abrir cada video): id, título, duración, miniatura
+    - Tandas chicas en orden de cola, concurrentes dentro de la tanda; tope global entre servidores
+    - Lo resuelto queda en la caché de resoluciones: la descarga no repite la búsqueda y usa
+      el id del video como clave (misma descarga compartida en el DownloadScheduler)
+    """
+
+    def __init__(
+        self,
+        downloader: YTDLDownloader,
+        batch_size: int = BATCH_SIZE,
+        max_concurrent: int = MAX_CONCURRENT,
+    ):
+        self.downloader = downloader
+        self.batch_size = max(1, batch_size)
+        self._sem = asyncio.Semaphore(max(1, max_concurrent))
+
+    @staticmethod
+    def needs(track: Track) -> bool:
+        # radio en vivo: su título/duración son del stream, no de una búsqueda
+        return not track.webpage_url and not track.local and not track.live
+
+    async def lookup(self, query: str) -> Optional[Dict[str, Any]]:
+        async with self._sem:
+            try:
+                return await self.downloader.resolve_metadata(query)
+            except Exception:
+                return None
+
+    async def fill(
+        self,
+        tracks: List[Track],
+        apply: Callable[[Track, Dict[str, Any]], None],
+        on_batch: Optional[Callable[[], None]] = None,
+    ) -> int:
+        """Resuelve en tandas las pistas sin metadata: apply(track, info) por cada una. Retorna cuántas."""
+        pending = [t for t in tracks if self.needs(t)]
+        resolved = 0
+        for i in range(0, len(pending), self.batch_size):
+            batch = pending[i:i + self.batch_size]
+            infos = await asyncio.gather(*(self.lookup(t.query) for t in batch))
+            for track, info in zip(batch, infos):
+                if info and self.needs(track):
+                    apply(track, info)
+                    resolved += 1
+            if on_batch:
+                on_batch()
+        return resolved
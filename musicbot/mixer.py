@@ -0,0 +1,265 @@
+# musicbot/mixer.py
+from __future__ import annotations
+
+import threading
+from dataclasses import dataclass
+from typing import Callable, List, Optional, Tuple
+
+import discord
+import numpy as np
+
+from .effects import EffectsChain
+
+FRAME_SIZE = discord.opus.Encoder.FRAME_SIZE                  # bytes PCM s16le estéreo por 20 ms
+FRAME_SAMPLES = FRAME_SIZE // 2                                # int16 (intercalados L/R)
+SILENCE = b"\x00" * FRAME_SIZE
+
+DUCK_GAIN = 0.25         # ~ -12 dB para la música mientras habla el TTS
+DUCK_STEP = 0.075        # cambio máximo de ganancia por frame (~200 ms de 1.0 a 0.25)
+IDLE_FRAMES = 250        # 5 s sin nada que sonar -> el mixer termina (y la voz deja de enviar)
+
+EndCallback = Callable[[Optional[Exception]], None]
+
+
+@dataclass
+class _Overlay:
+    source: discord.AudioSource
+    on_end: Optional[EndCallback]
+    tag: str
+    duck: bool
+
+
+class MixerSource(discord.AudioSource):
+    """
+    Fuente única por conexión de voz: música + capas (TTS, efectos) mezcladas por frame de 20 ms.
+    - Mezcla vectorizada con NumPy (int32 y recorte a int16)
+    - Ducking: la música baja a DUCK_GAIN mientras suena una capa con duck=True (rampa sin clicks)
+    - Música Opus sin capas, ducking ni efectos: se pasa tal cual (passthrough); si no, se decodifica
+    - EffectsChain opcional (volumen/EQ/velocidad) solo sobre la música: las capas suenan limpias
+    - on_end de cada entrada se llama exactamente una vez (fin, error o cierre); corre en el hilo de audio
+    - El lock solo cubre referencias y flags: las lecturas (pipes de FFmpeg, nodo) van fuera, así un
+      stream trabado no frena al loop que llama a set_music / clear_music / pause_music / add
+    """
+
+    def __init__(self, duck_gain: float = DUCK_GAIN, effects: Optional[EffectsChain] = None):
+        self.duck_gain = duck_gain
+        self.effects = effects
+        self.closed = False
+
+        self._lock = threading.Lock()
+        self._music: Optional[discord.AudioSource] = None
+        self._music_end: Optional[EndCallback] = None
+        self._music_paused = False
+        self._fx_reset = False                       # la cadena se reinicia en el hilo de audio
+        self._overlays: List[_Overlay] = []
+
+        self._gain = 1.0
+        self._idle = 0
+        self._opus = False
+        self._decoder: Optional[discord.opus.Decoder] = None
+
+    # ---------- música ----------
+    def set_music(self, source: discord.AudioSource, on_end: Optional[EndCallback] = None) -> bool:
+        with self._lock:
+            if self.closed:
+                return False
+            self._music, self._music_end = source, on_end
+            self._music_paused = False
+            self._idle = 0
+            self._fx_reset = True
+        return True
+
+    def clear_music(self) -> Optional[discord.AudioSource]:
+        """Saca la música sin llamar a su on_end (el que la saca decide qué hacer)."""
+        with self._lock:
+            src, self._music, self._music_end = self._music, None, None
+        return src
+
+    def pause_music(self, paused: bool):
+        with self._lock:
+            self._music_paused = paused
+
+    # ---------- capas ----------
+    def add(
+        self,
+        source: discord.AudioSource,
+        on_end: Optional[EndCallback] = None,
+        tag: str = "fx",
+        duck: bool = True,
+    ) -> bool:
+        if source.is_opus():
+            raise ValueError("las capas del mixer deben ser PCM")
+        with self._lock:
+            if self.closed:
+                return False
+            self._overlays.append(_Overlay(source, on_end, tag, duck))
+            self._idle = 0
+        return True
+
+    def remove(self, tag: Optional[str] = None) -> int:
+        """Corta las capas con ese tag (todas si tag es None). Retorna cuántas."""
+        with self._lock:
+            gone = [ov for ov in self._overlays if tag is None or ov.tag == tag]
+            self._overlays = [ov for ov in self._overlays if ov not in gone]
+        for ov in gone:
+            self._end_overlay(ov, None)
+        return len(gone)
+
+    def has_overlays(self, tag: Optional[str] = None) -> bool:
+        return any(tag is None or ov.tag == tag for ov in self._overlays)
+
+    # ---------- fin de entradas ----------
+    @staticmethod
+    def _notify(cb: Optional[EndCallback], err: Optional[Exception]):
+        if cb:
+            try:
+                cb(err)
+            except Exception:
+                pass
+
+    def _end_music(self, err: Optional[Exception]):
+        with self._lock:
+            src, cb = self._music, self._music_end
+            self._music, self._music_end = None, None
+        if src:
+            src.cleanup()
+        self._notify(cb, err)
+
+    def _end_overlay(self, ov: _Overlay, err: Optional[Exception]):
+        ov.source.cleanup()
+        self._notify(ov.on_end, err)
+
+    # ---------- AudioSource ----------
+    def _decode(self, packet: bytes) -> bytes:
+        if self._decoder is None:
+            self._decoder = discord.opus.Decoder()
+        return self._decoder.decode(packet, fec=False)
+
+    @staticmethod
+    def _read_source(src: discord.AudioSource) -> Tuple[bytes, Optional[Exception]]:
+        """Lectura sin lock (puede bloquear). b"" = terminó (con el error, si lo hubo)."""
+        try:
+            return src.read(), None
+        except Exception as e:
+            return b"", e
+
+    def read(self) -> bytes:
+        # 1) foto de las entradas bajo el lock
+        with self._lock:
+            if self.closed:
+                return b""
+            src = self._music if not self._music_paused else None
+            overlays = list(self._overlays)
+            fx = self.effects if self.effects and self.effects.active else None
+            if self._fx_reset and self.effects:
+                self.effects.reset()
+                self._fx_reset = False
+
+        # 2) lecturas sin lock
+        music, music_opus = None, False
+        music_done: Optional[Tuple[Optional[Exception]]] = None   # (error,) si la música terminó
+        if src:
+            if fx:
+                def _pull() -> Optional[np.ndarray]:
+                    nonlocal music_done
+                    if music_done:
+                        return None
+                    data, err = self._read_source(src)
+                    if not data:
+                        music_done = (err,)
+                        return None
+                    pcm = np.frombuffer(self._decode(data) if src.is_opus() else data, dtype=np.int16)
+                    return pcm if len(pcm) == FRAME_SAMPLES else None
+
+                processed = fx.process(_pull)
+                if processed is not None:
+                    music = processed.tobytes()
+            else:
+                data, err = self._read_source(src)
+                if data:
+                    music, music_opus = data, src.is_opus()
+                else:
+                    music_done = (err,)
+
+        layers: List[bytes] = []
+        ended: List[Tuple[_Overlay, Optional[Exception]]] = []
+        ducking = False
+        for ov in overlays:
+            data, err = self._read_source(ov.source)
+            if len(data) != FRAME_SIZE:
+                ended.append((ov, err))
+                continue
+            layers.append(data)
+            ducking = ducking or ov.duck
+
+        # 3) se aplica lo leído, si las entradas siguen siendo las mismas
+        music_finished, music_end = False, None
+        with self._lock:
+            if self.closed:
+                return b""  # cleanup() ya avisó a todos
+            if self._music is not src:
+                music = None  # la sacaron o reemplazaron mientras se leía: el frame era de la vieja
+            elif music_done:
+                music_finished, music_end = True, self._music_end
+                self._music, self._music_end = None, None
+            gone = [(ov, err) for ov, err in ended if ov in self._overlays]
+            for ov, _ in gone:
+                self._overlays.remove(ov)
+            idle = music is None and not layers and self._music is None
+            if idle:
+                self._idle += 1
+                if self._idle > IDLE_FRAMES:
+                    self.closed = True
+            elif music is not None or layers:
+                self._idle = 0
+            closed = self.closed
+
+        if music_finished:
+            src.cleanup()
+            self._notify(music_end, music_done[0])
+        for ov, err in gone:
+            self._end_overlay(ov, err)
+        if closed:
+            return b""
+
+        # 4) mezcla (solo el hilo de audio toca ganancia / decoder / _opus)
+        target = self.duck_gain if ducking else 1.0
+        if music is None and not layers:
+            self._opus = False
+            return SILENCE
+
+        if music is not None and music_opus and not layers and self._gain == 1.0 and target == 1.0:
+            self._opus = True
+            return music
+        self._opus = False
+
+        acc = np.zeros(FRAME_SAMPLES, dtype=np.int32)
+        if music is not None:
+            pcm = np.frombuffer(self._decode(music) if music_opus else music, dtype=np.int16)
+            if len(pcm) == FRAME_SAMPLES:
+                step = max(-DUCK_STEP, min(DUCK_STEP, target - self._gain))
+                new_gain = self._gain + step
+                if self._gain == new_gain == 1.0:
+                    acc += pcm
+                else:
+                    ramp = np.repeat(np.linspace(self._gain, new_gain, FRAME_SAMPLES // 2), 2)
+                    acc += (pcm * ramp).astype(np.int32)
+                self._gain = new_gain
+        else:
+            self._gain = target
+        for data in layers:
+            acc += np.frombuffer(data, dtype=np.int16)
+        np.clip(acc, -32768, 32767, out=acc)
+        return acc.astype(np.int16).tobytes()
+
+    def is_opus(self) -> bool:
+        # el AudioPlayer lo consulta después de cada read(): dice si ESE paquete ya es Opus
+        return self._opus
+
+    def cleanup(self):
+        with self._lock:
+            self.closed = True
+            overlays, self._overlays = self._overlays, []
+        self._end_music(None)
+        for ov in overlays:
+            self._end_overlay(ov, None)
@@ -2,23 +2,56 @@
 from __future__ import annotations
 
 import asyncio
+import hashlib
+import itertools
 import os
+import shlex
 import shutil
 import uuid
 import time
 from dataclasses import dataclass, field
 from collections import deque
-from typing import Optional, Deque, Callable, Awaitable, List
+from enum import Enum
+from typing import Any, Optional, Deque, Callable, Awaitable, List, Dict, Tuple
 
 import discord
 
+from .analysis import AudioAnalyzer, LOUDNORM_FILTER
+from .audionode import AudioNodeClient, AudioNodePool
+from .cache import AudioCache
 from .downloader import YTDLDownloader
-
-
-@dataclass
+from .effects import EffectsChain, PRESETS
+from .gapless import FRAME_SECONDS, GaplessSource, PrebufferedSource
+from .live import LIVE_BACKOFF_MAX, LIVE_STABLE_SECONDS, LIVE_STALL_SECONDS, LIVE_WATCH_INTERVAL, LiveSource
+from .metadata import MetadataResolver
+from .mixer import MixerSource
+from .resolve_cache import ResolveCache
+from .scheduler import DownloadScheduler, Priority
+from .snapshot import SNAPSHOT_INTERVAL, GuildSnapshot, SnapshotStore
+from .trackqueue import TrackQueue
+from .transcode import OpusTranscoder
+
+# Prefetch: estimación de tamaño y umbrales para achicar la ventana
+EST_BYTES_PER_SECOND = 20_000                 # ~160 kbps (bestaudio típico de YouTube)
+EST_BYTES_UNKNOWN = 4 * 1024 * 1024           # pista sin duración conocida
+PREFETCH_MIN_FREE_BYTES = 512 * 1024 * 1024   # menos disco libre -> ventana de 1
+PREFETCH_SLOW_BPS = 4 * EST_BYTES_PER_SECOND  # red a menos de 4x tiempo real -> ventana de 1
+
+# Gapless: la siguiente pista se abre y pre-bufferea unos segundos antes del final
+GAPLESS_LEAD_SECONDS = 5.0
+
+# Seek: frames decodificados antes de cambiar la fuente (corto: el cambio tarda < 200 ms)
+SEEK_PREBUFFER_FRAMES = 3
+
+
+@dataclass(slots=True)
 class Track:
+    """
+    Registro compacto (slots) de una pista: colas de miles no cargan un dict por instancia.
+    La metadata (título real, duración, miniatura) llega al resolver/descargar o al mostrarla.
+    """
     query: str
-    source: str = "youtube"  # youtube|spotify
+    source: str = "youtube"  # youtube|spotify|radio|local
     title: str = "Cargando..."
     webpage_url: str = ""
     duration: int = 0
@@ -27,15 +60,92 @@ class Track:
     requester_name: str = ""
     text_channel_id: int = 0          # <- para stats/avisos
     temp_file: Optional[str] = None
+    cache_key: str = ""                                           # extractor-id en AudioCache
+    pinned: bool = False                                          # temp_file fijado en la caché
+    stream_url: str = ""                                          # URL directa (expira)
+    stream_headers: Optional[Dict[str, str]] = None
+    stream_failed: bool = False                                   # -> usar descarga
+    trim_start: float = 0.0                                       # silencio inicial medido (s)
+    trim_end: float = 0.0                                         # inicio del silencio final (0 = no)
     uid: str = field(default_factory=lambda: uuid.uuid4().hex)
 
+    @property
+    def live(self) -> bool:
+        """Radio / stream en vivo: sin duración, sin descarga ni caché."""
+        return self.source == "radio"
+
+    @property
+    def local(self) -> bool:
+        """Archivo de la biblioteca local (query = ruta): suena en su lugar, sin red ni caché."""
+        return self.source == "local"
+
+    def to_snapshot(self) -> Dict[str, Any]:
+        """Lo mínimo para reconstruir la pista tras un reinicio (sin valores vacíos)."""
+        return {f: v for f in _SNAPSHOT_FIELDS if (v := getattr(self, f))}
+
+    @classmethod
+    def from_snapshot(cls, data: Dict[str, Any]) -> "Track":
+        return cls(**{f: data[f] for f in _SNAPSHOT_FIELDS if f in data})
+
+    def to_saved(self) -> Dict[str, Any]:
+        """Para una playlist guardada: ya resuelta (query = URL del video), sin quién la pidió."""
+        data = {f: v for f in _SAVED_FIELDS if (v := getattr(self, f))}
+        if self.webpage_url and not self.local:
+            data["query"] = self.webpage_url  # al cargarla no se vuelve a buscar
+        return data
+
+
+# lo que persiste del Track (la URL de stream expira; pin / archivo se recuperan de la caché)
+_SNAPSHOT_FIELDS = (
+    "query", "source", "title", "webpage_url", "duration", "thumbnail", "requester_id",
+    "requester_name", "text_channel_id", "cache_key", "trim_start", "trim_end", "uid",
+)
+
+# lo que guarda una playlist (uid y solicitante son de cada carga)
+_SAVED_FIELDS = (
+    "query", "source", "title", "webpage_url", "duration", "thumbnail", "cache_key", "trim_start", "trim_end",
+)
+
+
+class PlayerState(str, Enum):
+    IDLE = "idle"          # sin pista actual
+    LOADING = "loading"    # preparando self.current (resolver / descargar)
+    PLAYING = "playing"
+    PAUSED = "paused"
+
+
+@dataclass
+class _Event:
+    kind: str                                   # -> handler _ev_<kind>
+    args: Tuple[Any, ...] = ()
+    reply: Optional[asyncio.Future] = None
+
 
 class GuildMusicPlayer:
     """
     Player por servidor.
-    - Descarga local, reproduce, borra
-    - Prefetch N+1
+    - Stream-first: reproduce la URL directa mientras descarga en segundo plano
+    - Fallback: descarga local completa antes de sonar
+    - Archivos en la caché compartida (AudioCache); se fijan mientras suenan o esperan en cola
+    - Opus passthrough: cada pista se codifica a Ogg/Opus una vez y se reproduce sin recodificar
+    - Sonoridad: loudnorm medido una vez por pista (AudioAnalyzer) -> ganancia lineal al reproducir
+    - Silencio inicial/final medido en la misma pasada: se saltea al abrir la pista (transiciones cortas)
+    - Prefetch de las próximas K pistas (ventana con presupuesto de bytes; se achica sola)
+    - Descargas vía el DownloadScheduler global (prioridad NOW/NEXT/DEEP, compartidas entre servidores)
+    - Descarga lenta o fallida de la pista actual -> otro candidato de la búsqueda (misma duración)
     - Contabiliza segundos reales escuchados (incluye skips/pausas)
+    - Máquina de estados (PlayerState) con un actor por servidor: todo cambio pasa por el buzón
+      (comandos y callbacks de audio solo publican eventos; la carga corre aparte y avisa al terminar)
+    - Gapless: la siguiente pista (ya en disco) se engancha abierta al GaplessSource; crossfade opcional
+    - Una sola fuente de voz por servidor (MixerSource): música + TTS/efectos encima, con ducking
+    - Efectos en vivo sobre la música (EffectsChain: volumen, EQ, nightcore) sin relanzar FFmpeg
+    - Nodo de audio opcional: FFmpeg y la codificación Opus corren en otro proceso (ring compartido)
+    - Cola indexada (TrackQueue): mover / quitar / saltar a una posición sin recorrer colas grandes
+    - Historial de las últimas pistas (previous()): siguen fijadas en la caché hasta quedar IDLE
+    - Metadata de toda la cola en segundo plano (MetadataResolver): títulos, duración total y ETA
+    - Radios en vivo en la misma cola (LiveSource): directo a FFmpeg -> Opus, watchdog y reconexión
+    - Pistas de la biblioteca local: se reproducen desde su archivo (nunca se borra ni se copia)
+    - Estado serializable (position(), restore()): MusicService lo guarda y lo reanuda tras reinicios
     """
 
     def __init__(
@@ -44,39 +154,99 @@ class GuildMusicPlayer:
         guild_id: int,
         downloader: YTDLDownloader,
         ffmpeg_path: str,
-        temp_root: str,
+        cache: AudioCache,
+        scheduler: DownloadScheduler,
         on_state_change: Optional[Callable[[int], Awaitable[None]]] = None,
         on_track_started: Optional[Callable[[int, Track], Awaitable[None]]] = None,
         on_track_finished: Optional[Callable[[int, Track, int, bool], Awaitable[None]]] = None,  # played_seconds, ended_naturally
+        stream_first: bool = True,
+        transcoder: Optional[OpusTranscoder] = None,
+        analyzer: Optional[AudioAnalyzer] = None,
+        prefetch_depth: int = 3,
+        prefetch_budget_bytes: int = 300 * 1024 * 1024,
+        crossfade_seconds: float = 0.0,
+        node: Optional[AudioNodeClient] = None,
+        history_size: int = 5,
+        metadata: Optional[MetadataResolver] = None,
     ):
         self.bot = bot
         self.guild_id = guild_id
         self.downloader = downloader
         self.ffmpeg_path = ffmpeg_path
-
-        self.temp_dir = os.path.join(temp_root, str(guild_id))
-        os.makedirs(self.temp_dir, exist_ok=True)
+        self.stream_first = stream_first
+        self.cache = cache
+        self.scheduler = scheduler
+        self.transcoder = transcoder
+        self.analyzer = analyzer
+        self.prefetch_depth = prefetch_depth
+        self.prefetch_budget_bytes = prefetch_budget_bytes
+        # crossfade mezcla PCM: con crossfade > 0 no se usa la variante Opus (passthrough)
+        self.crossfade_seconds = max(0.0, crossfade_seconds)
+        self.effects = EffectsChain()
+        self.node = node
+        self.history_size = max(0, history_size)
+        self.metadata = metadata
 
         self.on_state_change = on_state_change
         self.on_track_started = on_track_started
         self.on_track_finished = on_track_finished
 
         self.voice: Optional[discord.VoiceClient] = None
-        self.queue: Deque[Track] = deque()
+        self.queue = TrackQueue()
         self.current: Optional[Track] = None
+        self.history: Deque[Track] = deque()                      # terminadas, la más reciente al final
 
         self.loop_track = False
         self.loop_queue = False
 
-        self._download_lock = asyncio.Lock()
-        self._play_lock = asyncio.Lock()
-        self._prefetch_task: Optional[asyncio.Task] = None
-        self._stopping = False
+        # ---- actor ----
+        self.state = PlayerState.IDLE
+        self.version = 0                                          # sube con cada cambio de estado
+        self._mailbox: "asyncio.Queue[_Event]" = asyncio.Queue()
+        self._actor: Optional[asyncio.Task] = None
+        self._load_task: Optional[asyncio.Task] = None
+        self._load_start = 0.0                                    # start_at de la carga en curso
+        self._load_listened = 0.0                                 # escuchado antes de esa carga (fallback)
+        self._tokens = itertools.count(1)
+        self._gen = 0                                             # invalida eventos de pistas viejas
+        self._bg_tasks: set[asyncio.Task] = set()                 # callbacks lanzados sin esperar
+        self._notify_task: Optional[asyncio.Task] = None
+        self._notify_dirty = False
+
+        # ---- gapless / mixer ----
+        self._mixer: Optional[MixerSource] = None                # lo que está reproduciendo la voz
+        self._source: Optional[GaplessSource] = None             # la música dentro del mixer
+        self._play_offset = 0.0                                   # -ss de la pista actual
+        self._armed: Optional[Track] = None                      # pista enganchada como siguiente
+        self._armed_token = 0
+        self._armed_offset = 0.0                                  # inicio real (-ss) de la enganchada
+        self._prearm_handle: Optional[asyncio.TimerHandle] = None
+        self._prearm_task: Optional[asyncio.Task] = None          # abriendo la siguiente (fuera del actor)
+        self._seek_task: Optional[asyncio.Task] = None            # abriendo la posición pedida
+        self._seek_seq = 0                                        # el último seek pedido gana
+
+        # ---- radio en vivo ----
+        self._live: Optional[LiveSource] = None                  # fuente de la radio que suena
+        self._live_handle: Optional[asyncio.TimerHandle] = None
+        self._live_backoff = 0.0                                  # espera antes de la próxima reconexión
+        self._live_retry_at = 0.0                                 # monotonic
+
+        self._prefetch_tasks: Dict[str, asyncio.Task] = {}        # uid -> prefetch en curso
+        self._held: Dict[str, Track] = {}                         # uid -> pista con archivo fijado
+        self._dl_rates: Deque[float] = deque(maxlen=5)            # bytes/s de las últimas descargas
+        self._downloads: Dict[str, Tuple[str, asyncio.Task]] = {}  # uid -> (clave de trabajo, descarga)
+        self._bg_downloads: set[asyncio.Task] = set()             # descargas de fondo (stream-first)
+        self._download_waiters: Dict[str, int] = {}               # uid -> quiénes esperan su descarga
+        self._streaming = False                                   # la pista actual sale de la URL
+        self._opus_jobs: set[asyncio.Task] = set()
+        self._meta_task: Optional[asyncio.Task] = None            # metadata de la cola en curso
+        self._queue_secs: Tuple[int, int, int] = (-1, 0, 0)       # (version, segundos, sin duración)
 
         # ---- tiempo real ----
         self._track_started_at: Optional[float] = None          # monotonic
         self._pause_started_at: Optional[float] = None          # monotonic
         self._paused_accum: float = 0.0
+        self._played_carry: float = 0.0                         # segundos previos a un fallback
         self._last_end_was_skip: bool = False
 
     # ---------- estado ----------
@@ -84,10 +254,19 @@ class GuildMusicPlayer:
         return bool(self.voice and self.voice.is_connected())
 
     def is_playing(self) -> bool:
-        return bool(self.voice and self.voice.is_playing())
+        return self.state is PlayerState.PLAYING
 
     def is_paused(self) -> bool:
-        return bool(self.voice and self.voice.is_paused())
+        return self.state is PlayerState.PAUSED
+
+    def position(self) -> float:
+        """
+        Segundos dentro de la pista actual (barra de progreso, seek, snapshot).
+        No es lo mismo que lo escuchado (_time_played_seconds): un seek mueve uno y no el otro.
+        """
+        if self._source and self.state in (PlayerState.PLAYING, PlayerState.PAUSED):
+            return self._play_offset + self._source.position
+        return self._load_start if self.current else 0.0
 
     # ---------- helpers ----------
     def _safe_unlink(self, p: Optional[str]):
@@ -99,16 +278,148 @@ class GuildMusicPlayer:
         except Exception:
             pass
 
-    def _wipe_temp(self):
+    # ---------- caché ----------
+    def _has_file(self, track: Track) -> bool:
+        return bool(track.temp_file and os.path.exists(track.temp_file))
+
+    def _hold(self, track: Track, path: str):
+        track.temp_file = path
+        if track.cache_key and not track.pinned:
+            self.cache.pin(track.cache_key)
+            track.pinned = True
+            self._held[track.uid] = track
+
+    def _release(self, track: Track):
+        """Suelta la pista: el archivo queda en la caché compartida (ya no fijado)."""
+        entry = self._downloads.get(track.uid)
+        if entry and not entry[1].done():
+            # se libera cuando su descarga termine
+            entry[1].add_done_callback(lambda _t, tr=track: self._release(tr))
+            return
+        if track.pinned:
+            self.cache.unpin(track.cache_key)
+            track.pinned = False
+            self._held.pop(track.uid, None)
+        elif not track.cache_key and not track.local:
+            self._safe_unlink(track.temp_file)  # sin id: archivo suelto en staging
+        track.temp_file = None
+
+    def _retire(self, track: Track):
+        """Pista que terminó de sonar: pasa al historial (sigue fijada); la más vieja se suelta."""
+        if not self.history_size:
+            self._release(track)
+            return
         try:
-            shutil.rmtree(self.temp_dir, ignore_errors=True)
-        except Exception:
+            self.history.remove(track)
+        except ValueError:
             pass
-        os.makedirs(self.temp_dir, exist_ok=True)
+        self.history.append(track)
+        while len(self.history) > self.history_size:
+            old = self.history.popleft()
+            if old is not self.current and old is not self._armed:
+                self._release(old)
+
+    def _release_history(self):
+        """Servidor sin reproducción: suelta los pines del historial (previous() la busca en la caché)."""
+        for t in self.history:
+            if t is not self.current and t is not self._armed:
+                self._release(t)
+
+    def _opus_path(self, track: Track) -> Optional[str]:
+        if not self.transcoder or not track.cache_key:
+            return None
+        return self.cache.get(AudioCache.variant_key(track.cache_key, "opus"))
+
+    def _ensure_opus(self, track: Track):
+        """Programa (una sola vez, compartida entre servidores) la versión Ogg/Opus de la pista."""
+        if not self.transcoder or not track.cache_key or not self._has_file(track):
+            return
+        key = AudioCache.variant_key(track.cache_key, "opus")
+        if key in self.cache:
+            return
+        src = track.temp_file
+        base_key = track.cache_key
+
+        async def _produce() -> Optional[str]:
+            audio_filter = LOUDNORM_FILTER
+            if self.analyzer:
+                loud = await self.analyzer.analyze(base_key, src)
+                if loud:
+                    audio_filter = loud.volume_filter()
+            return await self.transcoder.to_opus(
+                src, self.cache.staging_dir, f"{track.uid}-opus", audio_filter=audio_filter
+            )
 
-    def _ffmpeg_source(self, file_path: str) -> discord.FFmpegPCMAudio:
+        async def _run():
+            try:
+                await self.cache.fetch(key, _produce)
+            except Exception:
+                pass
+
+        task = asyncio.create_task(_run())
+        self._opus_jobs.add(task)
+        task.add_done_callback(self._opus_jobs.discard)
+
+    async def _audio_filter(self, track: Track) -> str:
+        """Ganancia lineal si la pista ya fue medida; si no, loudnorm de una pasada."""
+        if self.analyzer and track.cache_key:
+            loud = await self.analyzer.get(track.cache_key)
+            if loud:
+                return loud.volume_filter()
+        return LOUDNORM_FILTER
+
+    async def _load_trim(self, track: Track):
+        """Silencio inicial/final medido por el analizador (si la pista ya pasó por él)."""
+        if not self.analyzer or not track.cache_key or track.trim_start or track.trim_end:
+            return
+        loud = await self.analyzer.get(track.cache_key)
+        if loud:
+            track.trim_start, track.trim_end = loud.trim_start, loud.trim_end
+
+    @staticmethod
+    def _track_end(track: Track) -> float:
+        """Dónde termina de sonar la pista: inicio del silencio final o su duración."""
+        return track.trim_end or float(track.duration)
+
+    def _lookup_cache(self, track: Track) -> bool:
+        if track.local:
+            track.temp_file = track.query
+            return self._has_file(track)
+        if self._has_file(track):
+            return True
+        path = self.cache.get(track.cache_key)
+        if path:
+            self._hold(track, path)
+            return True
+        return False
+
+    def _ffmpeg_source(
+        self,
+        file_path: str,
+        start_at: float = 0.0,
+        headers: Optional[Dict[str, str]] = None,
+        audio_filter: str = LOUDNORM_FILTER,
+        end_at: float = 0.0,
+    ) -> discord.AudioSource:
+        """
+        file_path puede ser un archivo local o una URL http(s) (modo stream).
+        start_at usa input seeking (-ss antes de -i); end_at > start_at corta ahí (-t).
+        audio_filter: ganancia lineal medida o loudnorm de una pasada (pista sin analizar).
+        Con nodo de audio, FFmpeg corre allá y llega Opus ya codificado.
+        """
         before = "-nostdin -hide_banner -loglevel error"
-        opts = "-vn -af loudnorm=I=-16:TP=-1.5:LRA=11 -ac 2 -ar 48000"
+        if file_path.startswith(("http://", "https://")):
+            before += " -reconnect 1 -reconnect_streamed 1 -reconnect_delay_max 5"
+            if headers:
+                raw = "".join(f"{k}: {v}\r\n" for k, v in headers.items())
+                before += f" -headers {shlex.quote(raw)}"
+        if start_at > 0:
+            before += f" -ss {start_at:.2f}"
+        opts = f"-vn -af {audio_filter} -ac 2 -ar 48000"
+        if end_at > start_at:
+            opts += f" -t {end_at - start_at:.2f}"
+        if self.node:
+            return self.node.open(file_path, before_options=before, options=opts, codec="libopus")
         return discord.FFmpegPCMAudio(
             executable=self.ffmpeg_path,
             source=file_path,
@@ -116,32 +427,95 @@ class GuildMusicPlayer:
             options=opts,
         )
 
-    async def _notify_state(self):
-        if self.on_state_change:
+    def _opus_source(self, opus_path: str, start_at: float = 0.0, end_at: float = 0.0) -> discord.AudioSource:
+        """Ogg/Opus ya normalizado: FFmpeg solo re-empaqueta (codec copy), el bot no codifica."""
+        before = "-nostdin -hide_banner -loglevel error"
+        if start_at > 0:
+            before += f" -ss {start_at:.2f}"
+        opts = "-vn"
+        if end_at > start_at:
+            opts += f" -t {end_at - start_at:.2f}"
+        if self.node:
+            return self.node.open(opus_path, before_options=before, options=opts, codec="copy")
+        return discord.FFmpegOpusAudio(
+            opus_path,
+            codec="copy",
+            executable=self.ffmpeg_path,
+            before_options=before,
+            options=opts,
+        )
+
+    def _radio_source(self, url: str) -> discord.AudioSource:
+        """
+        Radio / stream en vivo (HTTP, Icecast, HLS): FFmpeg reconecta solo ante cortes breves
+        y entrega Opus (la voz lo manda tal cual: el bot no codifica). Sin filtros ni -ss.
+        """
+        before = (
+            "-nostdin -hide_banner -loglevel error"
+            " -reconnect 1 -reconnect_streamed 1 -reconnect_delay_max 5 -rw_timeout 15000000"
+        )
+        if self.node:
+            return self.node.open(url, before_options=before, options="-vn -ac 2 -ar 48000", codec="libopus")
+        return discord.FFmpegOpusAudio(url, executable=self.ffmpeg_path, before_options=before, options="-vn")
+
+    def _notify_state(self):
+        """Programa un refresco de la UI (coalescido: a lo sumo uno en curso y uno pendiente)."""
+        self.version += 1  # el snapshot periódico guarda solo los servidores que cambiaron
+        if not self.on_state_change:
+            return
+        self._notify_dirty = True
+        if self._notify_task and not self._notify_task.done():
+            return
+
+        async def _run():
+            while self._notify_dirty:
+                self._notify_dirty = False
+                try:
+                    await self.on_state_change(self.guild_id)
+                except Exception:
+                    pass
+
+        self._notify_task = asyncio.create_task(_run())
+
+    def _fire(self, callback: Optional[Callable[..., Awaitable[None]]], *args):
+        """Lanza un callback externo (stats, anuncios) sin frenar al actor."""
+        if not callback:
+            return
+
+        async def _run():
             try:
-                await self.on_state_change(self.guild_id)
+                await callback(*args)
             except Exception:
                 pass
 
+        task = asyncio.create_task(_run())
+        self._bg_tasks.add(task)
+        task.add_done_callback(self._bg_tasks.discard)
+
     async def ensure_voice(self, channel: discord.VoiceChannel):
+        existing = channel.guild.voice_client
+        if not (self.voice and self.voice.is_connected()) and isinstance(existing, discord.VoiceClient):
+            self.voice = existing  # conexión abierta por otro cog: una sola por servidor
         if self.voice and self.voice.is_connected():
             if self.voice.channel.id != channel.id:
                 await self.voice.move_to(channel)
             return
         self.voice = await channel.connect(self_deaf=True)
-        await self._notify_state()
+        self._notify_state()
 
     # ---------- tiempo ----------
     def _time_reset(self):
         self._track_started_at = None
         self._pause_started_at = None
         self._paused_accum = 0.0
+        self._played_carry = 0.0
         self._last_end_was_skip = False
 
-    def _time_start(self):
+    def _time_start(self, carry: float = 0.0):
         self._track_started_at = time.monotonic()
         self._pause_started_at = None
         self._paused_accum = 0.0
+        self._played_carry = carry
         self._last_end_was_skip = False
 
     def _time_pause(self):
@@ -164,215 +538,1000 @@ class GuildMusicPlayer:
         if self._pause_started_at is not None:
             paused_extra = now - self._pause_started_at
         played = (now - self._track_started_at) - (self._paused_accum + paused_extra)
-        return max(0, int(played))
-
-    # ---------- cola ----------
-    async def enqueue(self, tracks: List[Track]):
-        for t in tracks:
-            self.queue.append(t)
-        await self._notify_state()
-
-        if not self.current and not self.is_playing() and not self.is_paused():
-            await self._start()
+        return max(0, int(played + self._played_carry))
+
+    # ---------- actor ----------
+    def _post(self, kind: str, *args, reply: Optional[asyncio.Future] = None):
+        """Publica un evento en el buzón (solo desde el loop del bot)."""
+        self._mailbox.put_nowait(_Event(kind, args, reply))
+        if not self._actor or self._actor.done():
+            self._actor = asyncio.create_task(self._run_actor())
+
+    def _post_threadsafe(self, kind: str, *args):
+        """Desde otros hilos (el AudioPlayer de discord.py): encola y vuelve al instante."""
+        self.bot.loop.call_soon_threadsafe(self._post, kind, *args)
+
+    async def _call(self, kind: str, *args):
+        """Publica un evento y espera la respuesta de su handler."""
+        reply = asyncio.get_running_loop().create_future()
+        self._post(kind, *args, reply=reply)
+        return await reply
+
+    async def _run_actor(self):
+        # único lugar donde cambia el estado del player: los eventos se procesan de a uno
+        while True:
+            ev = await self._mailbox.get()
+            try:
+                result = await getattr(self, f"_ev_{ev.kind}")(*ev.args)
+            except Exception as e:
+                if ev.reply and not ev.reply.done():
+                    ev.reply.set_exception(e)
+                continue
+            if ev.reply and not ev.reply.done():
+                ev.reply.set_result(result)
+
+    def _load(
+        self, track: Optional[Track] = None, start_at: float = 0.0, fallback: bool = False, listened: float = 0.0
+    ):
+        """
+        Pasa a LOADING con `track` (o la siguiente de la cola; IDLE si no hay).
+        La preparación corre en su propia tarea y publica "ready"; el actor sigue atendiendo.
+        listened: segundos ya escuchados de `track` (start_at es posición, no tiempo escuchado).
+        """
+        if self._load_task and not self._load_task.done():
+            self._load_task.cancel()
+        self._drop_source()
+        if track is None and self.queue:
+            track = self.queue.popleft()
+        self._gen = next(self._tokens)
+        self.current = track
+        self._load_start = start_at
+        self._load_listened = listened
+        self._streaming = False
+        self._time_reset()
+        if not track:
+            self.state = PlayerState.IDLE
+            self._release_history()
+            return
+        self.state = PlayerState.LOADING
+        self._load_task = asyncio.create_task(self._run_load(track, self._gen, start_at, fallback))
 
-    async def _start(self):
-        async with self._play_lock:
-            if self._stopping:
-                return
-            if not self.current:
-                if not self.queue:
-                    return
-                self.current = self.queue.popleft()
+    async def _run_load(self, track: Track, gen: int, start_at: float, fallback: bool):
+        try:
+            if fallback:
+                await self._prepare_track(track)  # el stream se cayó: solo sirve el archivo local
+            else:
+                await self._ready_current(track)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            pass
+        self._post("ready", gen, start_at, fallback)
 
+    # ---------- cola ----------
+    async def enqueue(self, tracks: List[Track], prefetch: bool = False):
+        """prefetch=True: la ventana de prefetch arranca ya, aunque la primera todavía no suene."""
+        await self._call("enqueue", list(tracks), prefetch)
+
+    async def _ev_enqueue(self, tracks: List[Track], prefetch: bool = False):
+        self.queue.extend(tracks)
+        self._ensure_metadata()
+        if self.state is PlayerState.IDLE:
+            # el prefetch arranca al empezar a sonar: no compite con la pista actual
+            self._load()
+            if prefetch:
+                await self._ensure_prefetch()  # pistas ya resueltas: solo descargan (o salen de la caché)
+        else:
+            self._rearm()
             await self._ensure_prefetch()
+        self._notify_state()
 
-            if not self.current.temp_file:
-                await self._prepare_track(self.current)
+    # ---------- metadata ----------
+    def _ensure_metadata(self):
+        """Lanza (si no corre ya) la resolución de metadata de las pistas en cola que no la tienen."""
+        if not self.metadata or (self._meta_task and not self._meta_task.done()):
+            return
+        self._meta_task = asyncio.create_task(self._fill_metadata())
+
+    async def _fill_metadata(self):
+        tried: set[str] = set()
+        while True:
+            # foto de la cola: lo encolado mientras tanto entra en la vuelta siguiente
+            pending = [t for t in self.queue if self.metadata.needs(t) and t.uid not in tried]
+            if not pending:
+                return
+            tried.update(t.uid for t in pending)
+            await self.metadata.fill(pending, self._apply_info, on_batch=self._notify_state)
+
+    def queue_duration(self) -> Tuple[int, int]:
+        """(segundos de la cola con duración conocida, pistas sin duración). Se recalcula si cambió algo."""
+        if self._queue_secs[0] != self.version:
+            total = unknown = 0
+            for t in self.queue:
+                if t.duration:
+                    total += t.duration
+                else:
+                    unknown += 1
+            self._queue_secs = (self.version, total, unknown)
+        return self._queue_secs[1], self._queue_secs[2]
+
+    def time_left(self) -> float:
+        """Segundos que le faltan a la pista actual (0 si no hay o no se sabe su duración)."""
+        track = self.current
+        if not track or not track.duration:
+            return 0.0
+        return max(0.0, self._track_end(track) - self.position()) / self.effects.speed
+
+    # ---------- prefetch ----------
+    def prefetch_window(self) -> int:
+        """Cuántas pistas de la cola preparar ahora (se achica con poco disco o red lenta)."""
+        k = max(0, self.prefetch_depth)
+        try:
+            if shutil.disk_usage(self.cache.root).free < PREFETCH_MIN_FREE_BYTES:
+                k = min(k, 1)
+        except OSError:
+            pass
+        if self._dl_rates and sum(self._dl_rates) / len(self._dl_rates) < PREFETCH_SLOW_BPS:
+            k = min(k, 1)
+        return k
 
-            await self._play_current()
+    def _estimate_bytes(self, track: Track) -> int:
+        if self._has_file(track):
+            try:
+                return os.path.getsize(track.temp_file)
+            except OSError:
+                pass
+        if track.duration:
+            return track.duration * EST_BYTES_PER_SECOND
+        return EST_BYTES_UNKNOWN
+
+    def _prefetch_targets(self) -> List[Track]:
+        targets: List[Track] = []
+        used = 0
+        for t in itertools.islice(self.queue, self.prefetch_window()):
+            if t.live:
+                continue  # nada que descargar
+            cost = self._estimate_bytes(t)
+            if targets and used + cost > self.prefetch_budget_bytes:
+                break
+            targets.append(t)
+            used += cost
+        return targets
 
     async def _ensure_prefetch(self):
-        if self._prefetch_task and not self._prefetch_task.done():
-            return
-        if not self.queue:
+        """
+        Alinea el prefetch con la ventana actual de la cola:
+        - cancela lo que ya no está en la ventana (skip, shuffle, reorden)
+        - suelta el pin de archivos que quedaron fuera (la caché los puede expulsar)
+        - lanza lo que falta, en orden de cola
+        """
+        targets = self._prefetch_targets()
+        keep = {t.uid for t in targets}
+        if self.current:
+            keep.add(self.current.uid)  # su descarga ya es la de la pista actual
+        keep.update(t.uid for t in self.history)  # fijadas para previous()
+
+        for uid, task in list(self._prefetch_tasks.items()):
+            if uid not in keep:
+                task.cancel()
+                self._prefetch_tasks.pop(uid, None)
+
+        # solo las fijadas (pocas): no se recorre la cola entera
+        for uid, t in list(self._held.items()):
+            if uid not in keep and t is not self._armed:
+                self._release(t)
+
+        for i, t in enumerate(targets):
+            priority = Priority.NEXT if i == 0 else Priority.DEEP
+            if t.uid in self._prefetch_tasks:
+                self._bump(t, priority)  # ej: pasó de DEEP a NEXT tras un skip
+                continue
+            if self._lookup_cache(t):
+                continue
+            task = asyncio.create_task(self._prepare_track(t, priority=priority))
+            self._prefetch_tasks[t.uid] = task
+            task.add_done_callback(
+                lambda done, uid=t.uid: self._prefetch_tasks.pop(uid, None)
+                if self._prefetch_tasks.get(uid) is done else None
+            )
+
+    async def _resolve_track(self, track: Track, fresh: bool = False):
+        """
+        Solo metadata + URL directa del stream (sin descargar).
+        Un hit de la caché de resoluciones no trae URL de stream: fresh=True la pide de nuevo.
+        """
+        query = track.webpage_url if (fresh and track.webpage_url) else track.query
+        try:
+            info = await self.downloader.resolve_youtube_info(query, fresh=fresh)
+        except Exception:
             return
-        nxt = self.queue[0]
-        if nxt.temp_file and os.path.exists(nxt.temp_file):
+        self._apply_info(track, info)
+        self._lookup_cache(track)
+
+    async def _resolve_cached(self, track: Track):
+        """Metadata desde la caché de resoluciones, sin lanzar ninguna extracción."""
+        info = await self.downloader.cached_info(track.query)
+        if info:
+            self._apply_info(track, info)
+            self._lookup_cache(track)
+
+    def _apply_info(self, track: Track, info: dict):
+        track.title = info.get("title") or track.title
+        track.webpage_url = info.get("webpage_url") or track.webpage_url
+        track.duration = int(info.get("duration") or track.duration or 0)
+        track.thumbnail = info.get("thumbnail") or track.thumbnail
+        track.cache_key = AudioCache.key_for(info) or track.cache_key
+        stream = self.downloader.stream_source(info)
+        if stream:
+            track.stream_url = stream.url
+            track.stream_headers = stream.headers
+
+    def _bump(self, track: Track, priority: Priority):
+        entry = self._downloads.get(track.uid)
+        if entry:
+            self.scheduler.bump(entry[0], priority)
+
+    async def _download_track(self, track: Track, priority: Priority = Priority.NOW):
+        """
+        Una descarga por pista (prefetch, fondo y actual comparten la misma tarea);
+        si ya existe, solo se le sube la prioridad. Si se cancela el último que la espera
+        (ej: la pista salió de la ventana de prefetch), la descarga se cancela también y su
+        trabajo pendiente deja el lugar en el DownloadScheduler.
+        """
+        if self._lookup_cache(track):
             return
-        self._prefetch_task = asyncio.create_task(self._prepare_track(nxt, background=True))
+        entry = self._downloads.get(track.uid)
+        if entry and not entry[1].done():
+            self.scheduler.bump(entry[0], priority)
+        else:
+            url = track.webpage_url or track.query
+            job_key = track.cache_key or ResolveCache.normalize(url)
+            task = asyncio.create_task(self._run_download(track, url, job_key, priority))
+            entry = (job_key, task)
+            self._downloads[track.uid] = entry
+
+            def _forget(done: asyncio.Task, uid: str = track.uid):
+                if self._downloads.get(uid, ("", None))[1] is done:
+                    del self._downloads[uid]
+
+            task.add_done_callback(_forget)
+        uid = track.uid
+        self._download_waiters[uid] = self._download_waiters.get(uid, 0) + 1
+        try:
+            await asyncio.shield(entry[1])
+        except Exception:
+            pass
+        finally:
+            left = self._download_waiters.get(uid, 1) - 1
+            if left > 0:
+                self._download_waiters[uid] = left
+            else:
+                self._download_waiters.pop(uid, None)
+                if not entry[1].done():
+                    entry[1].cancel()  # nadie la espera: fuera (_forget la saca de _downloads)
+
+    async def _run_download(self, track: Track, url: str, job_key: str, priority: Priority):
+        async def _job() -> Tuple[Optional[str], dict]:
+            # el trabajo lo comparten todos los servidores que piden la misma clave
+            key = track.cache_key
+            if key and self.cache.get(key):
+                return self.cache.get(key), {}
+            # si `url` es una búsqueda, resuelve y descarga en la misma extracción;
+            # con búsqueda original hay candidatos de respaldo (descarga hedged)
+            search = "" if track.query.startswith(("http://", "https://")) else track.query
+            t0 = time.monotonic()
+            res = await self.downloader.download_hedged(
+                url,
+                self.cache.staging_dir,
+                uuid.uuid4().hex,
+                search=search,
+                duration=track.duration,
+                urgent=lambda: self.current is track,
+                guild_id=self.guild_id,
+            )
+            if not res.file_path or not os.path.exists(res.file_path):
+                return None, res.info
+            elapsed = max(0.001, time.monotonic() - t0)
+            self._dl_rates.append(os.path.getsize(res.file_path) / elapsed)
+            # sin id del extractor: clave derivada de la URL/búsqueda para que igual entre a la caché
+            key = AudioCache.key_for(res.info) or key or (
+                "url-" + hashlib.sha1(job_key.encode()).hexdigest()[:16]
+            )
+            res.info.setdefault("_cache_key", key)
+            return self.cache.add(key, res.file_path), res.info
 
-    async def _prepare_track(self, track: Track, background: bool = False):
-        async with self._download_lock:
-            if self._stopping:
-                return
-            if track.temp_file and os.path.exists(track.temp_file):
+        try:
+            path, info = await self.scheduler.submit(job_key, self.guild_id, priority, _job)
+        except Exception:
+            return
+        if info:
+            self._apply_info(track, info)
+            track.cache_key = track.cache_key or info.get("_cache_key", "")
+        if path and os.path.exists(path):
+            self._hold(track, path)
+            if self.analyzer and track.cache_key:
+                self.analyzer.submit(track.cache_key, path)
+            self._ensure_opus(track)
+
+    async def _prepare_track(self, track: Track, priority: Priority = Priority.NOW):
+        if self._lookup_cache(track) or track.local:
+            return  # un archivo local que ya no existe no se busca en la red
+
+        # 1) metadata cacheada (puede dar hit en la caché de audio y saltarse la descarga)
+        if not track.webpage_url:
+            await self._resolve_cached(track)
+            if self._has_file(track):
+                self._notify_state()
                 return
 
-            # 1) resolver info
-            try:
-                info = await self.downloader.resolve_youtube_info(track.query)
-                track.title = info.get("title") or track.title
-                track.webpage_url = info.get("webpage_url") or track.webpage_url
-                track.duration = int(info.get("duration") or 0)
-                track.thumbnail = info.get("thumbnail") or track.thumbnail
-            except Exception:
-                pass
+        # 2) descargar: una sola extracción resuelve + descarga
+        await self._download_track(track, priority)
 
-            # 2) descargar
-            url = track.webpage_url or track.query
-            try:
-                res = await self.downloader.download_audio(url, self.temp_dir, track.uid)
-                track.temp_file = res.file_path
-            except Exception:
-                track.temp_file = None
+        self._notify_state()
 
-            await self._notify_state()
+    async def _ready_current(self, track: Track):
+        """
+        Deja `track` (la pista actual) listo para sonar:
+        - archivo local si ya existe
+        - stream-first: basta con resolver la URL directa
+        - fallback: descarga completa
+        - radio en vivo: nada (FFmpeg abre la URL al sonar)
+        """
+        if track.live or self._lookup_cache(track) or track.local:
+            return
+        if self.stream_first and not track.stream_failed:
+            if not track.stream_url:
+                await self._resolve_track(track)
+                if self._has_file(track):
+                    return
+            if not track.stream_url:
+                # metadata cacheada sin archivo: extraemos el link directo del video
+                await self._resolve_track(track, fresh=True)
+            if track.stream_url:
+                return
+        await self._prepare_track(track)
 
-    async def _play_current(self):
-        if self._stopping:
+    def _start_background_download(self, track: Track):
+        entry = self._downloads.get(track.uid)
+        if entry and not entry[1].done():
             return
+        # ya suena por stream: la descarga es para replay/fallback, no urgente
+        task = asyncio.create_task(self._download_track(track, Priority.NEXT))
+        self._bg_downloads.add(task)  # el loop solo guarda referencias débiles
+        task.add_done_callback(self._bg_downloads.discard)
+
+    async def _make_source(
+        self, track: Track, start_at: float, local_only: bool = False
+    ) -> Tuple[Optional[discord.AudioSource], bool, float]:
+        """
+        Abre la mejor fuente disponible para `track`. Retorna (fuente, es_stream, inicio real):
+        con silencios medidos, arranca después del inicial y corta antes del final.
+        """
+        if track.live:
+            if local_only:
+                return None, False, 0.0
+            # no cuenta como stream: su fin nunca es "corte temprano" (el watchdog reconecta)
+            return LiveSource(self._radio_source(track.query)), False, 0.0
+        await self._load_trim(track)
+        start_at = max(start_at, track.trim_start)
+        end_at = track.trim_end
+        opus_path = None
+        if self._has_file(track) and not self.crossfade_seconds:
+            opus_path = self._opus_path(track)
+        if opus_path:
+            return self._opus_source(opus_path, start_at=start_at, end_at=end_at), False, start_at
+        if self._has_file(track):
+            audio_filter = await self._audio_filter(track)
+            self._ensure_opus(track)
+            return self._ffmpeg_source(
+                track.temp_file, start_at=start_at, audio_filter=audio_filter, end_at=end_at
+            ), False, start_at
+        if not local_only and self.stream_first and track.stream_url and not track.stream_failed:
+            audio_filter = await self._audio_filter(track)
+            # la descarga sigue en segundo plano para replay / fallback
+            self._start_background_download(track)
+            return self._ffmpeg_source(
+                track.stream_url, start_at=start_at, headers=track.stream_headers,
+                audio_filter=audio_filter, end_at=end_at,
+            ), True, start_at
+        return None, False, start_at
+
+    async def _ev_ready(self, gen: int, start_at: float, fallback: bool):
+        if gen != self._gen or self.state is not PlayerState.LOADING:
+            return  # carga vieja (skip / stop mientras se preparaba)
+        track = self.current
+
         if not self.voice or not self.voice.is_connected():
+            self._park(track)
             return
-        if not self.current:
+
+        try:
+            src, streaming, start_at = await self._make_source(track, start_at)
+        except Exception:
+            src, streaming = None, False  # ej: ffmpeg ausente / archivo ilegible
+        if src is None:
+            if fallback:
+                # ni stream ni archivo: se da por terminada donde se cortó
+                self._finish(track, int(self._load_listened), ended_naturally=True)
+            else:
+                # pista imposible: siguiente (iterativo, cada fallo es un evento nuevo)
+                if self.loop_queue:
+                    self.queue.append(track)
+                self._release(track)
+                self._load()
+            self._notify_state()
             return
 
-        if not self.current.temp_file or not os.path.exists(self.current.temp_file):
-            failed = self.current
-            self.current = None
-            self._time_reset()
-            await self._notify_state()
-            await self._advance_after_fail(failed)
+        source = GaplessSource(
+            src, gen, on_switch=lambda token, carry: self._post_threadsafe("switched", token, carry)
+        )
+        # el hilo de audio solo publica el evento: no espera la carga de la siguiente pista
+        try:
+            mixer = self._ensure_mixer()
+        except discord.ClientException:
+            mixer = None
+        if not mixer or not mixer.set_music(
+            source, on_end=lambda err: self._post_threadsafe("track_end", source.token, err)
+        ):
+            source.cleanup()
+            self._park(track)  # la conexión se cayó
             return
 
-        src = self._ffmpeg_source(self.current.temp_file)
+        self.state = PlayerState.PLAYING
+        self._streaming = streaming
+        self._source = source
+        self._play_offset = start_at
+        # lo escuchado no es la posición: silencio inicial saltado o reanudación no cuentan
+        self._time_start(carry=self._load_listened)
+        self._schedule_prearm()
+        if isinstance(src, LiveSource):
+            self._live = src
+            self._live_backoff = 0.0
+            self._watch_live()
+
+        if not fallback:
+            # fallback a mitad de pista: no se anuncia como pista nueva
+            self._fire(self.on_track_started, self.guild_id, track)
+            await self._ensure_prefetch()
+        self._notify_state()
+
+    # ---------- mixer ----------
+    def _ensure_mixer(self) -> MixerSource:
+        """El mixer que está sonando en la voz (lo crea si no hay o si ya terminó)."""
+        mixer = self._mixer
+        if mixer and not mixer.closed and self.voice.source is mixer:
+            if self.voice.is_paused():
+                self.voice.resume()
+            return mixer
+        if self.voice.is_playing() or self.voice.is_paused():
+            self.voice.stop()  # un mixer que está terminando (o algo ajeno sonando)
+        mixer = MixerSource(effects=self.effects)
+        self.voice.play(mixer, after=lambda err, m=mixer: self._post_threadsafe("mixer_end", m, err))
+        self._mixer = mixer
+        return mixer
+
+    async def _ev_mixer_end(self, mixer: MixerSource, err: Optional[Exception]):
+        # la música que tuviera adentro ya avisó su fin (on_end) al cerrarse
+        if self._mixer is mixer:
+            self._mixer = None
+
+    async def play_overlay(self, source: discord.AudioSource, tag: str = "fx", duck: bool = True) -> asyncio.Future:
+        """
+        Reproduce `source` (PCM) encima de la música, en la misma conexión de voz.
+        Retorna un future que se completa cuando la capa termina (o se corta).
+        """
+        return await self._call("overlay", source, tag, duck)
 
-        def _after(err: Optional[Exception]):
-            fut = asyncio.run_coroutine_threadsafe(self._on_track_end(err), self.bot.loop)
-            try:
-                fut.result()
-            except Exception:
-                pass
+    async def _ev_overlay(self, source: discord.AudioSource, tag: str, duck: bool) -> asyncio.Future:
+        loop = asyncio.get_running_loop()
+        done = loop.create_future()
 
-        self._time_start()
-        self.voice.play(src, after=_after)
+        def _on_end(err: Optional[Exception]):
+            loop.call_soon_threadsafe(self._post, "overlay_done", done, err)
 
-        if self.on_track_started:
-            try:
-                await self.on_track_started(self.guild_id, self.current)
-            except Exception:
-                pass
+        if not self.voice or not self.voice.is_connected():
+            source.cleanup()
+            done.set_exception(discord.ClientException("No conectado a voz."))
+            return done
+        mixer = self._ensure_mixer()
+        if not mixer.add(source, on_end=_on_end, tag=tag, duck=duck):
+            source.cleanup()
+            done.set_exception(discord.ClientException("El mixer se cerró."))
+        return done
+
+    async def _ev_overlay_done(self, done: asyncio.Future, err: Optional[Exception]):
+        if not done.done():
+            if err:
+                done.set_exception(err)
+            else:
+                done.set_result(None)
+        mixer = self._mixer
+        if self.state is PlayerState.PAUSED and mixer and not mixer.has_overlays():
+            if self.voice and self.voice.is_playing():
+                self.voice.pause()  # vuelve la pausa: no mandamos silencio
+
+    async def stop_overlays(self, tag: Optional[str] = None) -> int:
+        """Corta las capas (TTS/efectos) con ese tag; la música sigue."""
+        return await self._call("stop_overlays", tag)
+
+    async def _ev_stop_overlays(self, tag: Optional[str]) -> int:
+        return self._mixer.remove(tag) if self._mixer else 0
+
+    def _stop_music(self):
+        """Saca la música del mixer y publica su fin (skip)."""
+        source = self._mixer.clear_music() if self._mixer else None
+        if source:
+            source.cleanup()
+            self._post("track_end", source.token, None)
+
+    # ---------- efectos ----------
+    def set_volume(self, percent: int) -> int:
+        """Volumen de la música en % (0-200). Se aplica en el próximo frame."""
+        percent = max(0, min(200, int(percent)))
+        self.effects.set_volume(percent / 100)
+        return percent
+
+    def apply_preset(self, name: str) -> bool:
+        if name not in PRESETS:
+            return False
+        self.effects.apply_preset(name)
+        self._post("rearm")  # con otra velocidad cambia cuándo termina la pista
+        return True
+
+    # ---------- gapless ----------
+    def _peek_next(self) -> Optional[Track]:
+        """La pista que sonaría al terminar la actual (sin tocar la cola)."""
+        if self.loop_track:
+            return self.current
+        if self.queue:
+            return self.queue[0]
+        if self.loop_queue:
+            return self.current  # cola de una sola pista en loop
+        return None
+
+    def _schedule_prearm(self, delay: Optional[float] = None):
+        if self._prearm_handle:
+            self._prearm_handle.cancel()
+            self._prearm_handle = None
+        track = self.current
+        if not track or not track.duration or not self._source:
+            return  # sin duración no sabemos cuándo termina: transición normal
+        if delay is None:
+            remaining = self._track_end(track) - self._play_offset - self._source.position
+            # con nightcore/vaporwave la pista avanza a `speed` segundos por segundo real
+            delay = remaining / self.effects.speed - GAPLESS_LEAD_SECONDS - self.crossfade_seconds
+        self._prearm_handle = asyncio.get_running_loop().call_later(
+            max(0.0, delay), self._post, "prearm", self._gen
+        )
 
-        await self._notify_state()
-        await self._ensure_prefetch()
+    def _drop_source(self):
+        if self._prearm_handle:
+            self._prearm_handle.cancel()
+            self._prearm_handle = None
+        if self._live_handle:
+            self._live_handle.cancel()
+            self._live_handle = None
+        self._source = None
+        self._armed = None
+        self._live = None
+
+    def _disarm(self) -> bool:
+        """Desengancha la siguiente pista. False si el cambio ya ocurrió (llega un evento "switched")."""
+        if self._prearm_handle:
+            self._prearm_handle.cancel()
+            self._prearm_handle = None
+        if not self._armed:
+            return True
+        if self._source and not self._source.clear_next():
+            return False
+        self._armed = None
+        return True
+
+    def _rearm(self):
+        """La cola o el modo loop cambiaron: la siguiente enganchada puede ya no serlo."""
+        if self.state not in (PlayerState.PLAYING, PlayerState.PAUSED):
+            return
+        if self._disarm():
+            self._schedule_prearm()
 
-    async def _advance_after_fail(self, failed: Track):
-        if self.loop_queue:
-            self.queue.append(failed)
+    async def _ev_rearm(self):
+        self._rearm()
 
-        if self.queue:
-            self.current = self.queue.popleft()
-            if not self.current.temp_file:
-                await self._prepare_track(self.current)
-            await self._play_current()
-        else:
-            self.current = None
-            await self._notify_state()
+    async def _ev_prearm(self, gen: int):
+        self._prearm_handle = None
+        if gen != self._gen or self.state not in (PlayerState.PLAYING, PlayerState.PAUSED):
+            return
+        track, source = self.current, self._source
+        if not track or not source or self._armed:
+            return
+        lead = GAPLESS_LEAD_SECONDS + self.crossfade_seconds
+        remaining = (self._track_end(track) - self._play_offset - source.position) / self.effects.speed
+        if remaining > lead + 1:
+            self._schedule_prearm()  # hubo pausa: todavía falta
+            return
+        if remaining < 0.5:
+            return
 
-    async def _on_track_end(self, err: Optional[Exception]):
-        if self._stopping:
+        nxt = self._peek_next()
+        if not nxt or nxt.live:
+            return  # una radio no se engancha: abre al sonar
+        if not self._lookup_cache(nxt):
+            # todavía descargando: reintento; si no llega a tiempo, transición normal
+            self._schedule_prearm(delay=1.0)
             return
-        if not self.current:
+        if self._prearm_task and not self._prearm_task.done():
+            return  # ya se está abriendo; "prearm_ready" decide
+        # FFmpeg tarda en arrancar: se abre y pre-bufferea en una tarea, el actor sigue atendiendo
+        self._prearm_task = asyncio.create_task(self._open_next(gen, source, nxt))
+
+    async def _open_next(self, gen: int, source: GaplessSource, nxt: Track):
+        try:
+            src, _, nxt_offset = await self._make_source(nxt, 0.0, local_only=True)
+        except Exception:
+            src = None
+        if src is None:
             return
+        nxt_src = PrebufferedSource(src)
+        try:
+            await asyncio.to_thread(nxt_src.fill)
+        except Exception:
+            nxt_src.cleanup()
+            return
+        self._post("prearm_ready", gen, source, nxt, nxt_src, nxt_offset)
 
-        finished = self.current
+    async def _ev_prearm_ready(
+        self, gen: int, source: GaplessSource, nxt: Track, nxt_src: PrebufferedSource, nxt_offset: float
+    ):
+        track = self.current
+        if (
+            gen != self._gen or self._source is not source or self._armed
+            or self.state not in (PlayerState.PLAYING, PlayerState.PAUSED)
+        ):
+            nxt_src.cleanup()  # algo cambió mientras se abría
+            return
+        if self._peek_next() is not nxt:
+            nxt_src.cleanup()
+            self._schedule_prearm()  # la cola cambió mientras tanto: se engancha la nueva siguiente
+            return
+
+        fade_frames = fade_at = 0
+        if self.crossfade_seconds:
+            fade_frames = int(self.crossfade_seconds / FRAME_SECONDS)
+            fade_at = max(0, int(
+                (self._track_end(track) - self._play_offset - self.crossfade_seconds) / FRAME_SECONDS
+            ))
+        token = next(self._tokens)
+        if not source.set_next(nxt_src, token, crossfade_frames=fade_frames, fade_at_frame=fade_at):
+            nxt_src.cleanup()  # la pista terminó mientras se pre-buffereaba: nadie más la cerraría
+            return
+        self._armed = nxt
+        self._armed_token = token
+        self._armed_offset = nxt_offset
 
+    async def _ev_switched(self, token: int, carry: float):
+        """El GaplessSource ya pasó a la pista enganchada: ponemos el estado al día."""
+        if not self._armed or token != self._armed_token:
+            return
+        finished, nxt = self.current, self._armed
+        self._armed = None
         played_seconds = self._time_played_seconds()
-        ended_naturally = not self._last_end_was_skip
+        self._fire(self.on_track_finished, self.guild_id, finished, played_seconds, True)
 
-        # callback de stats (siempre, incluso si fue skip)
-        if self.on_track_finished:
+        if nxt is not finished:
+            self._retire(finished)
+            if self.loop_queue:
+                self.queue.append(finished)
             try:
-                await self.on_track_finished(self.guild_id, finished, played_seconds, ended_naturally)
-            except Exception:
+                self.queue.remove(nxt)
+            except ValueError:
                 pass
 
-        # decidir siguiente
-        next_track: Optional[Track] = None
+        self._gen = token
+        self.current = nxt
+        self._streaming = False
+        self._play_offset = self._armed_offset
+        self._time_reset()
+        self._time_start(carry=carry)  # lo ya leído de la nueva (fundido); el offset es solo posición
+        self._schedule_prearm()
 
-        if self.loop_track:
-            next_track = finished  # no borramos archivo
-        else:
-            # borrar archivo del track que terminó
-            self._safe_unlink(finished.temp_file)
-            finished.temp_file = None
+        self._fire(self.on_track_started, self.guild_id, nxt)
+        await self._ensure_prefetch()
+        self._notify_state()
+
+    # ---------- radio en vivo ----------
+    def _watch_live(self):
+        if self._live_handle:
+            self._live_handle.cancel()
+        self._live_handle = asyncio.get_running_loop().call_later(
+            LIVE_WATCH_INTERVAL, self._post, "live_watch", self._gen
+        )
 
-            if self.loop_queue:
-                self.queue.append(finished)
+    async def _ev_live_watch(self, gen: int):
+        """Watchdog de la radio: FFmpeg terminado o sin audio -> FFmpeg nuevo, con backoff (1, 2, 4... 60 s)."""
+        self._live_handle = None
+        live = self._live
+        if gen != self._gen or not live or self.state not in (PlayerState.PLAYING, PlayerState.PAUSED):
+            return
+        now = time.monotonic()
+        if not live.ended and live.stalled_for() < LIVE_STALL_SECONDS:
+            if self._live_backoff and now - live.connected_at > LIVE_STABLE_SECONDS:
+                self._live_backoff = 0.0  # volvió a sonar estable
+        elif now >= self._live_retry_at:
+            try:
+                live.replace(self._radio_source(self.current.query))
+            except Exception:
+                pass  # ej: ffmpeg ausente; se reintenta tras el backoff
+            self._live_backoff = min(LIVE_BACKOFF_MAX, self._live_backoff * 2 or 1.0)
+            self._live_retry_at = now + self._live_backoff
+        self._watch_live()
+
+    def _park(self, track: Track):
+        """Sin voz utilizable: la pista vuelve al frente de la cola y esperamos el próximo enqueue."""
+        self.queue.appendleft(track)
+        self.current = None
+        self.state = PlayerState.IDLE
+        self._time_reset()
+        self._release_history()
+        self._notify_state()
 
-        # avanzar
-        if next_track:
-            self.current = next_track
-        else:
-            self.current = self.queue.popleft() if self.queue else None
+    async def _ev_track_end(self, gen: int, err: Optional[Exception]):
+        if gen != self._gen or self.state not in (PlayerState.PLAYING, PlayerState.PAUSED):
+            return
+        finished = self.current
+        played_seconds = self._time_played_seconds()
+        ended_naturally = not self._last_end_was_skip
 
-        self._time_reset()
-        await self._notify_state()
-        await self._ensure_prefetch()
+        # stream caído (URL expirada, 403, corte): seguimos desde el archivo local
+        position = self.position()
+        if self._streaming and ended_naturally and self._stream_ended_early(finished, position, err):
+            finished.stream_failed = True
+            self._load(finished, start_at=position, fallback=True, listened=played_seconds)
+            self._notify_state()
+            return
+
+        self._finish(finished, played_seconds, ended_naturally)
+        self._notify_state()
+
+    def _finish(self, finished: Track, played_seconds: int, ended_naturally: bool):
+        # callback de stats (siempre, incluso si fue skip)
+        self._fire(self.on_track_finished, self.guild_id, finished, played_seconds, ended_naturally)
 
-        if self.current and self.voice and self.voice.is_connected():
-            if not self.current.temp_file:
-                await self._prepare_track(self.current)
-            await self._play_current()
+        if self.loop_track:
+            self._load(finished)  # sigue fijado en la caché
+            return
+        # al historial: queda fijada para previous(); la que sale del historial se suelta
+        self._retire(finished)
+        if self.loop_queue:
+            self.queue.append(finished)
+        self._load()
+
+    def _stream_ended_early(self, track: Track, position: float, err: Optional[Exception]) -> bool:
+        if err:
+            return True
+        if track.duration:
+            return position + 5 < self._track_end(track)
+        return position < 2
 
     # ---------- controles ----------
     async def toggle_pause(self):
+        return await self._call("pause")
+
+    async def _ev_pause(self):
         if not self.voice or not self.voice.is_connected():
             return False, "No conectado a voz."
 
-        if self.voice.is_playing():
-            self.voice.pause()
+        mixer = self._mixer
+        if self.state is PlayerState.PLAYING and mixer:
+            mixer.pause_music(True)
+            if not mixer.has_overlays():
+                self.voice.pause()  # nada encima: la voz deja de enviar
             self._time_pause()
-            await self._notify_state()
+            self.state = PlayerState.PAUSED
+            self._notify_state()
             return True, "Pausado."
 
-        if self.voice.is_paused():
-            self.voice.resume()
+        if self.state is PlayerState.PAUSED and mixer:
+            mixer.pause_music(False)
+            if self.voice.is_paused():
+                self.voice.resume()
             self._time_resume()
-            await self._notify_state()
+            self.state = PlayerState.PLAYING
+            self._notify_state()
             return True, "Reanudado."
 
         return False, "No hay reproducción activa."
 
     async def skip(self):
+        return await self._call("skip")
+
+    async def _ev_skip(self):
+        if self.state is PlayerState.LOADING:
+            # todavía no sonaba: se descarta la carga y pasamos a la siguiente
+            skipped = self.current
+            self._release(skipped)
+            if self.loop_queue:
+                self.queue.append(skipped)
+            self._load()
+            self._notify_state()
+            return True, "Saltado."
+
         if not self.voice or not self.voice.is_connected():
             return False, "No conectado a voz."
-        if not (self.voice.is_playing() or self.voice.is_paused()):
+        if self.state not in (PlayerState.PLAYING, PlayerState.PAUSED):
             return False, "Nada que saltar."
 
+        self._disarm()  # si el cambio ya ocurrió, el skip corta a la nueva (llegó justo en el borde)
         self._last_end_was_skip = True
-        try:
-            self.voice.stop()  # dispara _on_track_end()
-        except Exception:
-            pass
+        self._stop_music()  # el TTS/efectos que estén sonando siguen
         return True, "Saltado."
 
-    async def stop(self):
-        self._stopping = True
+    async def previous(self) -> Tuple[bool, str]:
+        """Vuelve a la última pista del historial; la actual pasa al frente de la cola."""
+        return await self._call("previous")
+
+    async def _ev_previous(self) -> Tuple[bool, str]:
+        prev = next((t for t in reversed(self.history) if t is not self.current), None)
+        if prev is None:
+            return False, "No hay canciones anteriores."
+        if not self.voice or not self.voice.is_connected():
+            return False, "No conectado a voz."
+        self.history.remove(prev)
+        if prev in self.queue:
+            self.queue.remove(prev)  # loop de cola: ya había vuelto al final
+
+        cur = self.current
+        if cur and self.state in (PlayerState.PLAYING, PlayerState.PAUSED):
+            self._disarm()
+            self._fire(self.on_track_finished, self.guild_id, cur, self._time_played_seconds(), False)
+            old = self._mixer.clear_music() if self._mixer else None
+            if old:
+                old.cleanup()  # _load cambia la generación: su fin no es un evento
+        if cur:
+            self.queue.appendleft(cur)  # sigue fijada: es la siguiente
+        # el archivo sigue fijado (o en la caché): arranca sin resolver ni descargar
+        self._load(prev)
+        self._notify_state()
+        return True, f"Volviendo a: {prev.title}"
+
+    async def seek(self, seconds: float, relative: bool = False) -> Tuple[bool, str]:
+        """Salta a `seconds` dentro de la pista (o avanza/retrocede si relative=True)."""
+        result = await self._call("seek", float(seconds), relative)
+        if isinstance(result, asyncio.Future):
+            return await result  # se está abriendo: responde "seek_ready"
+        return result
+
+    async def _ev_seek(self, seconds: float, relative: bool):
+        """
+        Reabre la pista en la posición pedida (input seeking sobre el archivo de la caché;
+        sin archivo todavía, sobre la URL del stream) y la cambia en el mixer al tener audio listo.
+        La apertura corre en una tarea (skip / pausa / stop no esperan a FFmpeg); retorna el
+        resultado o un future que lo tendrá. Con varios seeks seguidos gana el último.
+        Lo escuchado sigue sumando aparte: el seek no cuenta como tiempo de escucha.
+        """
+        track, old, mixer = self.current, self._source, self._mixer
+        if self.state not in (PlayerState.PLAYING, PlayerState.PAUSED) or not track or not old or not mixer:
+            return False, "No hay nada sonando."
+        if track.live:
+            return False, "Una radio en vivo no se puede adelantar ni retroceder."
+        target = self.position() + seconds if relative else seconds
+        end = self._track_end(track)
+        if end:
+            target = min(target, max(0.0, end - 1))
+        target = max(0.0, target)
+
+        self._seek_seq += 1
+        done = asyncio.get_running_loop().create_future()
+        self._seek_task = asyncio.create_task(
+            self._open_seek(self._seek_seq, track, old, mixer, target, done)
+        )
+        return done
+
+    async def _open_seek(
+        self, seq: int, track: Track, old: GaplessSource, mixer: MixerSource, target: float, done: asyncio.Future
+    ):
         try:
-            if self._prefetch_task and not self._prefetch_task.done():
-                self._prefetch_task.cancel()
+            src, streaming, target = await self._make_source(track, target)
         except Exception:
-            pass
+            src = None
+        if src is None:
+            if not done.done():
+                done.set_result((False, "No pude abrir la pista en esa posición."))
+            return
+        fresh = PrebufferedSource(src, frames=SEEK_PREBUFFER_FRAMES)
+        try:
+            await asyncio.to_thread(fresh.fill)  # FFmpeg arranca en un hilo; sigue sonando la anterior
+        except Exception:
+            fresh.cleanup()
+            if not done.done():
+                done.set_result((False, "No pude abrir la pista en esa posición."))
+            return
+        self._post("seek_ready", seq, track, old, mixer, fresh, streaming, target, done)
+
+    async def _ev_seek_ready(
+        self, seq: int, track: Track, old: GaplessSource, mixer: MixerSource,
+        fresh: PrebufferedSource, streaming: bool, target: float, done: asyncio.Future,
+    ):
+        result: Tuple[bool, str] = (False, "No pude abrir la pista en esa posición.")
+        try:
+            result = await self._apply_seek(seq, track, old, mixer, fresh, streaming, target)
+        finally:
+            if not done.done():
+                done.set_result(result)
+
+    async def _apply_seek(
+        self, seq: int, track: Track, old: GaplessSource, mixer: MixerSource,
+        fresh: PrebufferedSource, streaming: bool, target: float,
+    ) -> Tuple[bool, str]:
+        if seq != self._seek_seq:
+            fresh.cleanup()
+            return False, "Se pidió otro salto."
+        if (
+            self.current is not track or self._source is not old or self._mixer is not mixer
+            or self.state not in (PlayerState.PLAYING, PlayerState.PAUSED)
+        ):
+            fresh.cleanup()  # la pista cambió mientras se abría
+            return False, "La pista cambió."
+
+        self._disarm()
+        listened = self._time_played_seconds()
+        gen = self._gen = next(self._tokens)
+        source = GaplessSource(
+            fresh, gen, on_switch=lambda token, carry: self._post_threadsafe("switched", token, carry)
+        )
+        prev = mixer.clear_music()
+        if not mixer.set_music(source, on_end=lambda err: self._post_threadsafe("track_end", source.token, err)):
+            source.cleanup()
+            if prev:
+                prev.cleanup()
+            self._park(track)
+            return False, "La conexión de voz se cerró."
+        if prev:
+            prev.cleanup()  # su on_end no se llama: el fin de la pista vieja no es un evento
+
+        self._source = source
+        self._streaming = streaming
+        self._play_offset = target
+        paused = self.state is PlayerState.PAUSED
+        self._time_start(carry=listened)
+        if paused:
+            mixer.pause_music(True)  # set_music despausa: la pista sigue pausada donde se pidió
+            self._time_pause()
+        self._schedule_prearm()
+        self._notify_state()
+        return True, f"Posición: {int(target) // 60}:{int(target) % 60:02d}"
 
-        # detener
+    async def stop(self):
+        return await self._call("stop")
+
+    async def _ev_stop(self):
+        # cualquier evento en vuelo de la pista actual queda obsoleto
+        self._gen = next(self._tokens)
+        self._drop_source()
+        if self._load_task and not self._load_task.done():
+            self._load_task.cancel()
+        for task in list(self._prefetch_tasks.values()):
+            task.cancel()
+        self._prefetch_tasks.clear()
+        for _, task in list(self._downloads.values()):
+            task.cancel()
+        if self._meta_task:
+            self._meta_task.cancel()
+
+        # detener (música y capas)
         try:
             if self.voice and self.voice.is_connected():
                 self.voice.stop()
         except Exception:
             pass
+        self._mixer = None
 
+        for t in ([self.current] if self.current else []) + list(self.queue) + list(self.history):
+            self._release(t)
         self.queue.clear()
+        self.history.clear()
         self.current = None
+        self.state = PlayerState.IDLE
+        self._streaming = False
         self._time_reset()
 
         # desconectar
@@ -382,13 +1541,121 @@ class GuildMusicPlayer:
         except Exception:
             pass
 
-        self._wipe_temp()
-
-        self._stopping = False
-        await self._notify_state()
+        self._notify_state()
         return True, "Detenido y limpiado."
 
+    async def shuffle(self) -> bool:
+        return await self._call("shuffle")
+
+    async def _ev_shuffle(self) -> bool:
+        if len(self.queue) < 2:
+            return False
+        self.queue.shuffle()
+        self._rearm()
+        await self._ensure_prefetch()  # la ventana apunta a otras pistas
+        self._notify_state()
+        return True
+
+    async def move(self, src: int, dst: int) -> Tuple[bool, str]:
+        """Mueve la pista de la posición `src` a `dst` (1-based, como se muestra la cola)."""
+        return await self._call("move", src, dst)
+
+    async def _ev_move(self, src: int, dst: int) -> Tuple[bool, str]:
+        n = len(self.queue)
+        if not (1 <= src <= n and 1 <= dst <= n):
+            return False, f"Posición inválida (la cola tiene {n})."
+        track = self.queue.move(src - 1, dst - 1)
+        self._after_reorder()
+        await self._ensure_prefetch()
+        return True, f"Movida a la posición {dst}: {track.title}"
+
+    async def remove_at(self, pos: int) -> Tuple[bool, str]:
+        """Saca de la cola la pista en la posición `pos` (1-based)."""
+        return await self._call("remove_at", pos)
+
+    async def _ev_remove_at(self, pos: int) -> Tuple[bool, str]:
+        if not 1 <= pos <= len(self.queue):
+            return False, f"Posición inválida (la cola tiene {len(self.queue)})."
+        track = self.queue.pop(pos - 1)
+        self._after_reorder()
+        self._release(track)
+        await self._ensure_prefetch()
+        return True, f"Quitada: {track.title}"
+
+    async def jump(self, pos: int) -> Tuple[bool, str]:
+        """Salta a la pista en la posición `pos` (1-based): las anteriores se descartan."""
+        return await self._call("jump", pos)
+
+    async def _ev_jump(self, pos: int) -> Tuple[bool, str]:
+        if not 1 <= pos <= len(self.queue):
+            return False, f"Posición inválida (la cola tiene {len(self.queue)})."
+        dropped = self.queue.drop_front(pos - 1)
+        for t in dropped:
+            if self.loop_queue:
+                self.queue.append(t)
+            else:
+                self._release(t)
+        target = self.queue[0]
+        if self.state is PlayerState.IDLE:
+            self._load()
+        else:
+            ok, _ = await self._ev_skip()  # la actual termina: suena la que quedó al frente
+            if not ok:
+                self._rearm()  # sin voz: queda primera en la cola
+        await self._ensure_prefetch()
+        self._notify_state()
+        return True, f"Saltando a: {target.title}"
+
+    def _after_reorder(self):
+        self._rearm()  # la siguiente enganchada puede haber cambiado
+        self._notify_state()
+
+    async def upcoming(self, start: int = 0, count: int = 10) -> List[Track]:
+        """
+        Pistas [start, start+count) de la cola para mostrar.
+        La metadata se completa acá, solo para las visibles y solo desde la caché de resoluciones
+        (sin extraer nada): la cola de una playlist grande no resuelve miles de pistas por adelantado.
+        """
+        tracks = self.queue.slice(start, start + count)
+        pending = [t for t in tracks if not t.webpage_url]
+        if pending:
+            await asyncio.gather(*(self._resolve_cached(t) for t in pending), return_exceptions=True)
+        return tracks
+
+    async def restore(
+        self,
+        current: Optional[Track],
+        tracks: List[Track],
+        position: float = 0.0,
+        loop_track: bool = False,
+        loop_queue: bool = False,
+    ) -> bool:
+        """Reanuda un snapshot (tras reinicio). False si mientras tanto ya se pidió otra cosa."""
+        return await self._call("restore", current, tracks, position, loop_track, loop_queue)
+
+    async def _ev_restore(
+        self,
+        current: Optional[Track],
+        tracks: List[Track],
+        position: float,
+        loop_track: bool,
+        loop_queue: bool,
+    ) -> bool:
+        if self.state is not PlayerState.IDLE or self.queue:
+            return False
+        self.loop_track, self.loop_queue = loop_track, loop_queue
+        self.queue.extend(tracks)
+        self._ensure_metadata()
+        # los archivos que sigan en la caché se usan tal cual (el Track guarda su cache_key)
+        if current:
+            self._load(current, start_at=position)
+        else:
+            self._load()
+        self._notify_state()
+        return True
+
     def toggle_loop_mode(self) -> str:
+        self._post("rearm")  # cambia cuál es la siguiente pista
         if not self.loop_track and not self.loop_queue:
             self.loop_track = True
             self.loop_queue = False
@@ -410,22 +1677,58 @@ class MusicService:
         downloader: YTDLDownloader,
         ffmpeg_path: str = "ffmpeg",
         temp_root: str = "tmp_audio",
+        cache_max_bytes: int = 2 * 1024 ** 3,
+        opus_cache: bool = True,
+        db_path: str = "music_cache.db",
+        prefetch_depth: int = 3,
+        prefetch_budget_bytes: int = 300 * 1024 * 1024,
+        max_downloads: int = 3,
+        crossfade_seconds: float = 0.0,
+        audio_nodes: int = 0,
+        history_size: int = 5,
+        metadata_concurrency: int = 4,
+        resume: bool = True,
         on_state_change: Optional[Callable[[int], Awaitable[None]]] = None,
         on_track_started: Optional[Callable[[int, Track], Awaitable[None]]] = None,
         on_track_finished: Optional[Callable[[int, Track, int, bool], Awaitable[None]]] = None,
+        stream_first: bool = True,
     ):
         self.bot = bot
         self.downloader = downloader
         self.ffmpeg_path = ffmpeg_path
         self.temp_root = temp_root
+        self.stream_first = stream_first
 
         self.on_state_change = on_state_change
         self.on_track_started = on_track_started
         self.on_track_finished = on_track_finished
 
         os.makedirs(self.temp_root, exist_ok=True)
+        # caché compartida por todos los servidores
+        self.cache = AudioCache(os.path.join(self.temp_root, "cache"), cache_max_bytes)
+        self.scheduler = DownloadScheduler(max_concurrent=max_downloads)
+        self.transcoder = OpusTranscoder(ffmpeg_path) if opus_cache else None
+        self.analyzer = AudioAnalyzer(ffmpeg_path, db_path)
+        self.prefetch_depth = prefetch_depth
+        self.prefetch_budget_bytes = prefetch_budget_bytes
+        self.crossfade_seconds = crossfade_seconds
+        self.history_size = history_size
+        # metadata de las colas en segundo plano (búsqueda plana, tope global); 0 = desactivado
+        self.metadata: Optional[MetadataResolver] = (
+            MetadataResolver(downloader, max_concurrent=metadata_concurrency) if metadata_concurrency > 0 else None
+        )
+        # audio_nodes > 0: FFmpeg/Opus de todos los servidores en procesos aparte
+        self.nodes: Optional[AudioNodePool] = None
+        if audio_nodes > 0:
+            self.nodes = AudioNodePool(audio_nodes, os.path.join(self.temp_root, "nodes"), ffmpeg_path)
         self.players: dict[int, GuildMusicPlayer] = {}
 
+        # snapshot de cada servidor (cola, loop, pista y posición) para reanudar tras reinicios
+        self.snapshots: Optional[SnapshotStore] = SnapshotStore(db_path) if resume else None
+        self._panels: Dict[int, Tuple[int, int]] = {}             # guild_id -> (canal, mensaje)
+        self._saved_versions: Dict[int, int] = {}
+        self._snapshot_task: Optional[asyncio.Task] = None
+
     def get_player(self, guild_id: int) -> GuildMusicPlayer:
         if guild_id not in self.players:
             self.players[guild_id] = GuildMusicPlayer(
@@ -433,9 +1736,118 @@ class MusicService:
                 guild_id=guild_id,
                 downloader=self.downloader,
                 ffmpeg_path=self.ffmpeg_path,
-                temp_root=self.temp_root,
+                cache=self.cache,
+                scheduler=self.scheduler,
                 on_state_change=self.on_state_change,
                 on_track_started=self.on_track_started,
                 on_track_finished=self.on_track_finished,
+                stream_first=self.stream_first,
+                transcoder=self.transcoder,
+                analyzer=self.analyzer,
+                prefetch_depth=self.prefetch_depth,
+                prefetch_budget_bytes=self.prefetch_budget_bytes,
+                crossfade_seconds=self.crossfade_seconds,
+                node=self.nodes.for_guild(guild_id) if self.nodes else None,
+                history_size=self.history_size,
+                metadata=self.metadata,
             )
-        return self.players[guild_id]
\ No newline at end of file
+        return self.players[guild_id]
+
+    # ---------- snapshots ----------
+    def set_panel(self, guild_id: int, channel_id: int, message_id: int):
+        """El cog avisa dónde está el panel del servidor (se reengancha al reanudar)."""
+        self._panels[guild_id] = (channel_id, message_id)
+        self._saved_versions.pop(guild_id, None)
+
+    def _snapshot_of(self, player: GuildMusicPlayer) -> GuildSnapshot:
+        voice = player.voice
+        channel_id = voice.channel.id if voice and voice.is_connected() and voice.channel else 0
+        panel = self._panels.get(player.guild_id, (0, 0))
+        return GuildSnapshot(
+            guild_id=player.guild_id,
+            voice_channel_id=channel_id,
+            loop_track=player.loop_track,
+            loop_queue=player.loop_queue,
+            current=player.current.to_snapshot() if player.current else None,
+            position=round(player.position(), 2),
+            panel_channel_id=panel[0],
+            panel_message_id=panel[1],
+            updated_at=time.time(),
+        )
+
+    async def save_snapshots(self, force: bool = False):
+        """
+        Guarda los servidores que cambiaron desde el último guardado (o que están sonando:
+        la posición avanza). La cola se escribe incremental; sin nada que reanudar, se borra.
+        """
+        store = self.snapshots
+        if not store:
+            return
+        for gid, player in list(self.players.items()):
+            playing = player.state is PlayerState.PLAYING
+            if not force and not playing and self._saved_versions.get(gid) == player.version:
+                continue
+            self._saved_versions[gid] = player.version
+            try:
+                if not player.current and not player.queue:
+                    store.forget(gid)
+                    await asyncio.to_thread(store.delete, gid)
+                    continue
+                snap = self._snapshot_of(player)
+                if not snap.voice_channel_id:
+                    continue  # sin voz (ej: reconectando): se conserva el último snapshot
+                queue = player.queue
+                diff = store.plan_queue(gid, [t.uid for t in queue], lambda i: queue[i].to_snapshot())
+                await asyncio.to_thread(store.write, snap, diff)
+            except Exception as e:
+                store.forget(gid)  # la próxima vez se reescribe completa
+                self._saved_versions.pop(gid, None)
+                print(f"[Musica] No pude guardar el estado de {gid}: {e}")
+
+    async def _snapshot_loop(self):
+        while True:
+            await asyncio.sleep(SNAPSHOT_INTERVAL)
+            await self.save_snapshots()
+
+    async def resume_all(self) -> List[GuildSnapshot]:
+        """
+        Al arrancar: reconecta la voz y reanuda cada servidor guardado en su posición.
+        Retorna los snapshots reanudados (el cog reengancha los paneles). Solo la primera vez.
+        """
+        store = self.snapshots
+        if not store or self._snapshot_task:
+            return []
+        resumed: List[GuildSnapshot] = []
+        try:
+            snaps = await asyncio.to_thread(store.load_all)
+        except Exception as e:
+            print(f"[Musica] No pude leer los snapshots: {e}")
+            snaps = []
+        for snap in snaps:
+            guild = self.bot.get_guild(snap.guild_id)
+            channel = guild.get_channel(snap.voice_channel_id) if guild else None
+            if not isinstance(channel, discord.VoiceChannel):
+                store.forget(snap.guild_id)
+                await asyncio.to_thread(store.delete, snap.guild_id)
+                continue
+            player = self.get_player(snap.guild_id)
+            current = Track.from_snapshot(snap.current) if snap.current else None
+            tracks = [Track.from_snapshot(d) for d in snap.queue]
+            try:
+                await player.ensure_voice(channel)
+                ok = await player.restore(current, tracks, snap.position, snap.loop_track, snap.loop_queue)
+            except Exception as e:
+                print(f"[Musica] No pude reanudar {snap.guild_id}: {e}")
+                continue
+            if ok:
+                if snap.panel_message_id:
+                    self._panels[snap.guild_id] = (snap.panel_channel_id, snap.panel_message_id)
+                resumed.append(snap)
+        self._snapshot_task = asyncio.create_task(self._snapshot_loop())
+        return resumed
+
+    def close(self):
+        if self._snapshot_task:
+            self._snapshot_task.cancel()
+        if self.nodes:
+            self.nodes.close()
\ No newline at end of file
@@ -0,0 +1,113 @@
+# musicbot/playlists.py
+from __future__ import annotations
+
+import json
+import sqlite3
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+PLAYLIST_MAX_TRACKS = 2000      # pistas por playlist guardada
+PLAYLIST_MAX_PER_USER = 50      # playlists por usuario
+
+
+@dataclass
+class PlaylistInfo:
+    name: str
+    tracks: int
+    duration: int               # segundos (pistas con duración conocida)
+    updated_at: float
+
+
+class PlaylistStore:
+    """
+    Playlists guardadas por usuario en SQLite (valen en cualquier servidor).
+    - Cada pista se guarda ya resuelta (URL del video, duración, título, clave de caché):
+      cargarla no busca nada y el prefetch encuentra los archivos que sigan en la caché
+    - Nombres únicos por usuario sin distinguir mayúsculas; guardar con el mismo nombre reemplaza
+    - Métodos bloqueantes: asyncio.to_thread
+    """
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        with sqlite3.connect(self.db_path) as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS playlists (
+                    id INTEGER PRIMARY KEY,
+                    owner_id INTEGER NOT NULL,
+                    name TEXT NOT NULL COLLATE NOCASE,
+                    duration INTEGER NOT NULL,
+                    updated_at REAL NOT NULL,
+                    UNIQUE (owner_id, name)
+                )
+            """)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS playlist_tracks (
+                    playlist_id INTEGER NOT NULL,
+                    pos INTEGER NOT NULL,
+                    track TEXT NOT NULL,
+                    PRIMARY KEY (playlist_id, pos)
+                )
+            """)
+
+    def save(self, owner_id: int, name: str, tracks: List[Dict[str, Any]]) -> int:
+        """Guarda (o reemplaza) la playlist. Retorna cuántas pistas quedaron guardadas."""
+        tracks = tracks[:PLAYLIST_MAX_TRACKS]
+        duration = sum(int(t.get("duration") or 0) for t in tracks)
+        with sqlite3.connect(self.db_path) as conn:
+            row = conn.execute(
+                "SELECT id FROM playlists WHERE owner_id = ? AND name = ?", (owner_id, name)
+            ).fetchone()
+            if row:
+                pid = row[0]
+                conn.execute(
+                    "UPDATE playlists SET name = ?, duration = ?, updated_at = ? WHERE id = ?",
+                    (name, duration, time.time(), pid),
+                )
+                conn.execute("DELETE FROM playlist_tracks WHERE playlist_id = ?", (pid,))
+            else:
+                count = conn.execute("SELECT COUNT(*) FROM playlists WHERE owner_id = ?", (owner_id,)).fetchone()[0]
+                if count >= PLAYLIST_MAX_PER_USER:
+                    raise ValueError(f"Máximo {PLAYLIST_MAX_PER_USER} playlists por usuario.")
+                pid = conn.execute(
+                    "INSERT INTO playlists (owner_id, name, duration, updated_at) VALUES (?, ?, ?, ?)",
+                    (owner_id, name, duration, time.time()),
+                ).lastrowid
+            conn.executemany(
+                "INSERT INTO playlist_tracks VALUES (?, ?, ?)",
+                [(pid, i, json.dumps(t)) for i, t in enumerate(tracks)],
+            )
+        return len(tracks)
+
+    def load(self, owner_id: int, name: str) -> Optional[List[Dict[str, Any]]]:
+        with sqlite3.connect(self.db_path) as conn:
+            row = conn.execute(
+                "SELECT id FROM playlists WHERE owner_id = ? AND name = ?", (owner_id, name)
+            ).fetchone()
+            if not row:
+                return None
+            rows = conn.execute(
+                "SELECT track FROM playlist_tracks WHERE playlist_id = ? ORDER BY pos", (row[0],)
+            ).fetchall()
+        return [json.loads(raw) for (raw,) in rows]
+
+    def list(self, owner_id: int) -> List[PlaylistInfo]:
+        with sqlite3.connect(self.db_path) as conn:
+            rows = conn.execute(
+                "SELECT p.name, COUNT(t.pos), p.duration, p.updated_at FROM playlists p"
+                " LEFT JOIN playlist_tracks t ON t.playlist_id = p.id"
+                " WHERE p.owner_id = ? GROUP BY p.id ORDER BY p.name",
+                (owner_id,),
+            ).fetchall()
+        return [PlaylistInfo(*row) for row in rows]
+
+    def delete(self, owner_id: int, name: str) -> bool:
+        with sqlite3.connect(self.db_path) as conn:
+            row = conn.execute(
+                "SELECT id FROM playlists WHERE owner_id = ? AND name = ?", (owner_id, name)
+            ).fetchone()
+            if not row:
+                return False
+            conn.execute("DELETE FROM playlist_tracks WHERE playlist_id = ?", (row[0],))
+            conn.execute("DELETE FROM playlists WHERE id = ?", (row[0],))
+        return True
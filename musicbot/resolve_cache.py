@@ -0,0 +1,129 @@
+# musicbot/resolve_cache.py
+from __future__ import annotations
+
+import json
+import re
+import sqlite3
+import time
+from dataclasses import dataclass
+from typing import Optional, Dict, Any
+from urllib import parse
+
+_WS_RE = re.compile(r"\s+")
+_YT_ID_RE = re.compile(r"^[A-Za-z0-9_-]{11}$")
+
+# solo guardamos lo necesario para mostrar la pista y ubicarla en la caché de audio
+_CACHED_FIELDS = ("id", "title", "duration", "thumbnail", "webpage_url", "extractor_key")
+
+
+@dataclass
+class ResolveHit:
+    ok: bool                       # False = búsqueda fallida cacheada (negative cache)
+    info: Dict[str, Any]
+
+
+class ResolveCache:
+    """
+    Caché persistente (SQLite) de resoluciones de yt-dlp: query/URL -> metadata del video.
+    - Queries normalizadas (minúsculas, espacios) y URLs de YouTube reducidas a "yt:<id>"
+    - TTL configurable; los fallos se guardan con un TTL más corto (negative caching)
+    - No guarda la URL directa del stream (expira en horas)
+    """
+
+    def __init__(self, db_path: str, ttl: float = 7 * 24 * 3600, negative_ttl: float = 600):
+        self.db_path = db_path
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        with sqlite3.connect(self.db_path) as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS resolve_cache (
+                    query_key TEXT PRIMARY KEY,
+                    ok INTEGER NOT NULL,
+                    info TEXT,
+                    expires_at REAL NOT NULL
+                )
+            """)
+            conn.execute("DELETE FROM resolve_cache WHERE expires_at < ?", (time.time(),))
+
+    # ---------- claves ----------
+    @staticmethod
+    def youtube_id(text: str) -> Optional[str]:
+        """Id de video si `text` es un link de YouTube (watch, youtu.be, shorts, music)."""
+        try:
+            u = parse.urlparse(text.strip())
+        except ValueError:
+            return None
+        host = (u.hostname or "").lower()
+        if host.startswith("www.") or host.startswith("m."):
+            host = host.split(".", 1)[1]
+        vid = None
+        if host == "youtu.be":
+            vid = u.path.lstrip("/").split("/")[0]
+        elif host in ("youtube.com", "music.youtube.com"):
+            if u.path == "/watch":
+                vid = (parse.parse_qs(u.query).get("v") or [""])[0]
+            elif u.path.startswith(("/shorts/", "/live/", "/embed/")):
+                vid = u.path.split("/")[2]
+        return vid if vid and _YT_ID_RE.match(vid) else None
+
+    @staticmethod
+    def playlist_id(text: str) -> Optional[str]:
+        """Id de lista si `text` es una playlist o mix de YouTube (/playlist o watch con ?list=)."""
+        try:
+            u = parse.urlparse(text.strip())
+        except ValueError:
+            return None
+        host = (u.hostname or "").lower()
+        if host.startswith("www.") or host.startswith("m."):
+            host = host.split(".", 1)[1]
+        if host not in ("youtube.com", "music.youtube.com") or u.path not in ("/playlist", "/watch"):
+            return None
+        lid = (parse.parse_qs(u.query).get("list") or [""])[0]
+        return lid or None
+
+    @classmethod
+    def normalize(cls, query_or_url: str) -> str:
+        q = _WS_RE.sub(" ", (query_or_url or "").strip())
+        vid = cls.youtube_id(q)
+        if vid:
+            return f"yt:{vid}"
+        if q.startswith(("http://", "https://")):
+            return f"url:{q}"
+        return f"q:{q.lower()}"
+
+    # ---------- lectura / escritura ----------
+    def get(self, key: str) -> Optional[ResolveHit]:
+        with sqlite3.connect(self.db_path) as conn:
+            row = conn.execute(
+                "SELECT ok, info, expires_at FROM resolve_cache WHERE query_key = ?", (key,)
+            ).fetchone()
+        if not row or row[2] < time.time():
+            return None
+        ok, raw, _ = row
+        info = json.loads(raw) if raw else {}
+        if ok:
+            info["_cached"] = True
+        return ResolveHit(ok=bool(ok), info=info)
+
+    def put(self, key: str, info: Dict[str, Any]):
+        """Guarda la resolución bajo la query y también bajo "yt:<id>" (para links directos)."""
+        data = {k: info.get(k) for k in _CACHED_FIELDS if info.get(k) is not None}
+        if not data.get("id"):
+            return
+        raw = json.dumps(data)
+        expires = time.time() + self.ttl
+        keys = {key}
+        if (data.get("extractor_key") or "").lower() == "youtube":
+            keys.add(f"yt:{data['id']}")
+        with sqlite3.connect(self.db_path) as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO resolve_cache VALUES (?, 1, ?, ?)",
+                [(k, raw, expires) for k in keys],
+            )
+
+    def put_miss(self, key: str):
+        with sqlite3.connect(self.db_path) as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO resolve_cache VALUES (?, 0, NULL, ?)",
+                (key, time.time() + self.negative_ttl),
+            )
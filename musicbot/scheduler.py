@@ -0,0 +1,160 @@
+# musicbot/scheduler.py
+from __future__ import annotations
+
+import asyncio
+from collections import OrderedDict, deque
+from dataclasses import dataclass
+from enum import IntEnum
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional
+
+
+class Priority(IntEnum):
+    NOW = 0    # pista que está (o debería estar) sonando
+    NEXT = 1   # siguiente de la cola
+    DEEP = 2   # prefetch profundo
+
+
+@dataclass
+class _Job:
+    key: str
+    guild_id: int
+    priority: Priority
+    producer: Callable[[], Awaitable[Any]]
+    future: asyncio.Future
+    waiters: int = 0
+    running: bool = False
+
+
+class DownloadScheduler:
+    """
+    Planificador global de descargas (uno por MusicService).
+    - Prioridades: NOW > NEXT > DEEP; dentro de cada una, round-robin entre servidores
+    - Tope global de descargas simultáneas; NOW no espera por el tope (son pocas y urgentes)
+    - Misma clave (video) pedida por varios servidores = una sola descarga compartida
+    - Si todos los interesados cancelan un trabajo que aún no empezó, se descarta
+    """
+
+    def __init__(self, max_concurrent: int = 3):
+        self.max_concurrent = max(1, max_concurrent)
+        self._jobs: Dict[str, _Job] = {}
+        # prioridad -> guild_id -> cola FIFO de trabajos (el orden del OrderedDict es el turno)
+        self._pending: Dict[Priority, "OrderedDict[int, Deque[_Job]]"] = {
+            p: OrderedDict() for p in Priority
+        }
+        self._running = 0
+        self._tasks: set[asyncio.Task] = set()
+
+    # ---------- estado ----------
+    @property
+    def running(self) -> int:
+        return self._running
+
+    def pending(self) -> int:
+        return sum(len(q) for by_guild in self._pending.values() for q in by_guild.values())
+
+    # ---------- API ----------
+    async def submit(
+        self,
+        key: str,
+        guild_id: int,
+        priority: Priority,
+        producer: Callable[[], Awaitable[Any]],
+    ) -> Any:
+        job = self._jobs.get(key)
+        if job is None:
+            job = _Job(
+                key=key,
+                guild_id=guild_id,
+                priority=priority,
+                producer=producer,
+                future=asyncio.get_running_loop().create_future(),
+            )
+            self._jobs[key] = job
+            self._enqueue(job)
+        else:
+            self.bump(key, priority)
+        job.waiters += 1
+        self._pump()
+
+        try:
+            return await asyncio.shield(job.future)
+        finally:
+            job.waiters -= 1
+            if job.waiters <= 0 and not job.running and not job.future.done():
+                # nadie lo espera y no empezó: fuera de la cola
+                self._remove_pending(job)
+                self._jobs.pop(job.key, None)
+                job.future.cancel()
+
+    def bump(self, key: str, priority: Priority):
+        """Sube la prioridad de un trabajo pendiente (ej: el prefetch pasó a ser la pista actual)."""
+        job = self._jobs.get(key)
+        if not job or job.running or priority >= job.priority:
+            return
+        self._remove_pending(job)
+        job.priority = priority
+        self._enqueue(job)
+        self._pump()
+
+    # ---------- internos ----------
+    def _enqueue(self, job: _Job):
+        by_guild = self._pending[job.priority]
+        by_guild.setdefault(job.guild_id, deque()).append(job)
+
+    def _remove_pending(self, job: _Job):
+        by_guild = self._pending[job.priority]
+        q = by_guild.get(job.guild_id)
+        if not q:
+            return
+        try:
+            q.remove(job)
+        except ValueError:
+            return
+        if not q:
+            del by_guild[job.guild_id]
+
+    def _pick(self, include_now_only: bool) -> Optional[_Job]:
+        for prio in Priority:
+            if include_now_only and prio != Priority.NOW:
+                break
+            by_guild = self._pending[prio]
+            if not by_guild:
+                continue
+            guild_id, q = next(iter(by_guild.items()))
+            job = q.popleft()
+            del by_guild[guild_id]
+            if q:
+                by_guild[guild_id] = q  # al final: le toca a otro servidor
+            return job
+        return None
+
+    def _pump(self):
+        while True:
+            job = self._pick(include_now_only=self._running >= self.max_concurrent)
+            if not job:
+                return
+            job.running = True
+            self._running += 1
+            task = asyncio.create_task(self._run(job))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, job: _Job):
+        try:
+            result = await job.producer()
+        except asyncio.CancelledError:
+            if not job.future.done():
+                job.future.cancel()
+            raise
+        except Exception as e:
+            if not job.future.done():
+                job.future.set_exception(e)
+                job.future.exception()  # marcado como leído aunque nadie espere
+        else:
+            if not job.future.done():
+                job.future.set_result(result)
+        finally:
+            self._running -= 1
+            if self._jobs.get(job.key) is job:
+                del self._jobs[job.key]
+            self._pump()
@@ -0,0 +1,107 @@
+# musicbot/shaping.py
+from __future__ import annotations
+
+import threading
+import time
+from typing import Callable, Dict, Optional
+
+BURST_SECONDS = 1.0       # el balde acumula como mucho 1 s de tasa (ráfagas cortas)
+VOICE_WEIGHT = 0.5        # cada conexión de voz activa divide la tasa por (1 + 0.5 * n)
+MIN_RATE_BPS = 32 * 1024  # piso: el prefetch nunca se detiene del todo
+
+
+class _Bucket:
+    """Balde de tokens con deuda: consumir de más se paga durmiendo lo que falte."""
+
+    def __init__(self):
+        self.tokens = 0.0
+        self.stamp = time.monotonic()
+
+    def take(self, n: int, rate: float) -> float:
+        """Consume n bytes a `rate` B/s. Retorna los segundos de espera (0 si había tokens)."""
+        now = time.monotonic()
+        self.tokens = min(rate * BURST_SECONDS, self.tokens + (now - self.stamp) * rate)
+        self.stamp = now
+        self.tokens -= n
+        return -self.tokens / rate if self.tokens < 0 else 0.0
+
+
+class BandwidthShaper:
+    """
+    Limitador de ancho de banda para descargas en segundo plano (prefetch / replay).
+    - Token bucket global + uno por servidor; una descarga espera por el más restrictivo
+    - La tasa global se ajusta sola: cuantas más conexiones de voz activas, menos para el prefetch
+    - throttle() bloquea (corre en el hilo de yt-dlp, desde su progress hook)
+    - rate_for() da una tasa fija para workers en otro proceso (opción `ratelimit` de yt-dlp)
+    - 0 = sin límite; la pista que está sonando nunca se limita (lo decide quien llama)
+    """
+
+    def __init__(
+        self,
+        global_bps: float = 0,
+        guild_bps: float = 0,
+        voice_count: Optional[Callable[[], int]] = None,
+    ):
+        self.global_bps = global_bps
+        self.guild_bps = guild_bps
+        self.voice_count = voice_count
+        self._lock = threading.Lock()
+        self._global = _Bucket()
+        self._guilds: Dict[int, _Bucket] = {}
+        self._active: Dict[int, int] = {}       # guild_id -> descargas limitadas en curso
+
+    @property
+    def enabled(self) -> bool:
+        return self.global_bps > 0 or self.guild_bps > 0
+
+    def _voices(self) -> int:
+        try:
+            return max(0, int(self.voice_count())) if self.voice_count else 0
+        except Exception:
+            return 0
+
+    def global_rate(self) -> float:
+        """Tasa global vigente (B/s), ya ajustada por las conexiones de voz. 0 = sin límite."""
+        if self.global_bps <= 0:
+            return 0.0
+        return max(MIN_RATE_BPS, self.global_bps / (1 + VOICE_WEIGHT * self._voices()))
+
+    # ---------- descargas en curso ----------
+    def begin(self, guild_id: int):
+        with self._lock:
+            self._active[guild_id] = self._active.get(guild_id, 0) + 1
+
+    def end(self, guild_id: int):
+        with self._lock:
+            n = self._active.get(guild_id, 0) - 1
+            if n > 0:
+                self._active[guild_id] = n
+            else:
+                self._active.pop(guild_id, None)
+                self._guilds.pop(guild_id, None)
+
+    def rate_for(self, guild_id: int) -> Optional[int]:
+        """Tasa fija para una descarga nueva: su parte de la global y del tope del servidor."""
+        with self._lock:
+            total = sum(self._active.values()) + 1
+            in_guild = self._active.get(guild_id, 0) + 1
+        rates = []
+        g = self.global_rate()
+        if g:
+            rates.append(g / total)
+        if self.guild_bps > 0:
+            rates.append(self.guild_bps / in_guild)
+        return int(max(MIN_RATE_BPS, min(rates))) if rates else None
+
+    def throttle(self, guild_id: int, nbytes: int):
+        """Descuenta nbytes recién bajados y duerme lo necesario para respetar las tasas."""
+        if nbytes <= 0:
+            return
+        g = self.global_rate()
+        with self._lock:
+            wait = self._global.take(nbytes, g) if g else 0.0
+            if self.guild_bps > 0:
+                bucket = self._guilds.setdefault(guild_id, _Bucket())
+                wait = max(wait, bucket.take(nbytes, self.guild_bps))
+        if wait > 0:
+            time.sleep(min(wait, 5.0))
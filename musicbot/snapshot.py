@@ -0,0 +1,192 @@
+# musicbot/snapshot.py
+from __future__ import annotations
+
+import json
+import sqlite3
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+SNAPSHOT_INTERVAL = 2.0              # cada cuánto se guardan los servidores que cambiaron / suenan
+RESUME_MAX_AGE = 6 * 3600            # snapshots más viejos no se reanudan
+_ORD_MIN_GAP = 1e-6                  # huecos de orden más chicos -> se renumera la cola entera
+
+
+@dataclass
+class GuildSnapshot:
+    guild_id: int
+    voice_channel_id: int = 0
+    loop_track: bool = False
+    loop_queue: bool = False
+    current: Optional[Dict[str, Any]] = None
+    position: float = 0.0
+    panel_channel_id: int = 0
+    panel_message_id: int = 0
+    updated_at: float = 0.0
+    queue: List[Dict[str, Any]] = field(default_factory=list)
+
+
+@dataclass
+class _QueueDiff:
+    full: bool                                        # True = se reescribe la cola entera
+    delete: List[str]                                 # uids a borrar
+    upsert: List[Tuple[str, float, str]]              # (uid, orden, json de la pista)
+
+
+class SnapshotStore:
+    """
+    Estado de reproducción por servidor en SQLite (sobrevive reinicios y caídas).
+    - Una fila por servidor (loop, pista actual, posición, canal de voz, panel): chica, se reescribe
+    - La cola son filas (guild, uid, orden): cada guardado escribe solo el tramo que cambió
+      (prefijo y sufijo en común quedan intactos: popleft / append / move tocan pocas filas)
+    - plan_queue() corre en el loop (compara uids en memoria); write() en un hilo
+    """
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        # guild_id -> (uids guardados en orden, uid -> orden)
+        self._persisted: Dict[int, Tuple[List[str], Dict[str, float]]] = {}
+        with sqlite3.connect(self.db_path) as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS player_snapshot (
+                    guild_id INTEGER PRIMARY KEY,
+                    voice_channel_id INTEGER NOT NULL,
+                    loop_track INTEGER NOT NULL,
+                    loop_queue INTEGER NOT NULL,
+                    current TEXT,
+                    position REAL NOT NULL,
+                    panel_channel_id INTEGER NOT NULL,
+                    panel_message_id INTEGER NOT NULL,
+                    updated_at REAL NOT NULL
+                )
+            """)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS queue_snapshot (
+                    guild_id INTEGER NOT NULL,
+                    uid TEXT NOT NULL,
+                    ord REAL NOT NULL,
+                    track TEXT NOT NULL,
+                    PRIMARY KEY (guild_id, uid)
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_queue_snapshot_ord ON queue_snapshot (guild_id, ord)")
+
+    # ---------- cola incremental ----------
+    def plan_queue(
+        self,
+        guild_id: int,
+        uids: List[str],
+        serialize: Callable[[int], Dict[str, Any]],
+    ) -> Optional[_QueueDiff]:
+        """
+        Diferencia entre la cola guardada y `uids` (serialize(i) da la pista i).
+        None si no cambió. Actualiza el estado en memoria como si la escritura fuera a salir bien
+        (si falla, forget() fuerza una reescritura completa la próxima vez).
+        """
+        prev = self._persisted.get(guild_id)
+        if prev is not None and prev[0] == uids:
+            return None
+        if prev is None:
+            return self._plan_full(guild_id, uids, serialize)
+
+        old, ords = prev
+        n_old, n_new = len(old), len(uids)
+        p = 0
+        limit = min(n_old, n_new)
+        while p < limit and old[p] == uids[p]:
+            p += 1
+        s = 0
+        while s < limit - p and old[n_old - 1 - s] == uids[n_new - 1 - s]:
+            s += 1
+
+        old_mid = old[p:n_old - s]
+        new_idx = range(p, n_new - s)
+        lo = ords[old[p - 1]] if p else None
+        hi = ords[old[n_old - s]] if s else None
+        k = len(new_idx)
+        if lo is None and hi is None:
+            new_ords = [float(i) for i in range(k)]
+        elif hi is None:
+            new_ords = [lo + 1 + i for i in range(k)]
+        elif lo is None:
+            new_ords = [hi - k + i for i in range(k)]
+        else:
+            step = (hi - lo) / (k + 1)
+            if step < _ORD_MIN_GAP:
+                return self._plan_full(guild_id, uids, serialize)
+            new_ords = [lo + step * (i + 1) for i in range(k)]
+
+        upsert = []
+        new_map = dict(ords)
+        for uid in old_mid:
+            new_map.pop(uid, None)
+        for i, o in zip(new_idx, new_ords):
+            upsert.append((uids[i], o, json.dumps(serialize(i))))
+            new_map[uids[i]] = o
+        self._persisted[guild_id] = (list(uids), new_map)
+        return _QueueDiff(full=False, delete=old_mid, upsert=upsert)
+
+    def _plan_full(self, guild_id: int, uids: List[str], serialize: Callable[[int], Dict[str, Any]]) -> _QueueDiff:
+        upsert = [(uid, float(i), json.dumps(serialize(i))) for i, uid in enumerate(uids)]
+        self._persisted[guild_id] = (list(uids), {uid: float(i) for i, uid in enumerate(uids)})
+        return _QueueDiff(full=True, delete=[], upsert=upsert)
+
+    def forget(self, guild_id: int):
+        self._persisted.pop(guild_id, None)
+
+    # ---------- escritura / lectura (bloqueantes: asyncio.to_thread) ----------
+    def write(self, snap: GuildSnapshot, diff: Optional[_QueueDiff]):
+        with sqlite3.connect(self.db_path) as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO player_snapshot VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    snap.guild_id, snap.voice_channel_id, int(snap.loop_track), int(snap.loop_queue),
+                    json.dumps(snap.current) if snap.current else None, snap.position,
+                    snap.panel_channel_id, snap.panel_message_id, snap.updated_at,
+                ),
+            )
+            if diff is None:
+                return
+            if diff.full:
+                conn.execute("DELETE FROM queue_snapshot WHERE guild_id = ?", (snap.guild_id,))
+            elif diff.delete:
+                conn.executemany(
+                    "DELETE FROM queue_snapshot WHERE guild_id = ? AND uid = ?",
+                    [(snap.guild_id, uid) for uid in diff.delete],
+                )
+            conn.executemany(
+                "INSERT OR REPLACE INTO queue_snapshot VALUES (?, ?, ?, ?)",
+                [(snap.guild_id, uid, o, raw) for uid, o, raw in diff.upsert],
+            )
+
+    def delete(self, guild_id: int):
+        with sqlite3.connect(self.db_path) as conn:
+            conn.execute("DELETE FROM player_snapshot WHERE guild_id = ?", (guild_id,))
+            conn.execute("DELETE FROM queue_snapshot WHERE guild_id = ?", (guild_id,))
+
+    def load_all(self, max_age: float = RESUME_MAX_AGE) -> List[GuildSnapshot]:
+        """Snapshots recientes (los viejos se borran). Deja la cola guardada como base del diff."""
+        cutoff = time.time() - max_age
+        out: List[GuildSnapshot] = []
+        with sqlite3.connect(self.db_path) as conn:
+            stale = [r[0] for r in conn.execute(
+                "SELECT guild_id FROM player_snapshot WHERE updated_at < ?", (cutoff,)
+            )]
+            for gid in stale:
+                conn.execute("DELETE FROM player_snapshot WHERE guild_id = ?", (gid,))
+                conn.execute("DELETE FROM queue_snapshot WHERE guild_id = ?", (gid,))
+            rows = conn.execute("SELECT * FROM player_snapshot").fetchall()
+            for row in rows:
+                snap = GuildSnapshot(
+                    guild_id=row[0], voice_channel_id=row[1], loop_track=bool(row[2]),
+                    loop_queue=bool(row[3]), current=json.loads(row[4]) if row[4] else None,
+                    position=row[5], panel_channel_id=row[6], panel_message_id=row[7], updated_at=row[8],
+                )
+                q = conn.execute(
+                    "SELECT uid, ord, track FROM queue_snapshot WHERE guild_id = ? ORDER BY ord",
+                    (snap.guild_id,),
+                ).fetchall()
+                snap.queue = [json.loads(raw) for _, _, raw in q]
+                self._persisted[snap.guild_id] = ([uid for uid, _, _ in q], {uid: o for uid, o, _ in q})
+                out.append(snap)
+        return out
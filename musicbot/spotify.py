@@ -24,11 +24,11 @@ ACCOUNTS_TOKEN_URL = "https://accounts.spotify.com/api/token"
 SPOTIFY_API_BASE = "https://api.spotify.com/v1"
 
 # ================== Modelo ==================
-@dataclass
+@dataclass(slots=True)
 class SpotifyItem:
     title: str
     query: str  # query que usaremos en YouTube (artist - track)
-    raw: Dict[str, Any]
+    duration_ms: int = 0  # solo lo que usamos del JSON de Spotify (no guardamos el payload entero)
 
 # ================== Cliente Spotify API (client credentials) ==================
 class _SpotifyAPI:
@@ -205,7 +205,7 @@ class SpotifyResolver:
         name = t.get("name") or "Spotify Track"
         artists = ", ".join(a.get("name") for a in (t.get("artists") or []) if a and a.get("name"))
         query = f"{artists} - {name}" if artists else name
-        return [SpotifyItem(title=name, query=query, raw=t)]
+        return [SpotifyItem(title=name, query=query, duration_ms=int(t.get("duration_ms") or 0))]
 
     def _resolve_album_api(self, album_id: str) -> List[SpotifyItem]:
         # Puedes consultar metadata del álbum si la necesitas:
@@ -218,7 +218,7 @@ class SpotifyResolver:
             name = track.get("name") or "Spotify Track"
             artists = ", ".join(a.get("name") for a in (track.get("artists") or []) if a and a.get("name"))
             query = f"{artists} - {name}" if artists else name
-            out.append(SpotifyItem(title=name, query=query, raw=track))
+            out.append(SpotifyItem(title=name, query=query, duration_ms=int(track.get("duration_ms") or 0)))
         return out
 
     def _resolve_playlist_api(self, playlist_id: str) -> List[SpotifyItem]:
@@ -231,5 +231,5 @@ class SpotifyResolver:
             name = track.get("name") or "Spotify Track"
             artists = ", ".join(a.get("name") for a in (track.get("artists") or []) if a and a.get("name"))
             query = f"{artists} - {name}" if artists else name
-            out.append(SpotifyItem(title=name, query=query, raw=track))
+            out.append(SpotifyItem(title=name, query=query, duration_ms=int(track.get("duration_ms") or 0)))
         return out
\ No newline at end of file
@@ -0,0 +1,247 @@
+# musicbot/trackqueue.py
+from __future__ import annotations
+
+import random
+from typing import TYPE_CHECKING, Dict, Iterable, Iterator, List, Optional, Tuple, Union, overload
+
+if TYPE_CHECKING:
+    from .player import Track
+
+LOAD = 256                       # tamaño objetivo de bloque; se parte al llegar a 2 * LOAD
+
+
+class _Fenwick:
+    """Árbol de Fenwick sobre los tamaños de bloque: prefijos y búsqueda por índice en O(log b)."""
+
+    def __init__(self, sizes: List[int]):
+        self.n = len(sizes)
+        self.tree = [0] * (self.n + 1)
+        for i, s in enumerate(sizes, 1):
+            self.tree[i] += s
+            j = i + (i & -i)
+            if j <= self.n:
+                self.tree[j] += self.tree[i]
+
+    def add(self, i: int, delta: int):
+        i += 1
+        while i <= self.n:
+            self.tree[i] += delta
+            i += i & -i
+
+    def prefix(self, i: int) -> int:
+        """Suma de los tamaños de los bloques [0, i)."""
+        total = 0
+        while i > 0:
+            total += self.tree[i]
+            i -= i & -i
+        return total
+
+    def find(self, k: int) -> Tuple[int, int]:
+        """Elemento k (0-based) -> (bloque, posición dentro del bloque)."""
+        pos = 0
+        step = 1 << self.n.bit_length()
+        while step:
+            nxt = pos + step
+            if nxt <= self.n and self.tree[nxt] <= k:
+                pos = nxt
+                k -= self.tree[nxt]
+            step >>= 1
+        return pos, k
+
+
+class TrackQueue:
+    """
+    Cola de pistas pensada para colas grandes (playlists de miles de canciones).
+    - Lista por bloques + Fenwick de tamaños: índice -> bloque en O(log n), insertar/sacar O(LOAD)
+    - Índice uid -> bloque: index()/remove() de una pista sin recorrer la cola
+    - Se usa como una lista/deque: len, iteración, q[i], q[a:b], append/appendleft/popleft
+    - Operaciones de cola: move (reordenar), pop(i) (sacar en posición), drop_front (saltar a)
+    """
+
+    def __init__(self, tracks: Iterable["Track"] = ()):
+        self._blocks: List[List["Track"]] = []
+        self._tree = _Fenwick([])
+        self._pos: Dict[int, int] = {}                   # id(bloque) -> índice del bloque
+        self._block_of: Dict[str, List["Track"]] = {}     # uid -> bloque que la contiene
+        self._len = 0
+        self.extend(tracks)
+
+    # ---------- internos ----------
+    def _rebuild(self):
+        """Cambió la lista de bloques (partición / bloque vacío): rehace Fenwick e índices."""
+        self._blocks = [b for b in self._blocks if b]
+        self._tree = _Fenwick([len(b) for b in self._blocks])
+        self._pos = {id(b): i for i, b in enumerate(self._blocks)}
+
+    def _locate(self, i: int) -> Tuple[int, int]:
+        if i < 0:
+            i += self._len
+        if not 0 <= i < self._len:
+            raise IndexError("índice fuera de la cola")
+        return self._tree.find(i)
+
+    def _split(self, bi: int):
+        block = self._blocks[bi]
+        half = block[LOAD:]
+        del block[LOAD:]
+        self._blocks.insert(bi + 1, half)
+        for t in half:
+            self._block_of[t.uid] = half
+        self._rebuild()
+
+    # ---------- lectura ----------
+    def __len__(self) -> int:
+        return self._len
+
+    def __iter__(self) -> Iterator["Track"]:
+        for block in self._blocks:
+            yield from block
+
+    @overload
+    def __getitem__(self, i: int) -> "Track": ...
+    @overload
+    def __getitem__(self, i: slice) -> List["Track"]: ...
+
+    def __getitem__(self, i: Union[int, slice]):
+        if isinstance(i, slice):
+            start, stop, step = i.indices(self._len)
+            if step != 1:
+                return [self[j] for j in range(start, stop, step)]
+            return self.slice(start, stop)
+        bi, j = self._locate(i)
+        return self._blocks[bi][j]
+
+    def slice(self, start: int, stop: int) -> List["Track"]:
+        """Pistas [start, stop) sin copiar la cola entera (O(log n + k))."""
+        start, stop = max(0, start), min(self._len, stop)
+        out: List["Track"] = []
+        if start >= stop:
+            return out
+        bi, j = self._tree.find(start)
+        need = stop - start
+        while need > 0 and bi < len(self._blocks):
+            chunk = self._blocks[bi][j:j + need]
+            out.extend(chunk)
+            need -= len(chunk)
+            bi, j = bi + 1, 0
+        return out
+
+    def index(self, track: "Track") -> int:
+        block = self._block_of.get(track.uid)
+        bi = self._pos.get(id(block)) if block is not None else None
+        if bi is not None:
+            for j, t in enumerate(block):
+                if t is track:
+                    return self._tree.prefix(bi) + j
+        raise ValueError("la pista no está en la cola")
+
+    def __contains__(self, track: object) -> bool:
+        try:
+            return self.index(track) >= 0  # type: ignore[arg-type]
+        except (ValueError, AttributeError):
+            return False
+
+    # ---------- escritura ----------
+    def insert(self, i: int, track: "Track"):
+        if i < 0:
+            i = max(0, i + self._len)
+        if not self._blocks:
+            self._blocks.append([track])
+            self._block_of[track.uid] = self._blocks[0]
+            self._len = 1
+            self._rebuild()
+            return
+        if i >= self._len:
+            bi, j = len(self._blocks) - 1, len(self._blocks[-1])
+        else:
+            bi, j = self._tree.find(i)
+        block = self._blocks[bi]
+        block.insert(j, track)
+        self._block_of[track.uid] = block
+        self._len += 1
+        self._tree.add(bi, 1)
+        if len(block) > 2 * LOAD:
+            self._split(bi)
+
+    def append(self, track: "Track"):
+        self.insert(self._len, track)
+
+    def appendleft(self, track: "Track"):
+        self.insert(0, track)
+
+    def extend(self, tracks: Iterable["Track"]):
+        tracks = list(tracks)
+        if not tracks:
+            return
+        if self._blocks and len(self._blocks[-1]) < LOAD:
+            last = self._blocks[-1]
+            room = LOAD - len(last)
+            head, tracks = tracks[:room], tracks[room:]
+            last.extend(head)
+            for t in head:
+                self._block_of[t.uid] = last
+            self._len += len(head)
+        for k in range(0, len(tracks), LOAD):
+            block = tracks[k:k + LOAD]
+            self._blocks.append(block)
+            for t in block:
+                self._block_of[t.uid] = block
+            self._len += len(block)
+        self._rebuild()
+
+    def pop(self, i: int = -1) -> "Track":
+        bi, j = self._locate(i)
+        block = self._blocks[bi]
+        track = block.pop(j)
+        if self._block_of.get(track.uid) is block:
+            del self._block_of[track.uid]
+        self._len -= 1
+        if block:
+            self._tree.add(bi, -1)
+        else:
+            self._rebuild()
+        return track
+
+    def popleft(self) -> "Track":
+        if not self._len:
+            raise IndexError("la cola está vacía")
+        return self.pop(0)
+
+    def remove(self, track: "Track"):
+        self.pop(self.index(track))
+
+    def move(self, src: int, dst: int) -> "Track":
+        """Mueve la pista de `src` a `dst` (posiciones 0-based, como en la cola ya sin ella)."""
+        track = self.pop(src)
+        self.insert(dst, track)
+        return track
+
+    def drop_front(self, n: int) -> List["Track"]:
+        """Saca y retorna las primeras n pistas (saltar a la posición n)."""
+        n = max(0, min(n, self._len))
+        out: List["Track"] = []
+        while n > 0 and self._blocks:
+            block = self._blocks[0]
+            take = block[:n]
+            del block[:n]
+            out.extend(take)
+            n -= len(take)
+            if not block:
+                self._blocks.pop(0)
+        for t in out:
+            self._block_of.pop(t.uid, None)
+        self._len -= len(out)
+        self._rebuild()
+        return out
+
+    def clear(self):
+        self._blocks.clear()
+        self._block_of.clear()
+        self._len = 0
+        self._rebuild()
+
+    def shuffle(self, rng: Optional[random.Random] = None):
+        items = list(self)
+        (rng or random).shuffle(items)
+        self.clear()
+        self.extend(items)
@@ -0,0 +1,75 @@
+# musicbot/transcode.py
+from __future__ import annotations
+
+import asyncio
+import os
+from typing import Optional
+
+from .analysis import LOUDNORM_FILTER
+
+
+class OpusTranscoder:
+    """
+    Convierte un archivo de audio a Ogg/Opus (48 kHz estéreo) una sola vez por pista.
+    - El resultado se reproduce con FFmpegOpusAudio(codec="copy"): sin PCM ni libopus en el bot
+    - Concurrencia limitada para no competir con las pistas que están sonando
+    """
+
+    def __init__(self, ffmpeg_path: str = "ffmpeg", bitrate_kbps: int = 128, max_concurrent: int = 1):
+        self.ffmpeg_path = ffmpeg_path
+        self.bitrate_kbps = bitrate_kbps
+        self._sem = asyncio.Semaphore(max(1, max_concurrent))
+
+    async def to_opus(
+        self,
+        src_path: str,
+        out_dir: str,
+        name: str,
+        audio_filter: str = LOUDNORM_FILTER,
+    ) -> Optional[str]:
+        """
+        Codifica src_path -> out_dir/name.opus. Retorna la ruta o None si falla.
+        audio_filter: ganancia medida (volume=XdB) o loudnorm de una pasada si no hay medición.
+        """
+        os.makedirs(out_dir, exist_ok=True)
+        dst = os.path.join(out_dir, f"{name}.opus")
+        args = [
+            "-nostdin", "-hide_banner", "-loglevel", "error", "-y",
+            "-i", src_path,
+            "-vn", "-af", audio_filter,
+            "-ac", "2", "-ar", "48000",
+            "-c:a", "libopus", "-b:a", f"{self.bitrate_kbps}k",
+            "-f", "ogg", dst,
+        ]
+
+        async with self._sem:
+            try:
+                proc = await asyncio.create_subprocess_exec(
+                    self.ffmpeg_path, *args,
+                    stdout=asyncio.subprocess.DEVNULL,
+                    stderr=asyncio.subprocess.DEVNULL,
+                )
+            except Exception:
+                return None
+            try:
+                rc = await proc.wait()
+            except asyncio.CancelledError:
+                try:
+                    proc.kill()
+                except ProcessLookupError:
+                    pass
+                self._unlink(dst)
+                raise
+
+        if rc != 0 or not os.path.exists(dst) or os.path.getsize(dst) == 0:
+            self._unlink(dst)
+            return None
+        return dst
+
+    @staticmethod
+    def _unlink(path: str):
+        try:
+            if os.path.exists(path):
+                os.remove(path)
+        except Exception:
+            pass
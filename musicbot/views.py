@@ -33,8 +33,12 @@ def build_player_embed(guild: discord.Guild, player) -> discord.Embed:
     else:
         embed.add_field(name="—", value="No hay nada sonando.", inline=False)
 
-    upcoming = [t.title for t in list(player.queue)]
-    embed.add_field(name="📜 Próximas", value=short_queue_preview(upcoming, limit=3), inline=False)
+    upcoming = [t.title for t in player.queue[:3]]
+    embed.add_field(
+        name="📜 Próximas",
+        value=short_queue_preview(upcoming, limit=3, total=len(player.queue)),
+        inline=False,
+    )
 
     loop_state = "🎵" if player.loop_track else ("📜" if player.loop_queue else "OFF")
     embed.set_footer(text=f"Loop: {loop_state}")  # <- sin Prefetch: ON
@@ -52,6 +56,15 @@ class MusicControls(discord.ui.View):
             return None
         return self.cog.service.get_player(interaction.guild.id)
 
+    @discord.ui.button(label="Anterior", style=discord.ButtonStyle.secondary, emoji="⏮️", custom_id="music:previous")
+    async def previous(self, interaction: discord.Interaction, button: discord.ui.Button):
+        player = await self._player(interaction)
+        if not player:
+            return
+        ok, msg = await player.previous()
+        await interaction.response.send_message(("✅ " if ok else "ℹ️ ") + msg, ephemeral=True)
+        await self.cog.refresh_panel(interaction.guild)
+
     @discord.ui.button(label="Pausa/Resume", style=discord.ButtonStyle.primary, emoji="⏯️", custom_id="music:pause_resume")
     async def pause_resume(self, interaction: discord.Interaction, button: discord.ui.Button):
         player = await self._player(interaction)
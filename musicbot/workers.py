@@ -0,0 +1,227 @@
+# musicbot/workers.py
+from __future__ import annotations
+
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Optional, Dict, Any, List
+
+import yt_dlp
+
+# Solo esto viaja por IPC (la info completa de yt-dlp trae cientos de formatos)
+_SLIM_FIELDS = (
+    "id", "title", "duration", "thumbnail", "webpage_url",
+    "extractor_key", "extractor", "url", "http_headers",
+)
+
+# ---- estado de cada proceso worker (instancias de YoutubeDL "calientes") ----
+_ydl_resolve: Optional[yt_dlp.YoutubeDL] = None
+_ydl_download: Optional[yt_dlp.YoutubeDL] = None
+_ydl_search: Optional[yt_dlp.YoutubeDL] = None
+_download_fragments = 1
+
+# descargas con ratelimit: el timeout sale del tamaño esperado y la tasa asignada
+SHAPED_BYTES_PER_SECOND = 24 * 1024   # audio de YouTube (~160 kbps) con margen
+SHAPED_DEFAULT_SECONDS = 600          # duración supuesta si no se conoce
+SHAPED_TIMEOUT_FACTOR = 1.5
+
+# búsqueda "plana": solo la lista de resultados (id, título, duración), sin extraer cada video
+SEARCH_OPTS: Dict[str, Any] = {
+    "quiet": True,
+    "no_warnings": True,
+    "extract_flat": "in_playlist",
+    "skip_download": True,
+}
+
+
+def _init_worker(resolve_opts: Dict[str, Any], download_opts: Dict[str, Any]):
+    global _ydl_resolve, _ydl_download, _ydl_search, _download_fragments
+    _download_fragments = download_opts.get("concurrent_fragment_downloads", 1)
+    _ydl_resolve = yt_dlp.YoutubeDL(resolve_opts)
+    _ydl_download = yt_dlp.YoutubeDL(download_opts)
+    _ydl_search = yt_dlp.YoutubeDL(SEARCH_OPTS)
+
+
+def _first_entry(info: Any) -> Optional[Dict[str, Any]]:
+    if isinstance(info, dict) and "entries" in info:
+        entries = [e for e in (info["entries"] or []) if e]
+        return entries[0] if entries else None
+    return info if isinstance(info, dict) else None
+
+
+def slim_info(info: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    if not info:
+        return {}
+    out = {k: info[k] for k in _SLIM_FIELDS if info.get(k) is not None}
+    downloads = info.get("requested_downloads") or []
+    if downloads and downloads[0].get("filepath"):
+        out["_filepath"] = downloads[0]["filepath"]
+    return out
+
+
+def flat_entry(e: Any) -> Optional[Dict[str, Any]]:
+    """Entrada plana (búsqueda / playlist) -> {id, title, duration, thumbnail, webpage_url}."""
+    if not isinstance(e, dict) or not e.get("id"):
+        return None
+    url = e.get("webpage_url") or e.get("url") or ""
+    if not str(url).startswith(("http://", "https://")):
+        url = f"https://www.youtube.com/watch?v={e['id']}"
+    thumbs = e.get("thumbnails") or []
+    return {
+        "id": e["id"],
+        "title": e.get("title") or "",
+        "duration": int(e.get("duration") or 0),
+        "thumbnail": e.get("thumbnail") or (thumbs[-1].get("url") if thumbs else "") or "",
+        "webpage_url": url,
+    }
+
+
+def search_entries(info: Any) -> List[Dict[str, Any]]:
+    """Resultados de una búsqueda plana -> [{id, title, duration, thumbnail, webpage_url}]."""
+    return [x for x in map(flat_entry, (info or {}).get("entries") or []) if x]
+
+
+class YTDLWorkerError(RuntimeError):
+    """Error de yt-dlp en un worker (las excepciones originales no siempre se pueden picklear)."""
+
+
+def _job_resolve(query: str) -> Dict[str, Any]:
+    try:
+        return slim_info(_first_entry(_ydl_resolve.extract_info(query, download=False)))
+    except Exception as e:
+        raise YTDLWorkerError(f"{type(e).__name__}: {e}") from None
+
+
+def _job_download(query: str, outtmpl: str, ratelimit: Optional[int] = None) -> Dict[str, Any]:
+    # una sola extracción: resuelve (ytsearch1 si es búsqueda) y descarga en la misma pasada
+    _ydl_download.params["outtmpl"]["default"] = outtmpl
+    # descarga en segundo plano limitada: tasa fija y un solo fragmento a la vez
+    _ydl_download.params["ratelimit"] = ratelimit
+    _ydl_download.params["concurrent_fragment_downloads"] = (
+        1 if ratelimit else _download_fragments
+    )
+    try:
+        return slim_info(_first_entry(_ydl_download.extract_info(query, download=True)))
+    except Exception as e:
+        raise YTDLWorkerError(f"{type(e).__name__}: {e}") from None
+
+
+def _job_search(query: str) -> List[Dict[str, Any]]:
+    try:
+        return search_entries(_ydl_search.extract_info(query, download=False))
+    except Exception as e:
+        raise YTDLWorkerError(f"{type(e).__name__}: {e}") from None
+
+
+class YTDLWorkerPool:
+    """
+    Pool de procesos con instancias de yt-dlp persistentes.
+    - La extracción (GIL-bound) no frena el hilo de envío de voz del bot
+    - Un executor de un proceso por worker: un trabajo colgado (timeout) mata solo su worker,
+      los trabajos de otros servidores siguen en los demás
+    - Descargas limitadas (ratelimit): el timeout crece con el tamaño esperado y la tasa
+    - Cada worker se recicla tras `max_jobs_per_worker` trabajos (fugas de memoria de extractores)
+    """
+
+    def __init__(
+        self,
+        resolve_opts: Dict[str, Any],
+        download_opts: Dict[str, Any],
+        workers: int = 2,
+        job_timeout: float = 120.0,
+        max_jobs_per_worker: int = 50,
+    ):
+        self.resolve_opts = resolve_opts
+        self.download_opts = download_opts
+        self.workers = max(1, workers)
+        self.job_timeout = job_timeout
+        self.max_jobs_per_worker = max_jobs_per_worker
+        self._pools: List[Optional[ProcessPoolExecutor]] = [None] * self.workers
+        self._free: Optional[asyncio.Queue] = None   # workers libres (se crea en el loop)
+
+    def _get_pool(self, slot: int) -> ProcessPoolExecutor:
+        if self._pools[slot] is None:
+            self._pools[slot] = ProcessPoolExecutor(
+                max_workers=1,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+                initargs=(self.resolve_opts, self.download_opts),
+                max_tasks_per_child=self.max_jobs_per_worker or None,
+            )
+        return self._pools[slot]
+
+    def _recycle(self, slot: int):
+        """Mata el worker de ese lugar; su próximo trabajo levanta uno nuevo."""
+        pool, self._pools[slot] = self._pools[slot], None
+        if not pool:
+            return
+        # ProcessPoolExecutor no expone sus procesos: terminamos el colgado a mano
+        for proc in list(getattr(pool, "_processes", {}).values()):
+            try:
+                proc.terminate()
+            except Exception:
+                pass
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    async def _run(self, fn, *args, timeout: Optional[float] = None) -> Any:
+        if self._free is None:
+            self._free = asyncio.Queue()
+            for slot in range(self.workers):
+                self._free.put_nowait(slot)
+        free = self._free
+        slot = await free.get()
+        loop = asyncio.get_running_loop()
+        cfut = None
+        try:
+            pool = self._get_pool(slot)
+            cfut = pool.submit(fn, *args)
+            afut = asyncio.wrap_future(cfut)
+            # si nadie lo espera (timeout / cancelación), su error no queda sin retirar
+            afut.add_done_callback(lambda f: f.cancelled() or f.exception())
+            try:
+                return await asyncio.wait_for(asyncio.shield(afut), timeout or self.job_timeout)
+            except asyncio.TimeoutError:
+                if self._pools[slot] is pool:
+                    self._recycle(slot)  # solo este worker: los demás trabajos siguen
+                raise
+            except BrokenProcessPool:
+                if self._pools[slot] is pool:
+                    self._pools[slot] = None
+                raise
+        finally:
+            if cfut is None or cfut.done():
+                free.put_nowait(slot)
+            else:
+                # cancelado mientras corre: el worker queda ocupado hasta que el trabajo termine
+                def _release(_f, slot=slot):
+                    if not loop.is_closed():
+                        loop.call_soon_threadsafe(free.put_nowait, slot)
+
+                cfut.add_done_callback(_release)
+
+    def download_timeout(self, ratelimit: Optional[int], duration: int = 0) -> float:
+        """Timeout de una descarga: el fijo, más lo que tarda el tamaño esperado a la tasa asignada."""
+        if not ratelimit:
+            return self.job_timeout
+        expected = (duration or SHAPED_DEFAULT_SECONDS) * SHAPED_BYTES_PER_SECOND
+        return self.job_timeout + expected / ratelimit * SHAPED_TIMEOUT_FACTOR
+
+    async def resolve(self, query: str) -> Dict[str, Any]:
+        return await self._run(_job_resolve, query)
+
+    async def download(
+        self, query: str, outtmpl: str, ratelimit: Optional[int] = None, duration: int = 0
+    ) -> Dict[str, Any]:
+        return await self._run(
+            _job_download, query, outtmpl, ratelimit, timeout=self.download_timeout(ratelimit, duration)
+        )
+
+    async def search(self, query: str) -> List[Dict[str, Any]]:
+        return await self._run(_job_search, query)
+
+    def close(self):
+        for slot, pool in enumerate(self._pools):
+            if pool:
+                pool.shutdown(wait=False, cancel_futures=True)
+                self._pools[slot] = None